@@ -1,10 +1,27 @@
 """Main Streamlit application for course generation"""
 
+import os
 import re
+import time
+import asyncio
+import functools
 import streamlit as st
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from generator.course import CourseGenerator
-from utils.file_handler import process_uploaded_file, cleanup_vector_store
+from generator.markdown import MarkdownStream
+from generator.async_course import AsyncCourseGenerator
+from generator.assistants import AssistantRegistry, ThreadPool
+from utils.vector_manifest import VectorStoreManifest
+from utils.metrics import latency
+from utils.tracing import current_span, ui_run
+from utils.paths import data_dir
+from utils.cassette import cassette_client
+from generator.cache import SQLiteCache
+from generator.reporting import StreamlitReporter
+from generator.backends import ChatCompletionsBackend
+from generator.jobs import CourseJob, register_job, get_job
+from generator.store import SQLiteCourseStore, lesson_key as store_lesson_key, quiz_key as store_quiz_key
+from utils.corpus import Corpus
 import json
 
 st.set_page_config(
@@ -14,6 +31,188 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def get_response_cache():
+    """one response cache per server process"""
+    return SQLiteCache(data_dir("responses.sqlite3"), ttl=30 * 24 * 3600)
+
+@st.cache_resource
+def get_vector_manifest():
+    """shared file/vector store dedupe manifest"""
+    return VectorStoreManifest()
+
+@st.cache_resource
+def get_assistant_registry(api_key):
+    """assistants reused across sessions, keyed by model + instructions"""
+    return AssistantRegistry(make_client(api_key))
+
+@st.cache_resource
+def get_thread_pool(api_key):
+    """background thread recycler shared by every session on this key"""
+    return ThreadPool(make_client(api_key))
+
+@st.cache_resource
+def get_client(api_key, cassette=None):
+    """one sync client - and connection pool - per key, kept across reruns and sessions"""
+    if cassette:
+        return cassette_client(cassette, "record", api_key=api_key)
+    return OpenAI(api_key=api_key)
+
+@st.cache_resource
+def get_course_store():
+    """durable course state, shared by every session in this process"""
+    return SQLiteCourseStore(data_dir("courses.sqlite3"))
+
+def persist(**fields):
+    """write course fields through to the store for the session's course"""
+    if st.session_state.get('course_id'):
+        get_course_store().update_course(st.session_state.course_id, **fields)
+
+def persist_artifact(kind, key, value):
+    if st.session_state.get('course_id'):
+        get_course_store().put(st.session_state.course_id, kind, key, value)
+
+def set_stage(stage):
+    st.session_state.generation_stage = stage
+    persist(stage=stage)
+
+def save_lesson_detail(section_title, lesson_title, detail):
+    key = store_lesson_key(section_title, lesson_title)
+    st.session_state[f"lesson_detail_{key}"] = detail
+    persist_artifact("lesson_detail", key, detail)
+
+def save_section_lessons(index, section_lessons):
+    st.session_state.generated_lessons.append(section_lessons)
+    persist_artifact("section_lessons", index, section_lessons)
+
+def rehydrate_course(client, course_id):
+    """rebuild session state for a stored course, False if there's no such course"""
+    course = get_course_store().load_course(course_id)
+    if course is None:
+        return False
+
+    st.session_state.course_id = course_id
+    st.session_state.user_input = course["user_input"]
+    if course["toc"]:
+        st.session_state.raw_toc = course["toc"]
+    if course["course_info"]:
+        st.session_state.course_info = course["course_info"]
+    if course["sections"]:
+        st.session_state.sections = course["sections"]
+
+    meta = course["generator"] or {}
+    st.session_state.generator = make_generator(client).restore(meta)
+    source = course["artifacts"]["source"].get("corpus")
+    if source:
+        # uploads aren't kept, their extracted text is - steps stay grounded after a restart
+        st.session_state.generator.load_corpus(Corpus.from_dict(source))
+    if meta.get("vector_store_id"):
+        st.session_state.vector_store_id = meta["vector_store_id"]
+
+    for key, detail in course["artifacts"]["lesson_detail"].items():
+        st.session_state[f"lesson_detail_{key}"] = detail
+    for key, quiz in course["artifacts"]["quiz"].items():
+        st.session_state[key] = quiz
+
+    kept = course["artifacts"]["section_lessons"]
+    st.session_state.generated_lessons = [kept[k] for k in sorted(kept, key=int)]
+    st.session_state.current_section_index = len(st.session_state.generated_lessons)
+
+    stage = course["stage"] or 'input'
+    if stage == 'toc':
+        # uploads aren't stored - redo the analysis without them
+        st.session_state.uploaded_files = []
+    if stage == 'lessons' and course["sections"] and \
+            st.session_state.current_section_index >= len(course["sections"]["sections"]):
+        stage = 'complete'
+    if stage == 'complete':
+        st.session_state.lessons = st.session_state.generated_lessons
+    st.session_state.generation_stage = stage
+    st.query_params["course"] = course_id
+    return True
+
+def make_generator(client):
+    """CourseGenerator configured from the sidebar"""
+    generator = CourseGenerator(
+        client,
+        stream=st.session_state.get('stream_runs', True),
+        thread_scope=st.session_state.get('thread_scope', 'isolated'),
+        cache=get_response_cache() if st.session_state.get('use_cache', True) else None,
+        reporter=StreamlitReporter(),
+        compaction=st.session_state.get('compaction', 'truncate'),
+        retrieval=None if st.session_state.get('retrieval') == 'off' else st.session_state.get('retrieval', 'bm25'),
+        backend=ChatCompletionsBackend(client) if st.session_state.get('backend') == 'chat' else None,
+        registry=get_assistant_registry(client.api_key),
+        threads=get_thread_pool(client.api_key)
+    )
+    # tags trace spans so python -m utils.tracing can report per course
+    generator.course_id = st.session_state.get('course_id')
+    return generator
+
+def current_job(client):
+    """the session's background job - resumed from its checkpoint after a refresh/restart"""
+    job_id = st.session_state.get('job_id') or st.query_params.get('job')
+    if not job_id:
+        return None
+    job = get_job(job_id)
+    if job is None:
+        job = CourseJob.load(
+            job_id,
+            st.session_state.get('generator') or make_generator(client),
+            max_workers=st.session_state.get('max_concurrency', 4),
+            store=get_course_store()
+        )
+        if job is None:
+            return None
+        register_job(job)
+        if job.status in ('pending', 'running'):
+            job.start()  # interrupted by a restart, pick up where it left off
+
+    st.session_state.job_id = job_id
+    if 'user_input' not in st.session_state:
+        # fresh browser session - rehydrate what the job was built from
+        st.session_state.user_input = job.user_input
+        st.session_state.course_info = job.course_info
+        st.session_state.sections = {"sections": job.sections}
+        st.session_state.generation_stage = 'sections'
+    return job
+
+def start_background_job():
+    job = CourseJob(
+        st.session_state.generator,
+        st.session_state.user_input,
+        st.session_state.course_info,
+        st.session_state.sections["sections"],
+        max_workers=st.session_state.get('max_concurrency', 4),
+        store=get_course_store(),
+        course_id=st.session_state.get('course_id')
+    )
+    register_job(job).start()
+    st.session_state.job_id = job.job_id
+    st.query_params["job"] = job.job_id  # survives a browser refresh
+
+def timed_fragment(func):
+    """st.fragment whose own reruns are timed - inside a full run the app's timer covers it"""
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        if current_span() is not None:
+            return func(*args, **kwargs)
+        with ui_run(func.__name__, stage=st.session_state.get('generation_stage')):
+            return func(*args, **kwargs)
+    return st.fragment(run)
+
+@st.fragment(run_every=2)
+def show_job_progress(job):
+    """sidebar progress for the background job, refreshes on its own"""
+    progress = job.progress()
+    st.subheader("🏭 Background Job")
+    st.progress(progress["done"] / max(1, progress["total"]))
+    st.caption(f"{progress['status']}: {progress['done']}/{progress['total']} items")
+    for key in progress["current"][:5]:
+        st.caption(f"⏳ {key}")
+    if progress["error"]:
+        st.error(progress["error"].splitlines()[0])
+
 # Initialize session state
 if 'generation_stage' not in st.session_state:
     st.session_state.generation_stage = 'input'
@@ -24,11 +223,97 @@ def show_course_info(info: str):
     """Display course overview from markdown content"""
     st.markdown(info)
 
+def live_markdown(placeholder, min_interval=0.15):
+    """on_token callback rendering normalized markdown into placeholder as it streams"""
+    stream = MarkdownStream()
+    last = [0.0]
+
+    def on_token(delta):
+        text = stream.feed(delta)
+        # re-render on finished lines or every min_interval, not on every token
+        now = time.monotonic()
+        if '\n' in delta or now - last[0] >= min_interval:
+            last[0] = now
+            placeholder.markdown(text)
+    return on_token
+
+def live_sections(placeholder):
+    """on_partial callback drawing section cards as the structure json streams in"""
+    def on_partial(partial):
+        lines = []
+        for i, section in enumerate(partial.get("sections", []), 1):
+            if not section.get("title"):
+                continue
+            lines.append(f"## {i}. {section['title']}")
+            if section.get("description"):
+                lines.append(f"*{section['description']}*")
+            for j, lesson in enumerate(section.get("lessons", []), 1):
+                if lesson.get("title"):
+                    lines.append(f"- {i}.{j} {lesson['title']}")
+        placeholder.markdown("\n\n".join(lines))
+    return on_partial
+
+def make_client(api_key=None, asynchronous=False):
+    """api client for this session - recorded to $COURSE_GENERATOR_CASSETTE when set"""
+    api_key = api_key or st.session_state['OPENAI_API_KEY']
+    cassette = os.environ.get("COURSE_GENERATOR_CASSETTE")
+    if not asynchronous:
+        return get_client(api_key, cassette)
+    # not cached - an async client's pool is bound to the event loop, and each asyncio.run() makes a new one
+    if cassette:
+        return cassette_client(cassette, "record", asynchronous=True, api_key=api_key)
+    return AsyncOpenAI(api_key=api_key)
+
+def run_async(fan_out):
+    """asyncio.run(fan_out(engine)) on an async engine sharing the session
+    generator's assistant + content
+
+    the client is opened and closed inside the loop, otherwise its
+    connections get cleaned up after asyncio.run has closed the loop
+    """
+    async def main():
+        async with make_client(asynchronous=True) as client:
+            engine = AsyncCourseGenerator.from_generator(
+                st.session_state.generator,
+                client,
+                max_concurrency=st.session_state.get('max_concurrency', 4)
+            )
+            return await fan_out(engine)
+    return asyncio.run(main())
+
+def generate_all_lesson_details(sections):
+    """fan out every missing lesson body concurrently"""
+    pending = [
+        {"section_title": section["title"], "lessons": [
+            lesson for lesson in section["lessons"]
+            if f"lesson_detail_{section['title']}_{lesson['title']}" not in st.session_state
+        ]}
+        for section in sections["sections"]
+    ]
+    details, failures = run_async(lambda engine: engine.generate_all_lesson_details(
+        st.session_state.user_input,
+        st.session_state.course_info,
+        pending
+    ))
+    for (section_title, lesson_title), detail in details.items():
+        save_lesson_detail(section_title, lesson_title, detail)
+    return failures
+
 def show_sections(sections):
     st.subheader("Course Structure")
     total_time = sum(section["estimated_time"] for section in sections["sections"])
     st.write(f"total estimated time: {total_time} minutes ({total_time/60:.1f} hours)")
 
+    if st.button("⚡ generate all lessons", key="gen_all_lesson_details"):
+        with st.spinner("brewing every lesson at once... 🧪"):
+            failures = generate_all_lesson_details(sections)
+        if not failures:
+            st.rerun()
+        # keep the error on screen - the lessons that finished are saved, try again for the rest
+        st.error(f"{len(failures)} lesson(s) failed: " + "; ".join(
+            f"{lesson_title} ({e})" for (_, lesson_title), e in failures.items()
+        ))
+
     for i, section in enumerate(sections["sections"], 1):
         st.markdown(f"""
         ## {i}. {section['title']}
@@ -38,40 +323,46 @@ def show_sections(sections):
         """)
 
         for j, lesson in enumerate(section["lessons"], 1):
-            detail_key = f"lesson_detail_{section['title']}_{lesson['title']}"
-
-            st.markdown(f"""
-            ---
-            ### {i}.{j} {lesson['title']}
-            *{lesson['duration']} minutes*
+            show_lesson_block(i, j, section["title"], lesson)
 
-            {lesson['brief']}
-            """)
-
-            if detail_key in st.session_state:
-                show_lesson_detail(st.session_state[detail_key])
-            else:
-                instruction_key = f"instruction_{detail_key}"
-                custom_instruction = st.text_area(
-                    "your special instructions (optional):",
-                    help="got specific ideas? tell me what to focus on",
-                    key=instruction_key,
-                    placeholder="e.g. 'focus on real-world applications'"
-                )
+        st.markdown("---")
 
-                if st.button("🚀 generate lesson", key=f"gen_{detail_key}"):
-                    with st.spinner("brewing knowledge... 🧪"):
-                        detail = st.session_state.generator.generate_lesson_detail(
-                            st.session_state.user_input,
-                            st.session_state.course_info,
-                            section["title"],
-                            lesson,
-                            st.session_state.get(instruction_key)
-                        )
-                        st.session_state[detail_key] = detail
-                        st.rerun()
+@timed_fragment
+def show_lesson_block(i, j, section_title, lesson):
+    """one lesson of the structure view - its buttons rerun just this lesson"""
+    detail_key = f"lesson_detail_{section_title}_{lesson['title']}"
+
+    st.markdown(f"""
+    ---
+    ### {i}.{j} {lesson['title']}
+    *{lesson['duration']} minutes*
+
+    {lesson['brief']}
+    """)
+
+    if detail_key in st.session_state:
+        show_lesson_detail(st.session_state[detail_key])
+        return
+
+    instruction_key = f"instruction_{detail_key}"
+    st.text_area(
+        "your special instructions (optional):",
+        help="got specific ideas? tell me what to focus on",
+        key=instruction_key,
+        placeholder="e.g. 'focus on real-world applications'"
+    )
 
-        st.markdown("---")
+    if st.button("🚀 generate lesson", key=f"gen_{detail_key}"):
+        detail = st.session_state.generator.generate_lesson_detail(
+            st.session_state.user_input,
+            st.session_state.course_info,
+            section_title,
+            lesson,
+            st.session_state.get(instruction_key),
+            on_token=live_markdown(st.empty())
+        )
+        save_lesson_detail(section_title, lesson["title"], detail)
+        st.rerun(scope="fragment")
 
 def show_lessons(all_lessons):
     st.subheader("Detailed Course Content")
@@ -81,20 +372,34 @@ def show_lessons(all_lessons):
             st.write(section["section_description"])
 
             for lesson in section["lessons"]:
-                st.write(f"### 📝 {lesson['title']}")
-                st.write(f"Duration: {lesson['duration']} minutes")
-
-                st.write("#### Key Points")
-                for point in lesson["lesson_content"]["key_points"]:
-                    st.write(f"- **{point['concept']}:** {point['explanation']}")
-
-                st.write("#### Examples")
-                for example in lesson["lesson_content"]["examples"]:
-                    st.write(f"- {example}")
-
-                st.write("#### Key Takeaways")
-                for takeaway in lesson["lesson_content"]["takeaways"]:
-                    st.write(f"- {takeaway}")
+                show_lesson_card(section["section_title"], lesson)
+
+@timed_fragment
+def show_lesson_card(section_title, lesson):
+    """one finished lesson - answering its quiz reruns just this card"""
+    st.write(f"### 📝 {lesson['title']}")
+    st.write(f"Duration: {lesson['duration']} minutes")
+
+    if "lesson_content" not in lesson:
+        # outline from generate_lessons_for_section, maybe with a generated body
+        st.write(lesson["brief"])
+        if "detail" in lesson:
+            st.markdown(lesson["detail"])
+        if "quiz" in lesson:
+            show_quiz(lesson["quiz"], f"answers_{section_title}_{lesson['title']}")
+        return
+
+    st.write("#### Key Points")
+    for point in lesson["lesson_content"]["key_points"]:
+        st.write(f"- **{point['concept']}:** {point['explanation']}")
+
+    st.write("#### Examples")
+    for example in lesson["lesson_content"]["examples"]:
+        st.write(f"- {example}")
+
+    st.write("#### Key Takeaways")
+    for takeaway in lesson["lesson_content"]["takeaways"]:
+        st.write(f"- {takeaway}")
 
 def show_section_lessons(section_lessons):
     """show lesson outlines for current section"""
@@ -102,25 +407,33 @@ def show_section_lessons(section_lessons):
 
     for lesson in section_lessons["lessons"]:
         with st.expander(f"📝 {lesson['title']} ({lesson['duration']} mins)"):
-            st.write(lesson["brief"])
-
-            # store details in session state if we have them
-            lesson_key = f"lesson_detail_{section_lessons['section_title']}_{lesson['title']}"
-
-            if lesson_key in st.session_state:
-                detail = st.session_state[lesson_key]
-                show_lesson_detail(detail)
-            else:
-                if st.button("Generate Full Lesson", key=f"gen_{lesson_key}"):
-                    # generate details when requested
-                    detail = st.session_state.generator.generate_lesson_detail(
-                        st.session_state.user_input,
-                        st.session_state.course_info,
-                        section_lessons['section_title'],
-                        lesson
-                    )
-                    st.session_state[lesson_key] = detail
-                    show_lesson_detail(detail)
+            show_lesson_outline(section_lessons['section_title'], lesson)
+
+@timed_fragment
+def show_lesson_outline(section_title, lesson):
+    """one lesson outline - generating its body reruns just this lesson"""
+    st.write(lesson["brief"])
+
+    # store details in session state if we have them
+    lesson_key = f"lesson_detail_{section_title}_{lesson['title']}"
+
+    if lesson_key in st.session_state:
+        detail = st.session_state[lesson_key]
+        show_lesson_detail(detail)
+    else:
+        if st.button("Generate Full Lesson", key=f"gen_{lesson_key}"):
+            # generate details when requested
+            live = st.empty()
+            detail = st.session_state.generator.generate_lesson_detail(
+                st.session_state.user_input,
+                st.session_state.course_info,
+                section_title,
+                lesson,
+                on_token=live_markdown(live)
+            )
+            live.empty()
+            save_lesson_detail(section_title, lesson['title'], detail)
+            show_lesson_detail(detail)
 
 def show_quiz(quiz, answers_key):
     """display quiz with state management"""
@@ -199,7 +512,10 @@ def show_quiz(quiz, answers_key):
                     answers[k] = None
 
 def show_lesson_detail(detail: str):
-    """Show the lesson content with word count and quiz"""
+    """Show the lesson content with word count and quiz
+
+    only called from lesson fragments, so quiz clicks rerun the one lesson
+    """
     # NEW: add word count info before content
     word_count = len(detail.split())
     target = st.session_state.user_input["structure"]["word_count"]
@@ -209,8 +525,7 @@ def show_lesson_detail(detail: str):
     st.markdown(detail)
 
     # existing quiz section
-    lesson_id = str(hash(detail))
-    quiz_key = f"quiz_{lesson_id}"
+    quiz_key = store_quiz_key(detail)
     with st.expander("🧠 knowledge check", expanded=False):
         if quiz_key in st.session_state:
             show_quiz(st.session_state[quiz_key], f"answers_{quiz_key}")
@@ -225,7 +540,8 @@ def show_lesson_detail(detail: str):
                         detail
                     )
                     st.session_state[quiz_key] = quiz
-                    st.rerun()
+                    persist_artifact("quiz", quiz_key, quiz)
+                    st.rerun(scope="fragment")
 
 def _extract_title(markdown: str) -> str:
     """Helper to get first h1 from markdown"""
@@ -233,299 +549,474 @@ def _extract_title(markdown: str) -> str:
         return match.group(1)
     return 'current lesson'  # fallback
 
-# Sidebar for configuration
-with st.sidebar:
-    st.header("📝 Configuration")
-    api_key = st.text_input(
-        "OpenAI API Key",
-        type="password",
-        help="Enter your OpenAI API key",
-        key="api_key_input"
-    )
-
-    if st.button("Save API Key"):
-        if api_key:
-            st.session_state['OPENAI_API_KEY'] = api_key
-            st.success("API key saved!")
-        else:
-            st.error("Please enter an API key")
-
-    # show generation progress
-    if 'generation_stage' in st.session_state:
-        st.header("Generation Progress")
-        stages = ['input', 'toc', 'course_info', 'sections', 'lessons', 'complete']
-        current = stages.index(st.session_state.generation_stage)
-
-        progress = st.progress(current / (len(stages) - 1))
-        st.caption(f"Stage: {st.session_state.generation_stage}")
-
-if 'OPENAI_API_KEY' not in st.session_state:
-    st.warning("Please configure your OpenAI API key in the sidebar to continue")
-else:
-    client = OpenAI(api_key=st.session_state['OPENAI_API_KEY'])
-
-    if 'course_info' in st.session_state:
-        show_course_info(st.session_state.course_info)
-
-    if st.session_state.generation_stage == 'input':
-        # predefined categories OUTSIDE the form
-        categories = [
-            "Default", "Mathematics", "Physics", "Chemistry", "Biology",
-            "Computer Science", "Engineering", "Data Science",
-            "Visual Arts", "Music", "Literature", "Creative Writing",
-            "Photography", "Film & Media", "Design",
-            "English", "Spanish", "Mandarin", "Japanese",
-            "French", "German", "Arabic",
-            "Business", "Marketing", "Finance", "Project Management",
-            "Leadership", "Communication", "Entrepreneurship",
-            "Philosophy", "Psychology", "History", "Political Science",
-            "Environmental Studies", "Health & Wellness",
-            "Personal Development", "Other"
-        ]
-
-        category = st.selectbox(
-            "Category",
-            options=categories,
-            help="Select the course category"
+# every script run is timed - python -m utils.tracing --reruns, or the performance page
+with ui_run("app", stage=st.session_state.generation_stage):
+    # Sidebar for configuration
+    with st.sidebar:
+        st.header("📝 Configuration")
+        api_key = st.text_input(
+            "OpenAI API Key",
+            type="password",
+            help="Enter your OpenAI API key",
+            key="api_key_input"
         )
 
-        # show "Other" field if they pick that option
-        if category == "Other":
-            custom_category = st.text_input(
-                "Custom Category",
-                help="Enter your custom course category"
-            )
+        if st.button("Save API Key"):
+            if api_key:
+                st.session_state['OPENAI_API_KEY'] = api_key
+                st.success("API key saved!")
+            else:
+                st.error("Please enter an API key")
+
+        with st.expander("📂 saved courses"):
+            for course in get_course_store().list_courses(limit=10):
+                updated = time.strftime('%b %d %H:%M', time.localtime(course['updated']))
+                label = f"{course['category'] or 'course'} · {course['stage']} · {updated}"
+                if st.button(label, key=f"resume_{course['id']}"):
+                    for key in list(st.session_state.keys()):
+                        if key != 'OPENAI_API_KEY':
+                            del st.session_state[key]
+                    st.query_params.clear()
+                    st.query_params["course"] = course['id']
+                    st.rerun()
 
-        # now start the form
-        with st.form("course_input"):
+        # show generation progress
+        if 'generation_stage' in st.session_state:
+            st.header("Generation Progress")
+            stages = ['input', 'toc', 'course_info', 'sections', 'lessons', 'complete']
+            current = stages.index(st.session_state.generation_stage)
+
+            progress = st.progress(current / (len(stages) - 1))
+            st.caption(f"Stage: {st.session_state.generation_stage}")
+
+        st.number_input(
+            "Parallel generations",
+            min_value=1,
+            max_value=16,
+            value=4,
+            help="How many lessons to generate at once with the ⚡ buttons",
+            key="max_concurrency"
+        )
+        st.selectbox(
+            "Backend",
+            options=["assistants", "chat"],
+            help="assistants: threads + runs with file search. "
+                 "chat: one Chat Completions request per step with structured json output",
+            key="backend"
+        )
+        st.checkbox(
+            "Stream responses",
+            value=True,
+            help="Use streaming runs instead of polling for completion",
+            key="stream_runs"
+        )
+        st.selectbox(
+            "Thread scope",
+            options=["isolated", "shared"],
+            help="isolated: each step gets a fresh thread with only its own context. "
+                 "shared: every step appends to one course-long thread",
+            key="thread_scope"
+        )
 
-            tone = st.selectbox(
-                "Tone",
-                options=["Professional", "Friendly", "Informative", "Engaging",
-                        "Casual", "Humorous", "Storytelling", "Analytical", "Inspiring"],
-                help="Select the teaching style and tone"
-            )
+        st.selectbox(
+            "Context compaction",
+            options=["truncate", "retrieve", "summarize"],
+            help="How oversized uploaded content is shrunk to fit each step's token budget",
+            key="compaction"
+        )
+        st.selectbox(
+            "Local retrieval",
+            options=["bm25", "vector", "off"],
+            help="Index uploads locally and send only the chunks relevant to each section/lesson",
+            key="retrieval"
+        )
+        st.checkbox(
+            "OpenAI file search",
+            value=True,
+            help="Also upload materials to a remote vector store for the assistant's file_search tool",
+            key="remote_search"
+        )
+        st.checkbox(
+            "Reuse cached responses",
+            value=True,
+            help="Skip the API for steps already generated with identical inputs",
+            key="use_cache"
+        )
 
-            language = st.text_input(
-                "Course Language",
-                help="Enter the language for course content generation"
+        with st.expander("⏱️ step latency"):
+            for name, metrics in latency.snapshot().items():
+                st.caption(name)
+                for metric, stats in metrics.items():
+                    st.text(f"{metric}: n={stats['count']} mean={stats['mean']:.1f}s max={stats['max']:.1f}s")
+
+    if 'OPENAI_API_KEY' not in st.session_state:
+        st.warning("Please configure your OpenAI API key in the sidebar to continue")
+    else:
+        client = make_client()
+
+        if 'course_id' not in st.session_state and st.query_params.get('course'):
+            rehydrate_course(client, st.query_params['course'])
+
+        job = current_job(client)
+        if job:
+            with st.sidebar:
+                show_job_progress(job)
+
+        if 'course_info' in st.session_state:
+            show_course_info(st.session_state.course_info)
+
+        if st.session_state.generation_stage == 'input':
+            # predefined categories OUTSIDE the form
+            categories = [
+                "Default", "Mathematics", "Physics", "Chemistry", "Biology",
+                "Computer Science", "Engineering", "Data Science",
+                "Visual Arts", "Music", "Literature", "Creative Writing",
+                "Photography", "Film & Media", "Design",
+                "English", "Spanish", "Mandarin", "Japanese",
+                "French", "German", "Arabic",
+                "Business", "Marketing", "Finance", "Project Management",
+                "Leadership", "Communication", "Entrepreneurship",
+                "Philosophy", "Psychology", "History", "Political Science",
+                "Environmental Studies", "Health & Wellness",
+                "Personal Development", "Other"
+            ]
+
+            category = st.selectbox(
+                "Category",
+                options=categories,
+                help="Select the course category"
             )
 
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                start_age = st.number_input("Start Age", min_value=5, max_value=100, value=18)
-            with col2:
-                end_age = st.number_input("End Age", min_value=5, max_value=100, value=65)
-            with col3:
-                familiarity = st.selectbox(
-                    "Familiarity Level",
-                    options=["Beginner", "Intermediate", "Advanced"]
+            # show "Other" field if they pick that option
+            if category == "Other":
+                custom_category = st.text_input(
+                    "Custom Category",
+                    help="Enter your custom course category"
                 )
 
-            col4, col5 = st.columns(2)
-            with col4:
-                course_duration = st.number_input(
-                    "Course Duration (hours)",
-                    min_value=1,
-                    max_value=40,
-                    value=10
-                )
-            with col5:
-                lesson_length = st.number_input(
-                    "Lesson Length (minutes)",
-                    min_value=15,
-                    max_value=120,
-                    value=45
+            # now start the form
+            with st.form("course_input"):
+
+                tone = st.selectbox(
+                    "Tone",
+                    options=["Professional", "Friendly", "Informative", "Engaging",
+                            "Casual", "Humorous", "Storytelling", "Analytical", "Inspiring"],
+                    help="Select the teaching style and tone"
                 )
-            col6, _ = st.columns([1, 1])  # using columns for layout consistency
-            with col6:
-                word_count = st.number_input(
-                    "Words per Lesson",
-                    min_value=100,
-                    max_value=5000,
-                    value=500,
-                    help="Target word count for each lesson's content"
+
+                language = st.text_input(
+                    "Course Language",
+                    help="Enter the language for course content generation"
                 )
 
-            main_content = st.text_area(
-                "Main Content",
-                help="Outline the primary topics and content to be covered (optional if reference materials provided)"
-            )
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    start_age = st.number_input("Start Age", min_value=5, max_value=100, value=18)
+                with col2:
+                    end_age = st.number_input("End Age", min_value=5, max_value=100, value=65)
+                with col3:
+                    familiarity = st.selectbox(
+                        "Familiarity Level",
+                        options=["Beginner", "Intermediate", "Advanced"]
+                    )
 
-            uploaded_files = st.file_uploader(
-                "Upload reference materials (optional if main content provided)",
-                type=["pdf", "txt", "md", "docx"],
-                accept_multiple_files=True
-            )
+                col4, col5 = st.columns(2)
+                with col4:
+                    course_duration = st.number_input(
+                        "Course Duration (hours)",
+                        min_value=1,
+                        max_value=40,
+                        value=10
+                    )
+                with col5:
+                    lesson_length = st.number_input(
+                        "Lesson Length (minutes)",
+                        min_value=15,
+                        max_value=120,
+                        value=45
+                    )
+                col6, _ = st.columns([1, 1])  # using columns for layout consistency
+                with col6:
+                    word_count = st.number_input(
+                        "Words per Lesson",
+                        min_value=100,
+                        max_value=5000,
+                        value=500,
+                        help="Target word count for each lesson's content"
+                    )
 
-            submitted = st.form_submit_button("Start Generation")
+                main_content = st.text_area(
+                    "Main Content",
+                    help="Outline the primary topics and content to be covered (optional if reference materials provided)"
+                )
 
-        if submitted:
-            # validate required inputs
-            missing = []
-            if not language:
-                missing.append("language")
-            if category == "Other" and not custom_category:
-                missing.append("custom category")
+                uploaded_files = st.file_uploader(
+                    "Upload reference materials (optional if main content provided)",
+                    type=["pdf", "txt", "md", "docx"],
+                    accept_multiple_files=True
+                )
 
-            if missing:
-                st.error(f"Please fill in: {', '.join(missing)}")
-            else:
-                final_category = custom_category if category == "Other" else category
-                st.session_state.user_input = {
-                    "language": language,
-                    "category": final_category,
-                    "tone": tone,
-                    "audience": {
-                        "age_range": {"start": start_age, "end": end_age},
-                        "familiarity": familiarity
-                    },
-                    "structure": {
-                        "course_duration": course_duration,
-                        "lesson_length": lesson_length,
-                        "word_count": word_count
-                    },
-                    "content": {
-                        "main_content": main_content
+                submitted = st.form_submit_button("Start Generation")
+
+            if submitted:
+                # validate required inputs
+                missing = []
+                if not language:
+                    missing.append("language")
+                if category == "Other" and not custom_category:
+                    missing.append("custom category")
+
+                if missing:
+                    st.error(f"Please fill in: {', '.join(missing)}")
+                else:
+                    final_category = custom_category if category == "Other" else category
+                    st.session_state.user_input = {
+                        "language": language,
+                        "category": final_category,
+                        "tone": tone,
+                        "audience": {
+                            "age_range": {"start": start_age, "end": end_age},
+                            "familiarity": familiarity
+                        },
+                        "structure": {
+                            "course_duration": course_duration,
+                            "lesson_length": lesson_length,
+                            "word_count": word_count
+                        },
+                        "content": {
+                            "main_content": main_content
+                        }
                     }
-                }
-                st.session_state.uploaded_files = uploaded_files
-                st.session_state.generation_stage = 'toc'
-                st.rerun()
-
-    elif st.session_state.generation_stage == 'toc':
-        st.write("🔍 analyzing content structure...")
-
-        try:
-            # initialize generator
-            generator = CourseGenerator(client)
-
-            # FIRST: process files if we have them
-            content_found = False
-            if st.session_state.uploaded_files:
-                content_found = generator.process_files(st.session_state.uploaded_files)
-
-            # SECOND: set up vector store if needed
-            vector_store_id = None
-            if st.session_state.uploaded_files:
-                vector_store_id = process_uploaded_file(client, st.session_state.uploaded_files)
-
-            # THIRD: initialize assistant with vector store
-            generator.init_assistant(vector_store_id)
-
-            # FINALLY: try to extract ToC if we found content
-            if content_found:
-                raw_toc = generator.extract_toc()
-                if raw_toc:
-                    st.session_state.raw_toc = raw_toc
-
-            # store generator and move on
-            st.session_state.generator = generator
-            st.session_state.generation_stage = 'course_info'
-            st.rerun()
-
-        except Exception as e:
-            st.error(f"error during content analysis: {str(e)}")
-            if 'vector_store_id' in locals():
-                cleanup_vector_store(client, vector_store_id)
+                    st.session_state.uploaded_files = uploaded_files
+                    st.session_state.course_id = get_course_store().create_course(st.session_state.user_input)
+                    st.query_params["course"] = st.session_state.course_id
+                    set_stage('toc')
+                    st.rerun()
 
-    elif st.session_state.generation_stage == 'course_info':
-        try:
-            course_info = st.session_state.generator.generate_course_info(
-                st.session_state.user_input
-            )
-            st.session_state.course_info = course_info  # now stores markdown string
+        elif st.session_state.generation_stage == 'toc':
+            st.write("🔍 analyzing content structure...")
 
-            if st.button("✨ Generate Course Structure"):
-                st.session_state.generation_stage = 'sections'
+            try:
+                # initialize generator
+                generator = make_generator(client)
+
+                # FIRST: process files if we have them
+                content_found = False
+                if st.session_state.uploaded_files:
+                    content_found = generator.process_files(st.session_state.uploaded_files)
+                    if generator.corpus:
+                        persist_artifact("source", "corpus", generator.corpus.to_dict())
+                        st.caption(" · ".join(
+                            f"📄 {doc.name} (~{doc.tokens:,} tokens)" for doc in generator.corpus.documents
+                        ))
+
+                # SECOND: set up vector store if needed
+                vector_store_id = None
+                if (st.session_state.uploaded_files and st.session_state.get('remote_search', True)
+                        and not generator.backend):
+                    upload_bar = st.progress(0.0, text="uploading reference materials...")
+                    upload_log = st.empty()
+                    timings = []
+
+                    def on_upload(done, total, name, seconds):
+                        timings.append(f"📄 {name}: {seconds:.1f}s")
+                        upload_bar.progress(done / total, text=f"uploaded {done}/{total} files")
+                        upload_log.text("\n".join(timings))
+
+                    # reuses the vector store if these exact files were indexed before
+                    vector_store_id = get_vector_manifest().acquire(
+                        client,
+                        st.session_state.uploaded_files,
+                        on_progress=on_upload
+                    )
+                    st.session_state.vector_store_id = vector_store_id
+
+                # THIRD: initialize assistant with vector store
+                generator.init_assistant(vector_store_id)
+
+                # FINALLY: try to extract ToC if we found content
+                if content_found:
+                    raw_toc = generator.extract_toc(st.session_state.user_input)
+                    if raw_toc:
+                        st.session_state.raw_toc = raw_toc
+
+                # store generator and move on
+                st.session_state.generator = generator
+                persist(
+                    toc=st.session_state.get('raw_toc'),
+                    generator={**generator.state(), "vector_store_id": vector_store_id}
+                )
+                set_stage('course_info')
                 st.rerun()
 
-        except Exception as e:
-            st.error(f"Error generating course info: {str(e)}")
-
-    elif st.session_state.generation_stage == 'sections':
-        # st.write("📑 generating course structure...")
-
-        try:
-            # Only generate sections if not already in session state
-            if 'sections' not in st.session_state:
-                sections = st.session_state.generator.generate_sections(
-                    st.session_state.user_input,
-                    st.session_state.course_info
-                )
-                st.session_state.sections = sections
+            except Exception as e:
+                st.error(f"error during content analysis: {str(e)}")
+                if locals().get('vector_store_id'):
+                    get_vector_manifest().release(vector_store_id)
+                    st.session_state.pop('vector_store_id', None)
 
-            show_sections(st.session_state.sections)
+        elif st.session_state.generation_stage == 'course_info':
+            try:
+                if 'course_info' not in st.session_state:
+                    live = st.empty()
+                    course_info = st.session_state.generator.generate_course_info(
+                        st.session_state.user_input,
+                        on_token=live_markdown(live)
+                    )
+                    st.session_state.course_info = course_info  # now stores markdown string
+                    persist(course_info=course_info)
+                    st.rerun()  # re-render through show_course_info at the top
 
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("👎 Regenerate Structure"):
-                    del st.session_state.sections
+                if st.button("✨ Generate Course Structure"):
+                    set_stage('sections')
                     st.rerun()
 
-        except Exception as e:
-            st.error(f"Error generating sections: {str(e)}")
-
-    elif st.session_state.generation_stage == 'lessons':
-            if 'current_section_index' not in st.session_state:
-                st.session_state.current_section_index = 0
-                st.session_state.generated_lessons = []
-
-            sections = st.session_state.sections["sections"]
-            current_section = sections[st.session_state.current_section_index]
+            except Exception as e:
+                st.error(f"Error generating course info: {str(e)}")
 
-            st.subheader(f"Generating Lessons for Section {st.session_state.current_section_index + 1}/{len(sections)}")
-            st.write(f"📘 {current_section['title']}")
-            st.write(current_section['description'])
+        elif st.session_state.generation_stage == 'sections':
+            # st.write("📑 generating course structure...")
 
             try:
-                if 'current_section_lessons' not in st.session_state:
-                    # generate lessons for this section
-                    section_lessons = st.session_state.generator.generate_lessons_for_section(
+                # Only generate sections if not already in session state
+                if 'sections' not in st.session_state:
+                    preview = st.empty()
+                    sections = st.session_state.generator.generate_sections(
                         st.session_state.user_input,
                         st.session_state.course_info,
-                        current_section
+                        bypass_cache=st.session_state.pop('regenerate_sections', False),
+                        on_partial=live_sections(preview)
                     )
-                    st.session_state.current_section_lessons = section_lessons
+                    preview.empty()
+                    st.session_state.sections = sections
+                    persist(sections=sections)
 
-                # show the generated lessons
-                show_section_lessons(st.session_state.current_section_lessons)
+                show_sections(st.session_state.sections)
 
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("👎 Regenerate These Lessons"):
-                        del st.session_state.current_section_lessons
+                    if st.button("👎 Regenerate Structure"):
+                        del st.session_state.sections
+                        st.session_state.regenerate_sections = True
                         st.rerun()
 
                 with col2:
-                    if st.button("👍 Keep These Lessons"):
-                        # save these lessons
-                        st.session_state.generated_lessons.append(
-                            st.session_state.current_section_lessons
-                        )
-
-                        # move to next section or finish
-                        if st.session_state.current_section_index + 1 < len(sections):
-                            st.session_state.current_section_index += 1
-                            del st.session_state.current_section_lessons
-                        else:
-                            st.session_state.lessons = st.session_state.generated_lessons
-                            st.session_state.generation_stage = 'complete'
-                        st.rerun()
+                    if job is None:
+                        if st.button("🏭 Generate Everything in Background"):
+                            start_background_job()
+                            st.rerun()
+                    elif job.status == 'done':
+                        if st.button("📚 Open Generated Course"):
+                            st.session_state.lessons = job.section_lessons()
+                            set_stage('complete')
+                            st.rerun()
+                    elif not job.is_alive():
+                        if st.button("🔁 Resume Background Job"):
+                            job.start()
+                            st.rerun()
 
             except Exception as e:
-                st.error(f"Error generating lessons: {str(e)}")
+                st.error(f"Error generating sections: {str(e)}")
 
-    elif st.session_state.generation_stage == 'complete':
-        st.success("🎉 Course generation complete!")
+        elif st.session_state.generation_stage == 'lessons':
+                if 'current_section_index' not in st.session_state:
+                    st.session_state.current_section_index = 0
+                    st.session_state.generated_lessons = []
 
-        show_course_info(st.session_state.course_info)
-        show_sections(st.session_state.sections)
-        show_lessons(st.session_state.lessons)
+                sections = st.session_state.sections["sections"]
+                current_section = sections[st.session_state.current_section_index]
 
-        if st.button("🔄 Start New Course"):
-            for key in list(st.session_state.keys()):
-                if key != 'OPENAI_API_KEY':
-                    del st.session_state[key]
-            st.session_state.generation_stage = 'input'
-            st.rerun()
+                st.subheader(f"Generating Lessons for Section {st.session_state.current_section_index + 1}/{len(sections)}")
+                st.write(f"📘 {current_section['title']}")
+                st.write(current_section['description'])
+
+                try:
+                    if 'current_section_lessons' not in st.session_state:
+                        # generate lessons for this section
+                        section_lessons = st.session_state.generator.generate_lessons_for_section(
+                            st.session_state.user_input,
+                            st.session_state.course_info,
+                            current_section,
+                            bypass_cache=st.session_state.pop('regenerate_lessons', False)
+                        )
+                        st.session_state.current_section_lessons = section_lessons
+
+                    # show the generated lessons
+                    show_section_lessons(st.session_state.current_section_lessons)
+
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        if st.button("👎 Regenerate These Lessons"):
+                            del st.session_state.current_section_lessons
+                            st.session_state.regenerate_lessons = True
+                            st.rerun()
+
+                    if st.button("⚡ Generate All Remaining Sections"):
+                        # keep the current outlines, fan out the rest in one go
+                        remaining = sections[st.session_state.current_section_index + 1:]
+                        with st.spinner("outlining every section at once... 🧪"):
+                            rest, failures = run_async(lambda engine: engine.generate_all_section_lessons(
+                                st.session_state.user_input,
+                                st.session_state.course_info,
+                                remaining
+                            ))
+                        start = st.session_state.current_section_index
+                        # saved in order, so stop at the first failed section and pick up from there
+                        for offset, section_lessons in enumerate([st.session_state.current_section_lessons, *rest]):
+                            if section_lessons is None:
+                                break
+                            save_section_lessons(start + offset, section_lessons)
+                        if not failures:
+                            st.session_state.lessons = st.session_state.generated_lessons
+                            set_stage('complete')
+                            st.rerun()
+                        st.session_state.current_section_index = start + 1 + min(failures)
+                        del st.session_state.current_section_lessons
+                        st.error(f"{len(failures)} section(s) failed: " + "; ".join(
+                            f"{remaining[i]['title']} ({e})" for i, e in failures.items()
+                        ))
+
+                    with col2:
+                        if st.button("👍 Keep These Lessons"):
+                            # save these lessons
+                            save_section_lessons(
+                                st.session_state.current_section_index,
+                                st.session_state.current_section_lessons
+                            )
+
+                            # move to next section or finish
+                            if st.session_state.current_section_index + 1 < len(sections):
+                                st.session_state.current_section_index += 1
+                                del st.session_state.current_section_lessons
+                            else:
+                                st.session_state.lessons = st.session_state.generated_lessons
+                                set_stage('complete')
+                            st.rerun()
+
+                except Exception as e:
+                    st.error(f"Error generating lessons: {str(e)}")
+
+        elif st.session_state.generation_stage == 'complete':
+            st.success("🎉 Course generation complete!")
+
+            # course info is already drawn at the top of every run
+            show_sections(st.session_state.sections)
+            show_lessons(st.session_state.lessons)
+
+            if st.button("🔄 Start New Course"):
+                if job:
+                    job.cancel()
+                st.query_params.clear()
+                if st.session_state.get('vector_store_id'):
+                    get_vector_manifest().release(st.session_state.vector_store_id)
+                get_vector_manifest().gc(client)
+                threads = get_thread_pool(client.api_key)
+                if st.session_state.get('generator') and st.session_state.generator.thread_id:
+                    # this session's shared course thread - sweep() only collects released ones
+                    threads.release(st.session_state.generator.thread_id)
+                threads.sweep()
+                for key in list(st.session_state.keys()):
+                    if key != 'OPENAI_API_KEY':
+                        del st.session_state[key]
+                st.session_state.generation_stage = 'input'
+                st.rerun()
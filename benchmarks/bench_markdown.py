@@ -0,0 +1,126 @@
+"""Markdown normalizer micro-benchmark
+
+    python benchmarks/bench_markdown.py [--repeat 200] [--scale 20]
+
+replays the model outputs in fixtures/markdown through the legacy per-line
+re.sub implementation and generator.markdown, checks both produce identical
+output (batch and streamed), then reports throughput for each
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generator.markdown import MarkdownStream, extract_markdown, normalize_markdown  # noqa: E402
+
+FIXTURES = Path(__file__).parent / "fixtures" / "markdown"
+
+# --- the implementation generator.markdown replaced, kept as the reference --- #
+
+def legacy_normalize_line(line):
+    line = line.strip()
+    if any(line.startswith(p) for p in ['#', '**#', '#**', '# **']):
+        clean = re.sub(r'[*#]+\s*', '', line)
+        if any(kw in clean.lower() for kw in ['overview', 'what you need', 'structure', 'requirements']):
+            return f"## {clean}"
+        return f"# {clean}"
+    line = re.sub(r'\*\*(.*?)\*\*', r'**\1**', line)
+    line = re.sub(r'__(.+?)__', r'**\1**', line)
+    if line.lstrip().startswith('-'):
+        return f"- {line.lstrip('-').strip()}"
+    return line
+
+def legacy_extract(content):
+    content = re.sub(r'#[A-Fa-f0-9]{6}', '', content)
+    content = '\n'.join(legacy_normalize_line(line) for line in content.split('\n') if line.strip())
+    if content.strip().startswith('#') or content.strip().startswith('-'):
+        return content.strip()
+    content_match = re.search(r'<content>(.*?)</content>', content, re.DOTALL)
+    if content_match:
+        return content_match.group(1).strip()
+    if '\n' in content and any(line.startswith(('#', '-', '*')) for line in content.split('\n')):
+        return content.strip()
+    return None
+
+def legacy_stream(content, chunk):
+    lines, partial = [], ""
+    for i in range(0, len(content), chunk):
+        *done, partial = (partial + content[i:i + chunk]).split('\n')
+        for line in done:
+            line = re.sub(r'#[A-Fa-f0-9]{6}', '', line)
+            if not line.strip() or line.strip() in ('<content>', '</content>'):
+                continue
+            lines.append(legacy_normalize_line(line))
+        partial_text = partial.replace('<content>', '').strip()
+        text = '\n'.join(lines + ([partial_text] if partial_text else []))
+    return text
+
+def stream(content, chunk):
+    md = MarkdownStream()
+    text = ""
+    for i in range(0, len(content), chunk):
+        text = md.feed(content[i:i + chunk])
+    return text
+
+# --- harness --- #
+
+def load_fixtures(scale):
+    fixtures = {}
+    for path in sorted(FIXTURES.glob("*.md")):
+        # scale up to lesson-sized outputs (a fixture is a few hundred words)
+        fixtures[path.stem] = "\n".join([path.read_text(encoding="utf-8")] * scale)
+    return fixtures
+
+def best_of(fn, repeat):
+    """best wall time over repeat calls"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="timing runs per case, best is reported")
+    parser.add_argument("--scale", type=int, default=20, help="copies of each fixture per document")
+    parser.add_argument("--chunk", type=int, default=8, help="characters per streamed delta")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.scale)
+    mismatches = 0
+    for name, content in fixtures.items():
+        if legacy_extract(content) != extract_markdown(content):
+            print(f"MISMATCH (batch): {name}")
+            mismatches += 1
+        if legacy_stream(content, args.chunk) != stream(content, args.chunk):
+            print(f"MISMATCH (stream): {name}")
+            mismatches += 1
+    if mismatches:
+        return 1
+
+    print(f"{'fixture':<16}{'mode':<8}{'KB':>8}{'legacy MB/s':>14}{'new MB/s':>12}{'speedup':>10}")
+    for name, content in fixtures.items():
+        size = len(content.encode("utf-8"))
+        cases = [
+            ("batch", lambda: legacy_extract(content), lambda: extract_markdown(content)),
+            ("stream", lambda: legacy_stream(content, args.chunk), lambda: stream(content, args.chunk)),
+        ]
+        # streaming replays token-sized deltas, far fewer repeats keep it quick
+        for mode, old, new in cases:
+            repeat = args.repeat if mode == "batch" else max(1, args.repeat // 10)
+            old_s, new_s = best_of(old, repeat), best_of(new, repeat)
+            print(f"{name:<16}{mode:<8}{size / 1024:>8.1f}{size / old_s / 1e6:>14.2f}"
+                  f"{size / new_s / 1e6:>12.2f}{old_s / new_s:>9.1f}x")
+
+    # normalize_markdown alone, the part every non-json step pays for
+    content = "\n".join(fixtures.values())
+    print(f"normalize_markdown over all fixtures: {best_of(lambda: normalize_markdown(content), args.repeat) * 1e3:.2f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""End-to-end pipeline benchmark against the offline mock
+
+    python benchmarks/bench_pipeline.py --courses 3 --run-latency lognormal:0.5,0.3
+    python benchmarks/bench_pipeline.py --backend chat --stream --tps 400 --json baseline.json
+    python benchmarks/bench_pipeline.py --live --record cassettes/real.jsonl.gz   # real api, saved
+    python benchmarks/bench_pipeline.py --replay cassettes/real.jsonl.gz --replay-latency zero
+
+generates full courses (toc -> info -> sections -> lessons -> details -> quizzes)
+through generator.pipeline with benchmarks/mock_openai.py standing in for the
+api, then reports per stage: calls, wall time and CPU time spent in this
+process, plus api call counts by endpoint. the mock runs in a subprocess so
+its own CPU never shows up in ours. the shared request limiter
+(utils.resilience) is off against the mock and replays unless --rps asks for
+it, and whatever time it does hold requests back is reported on its own line -
+so with zero mock latency, wall time is pipeline overhead (polling, parsing,
+normalization, context building).
+--replay serves a recorded cassette (utils.cassette) instead, so parsing and
+orchestration changes can be compared on production-shaped output
+"""
+
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# keep registries, ledgers and caches out of the real ~/.course_generator
+os.environ.setdefault("COURSE_GENERATOR_HOME", tempfile.mkdtemp(prefix="course_bench_"))
+
+from openai import OpenAI  # noqa: E402
+
+from benchmarks.mock_openai import add_arguments  # noqa: E402
+from generator.backends import ChatCompletionsBackend  # noqa: E402
+from generator.course import CourseGenerator  # noqa: E402
+from generator.pipeline import generate_course  # noqa: E402
+from utils.cassette import cassette_client, open_cassette  # noqa: E402
+from utils.metrics import latency  # noqa: E402
+from utils.polling import BackoffPolicy  # noqa: E402
+from utils.resilience import DEFAULT_RESILIENCE, TokenBucket  # noqa: E402
+
+STAGES = (
+    "init_assistant",
+    "extract_toc",
+    "generate_course_info",
+    "generate_sections",
+    "generate_lessons_for_section",
+    "generate_lesson_detail",
+    "generate_quiz",
+)
+
+USER_INPUT = {
+    "language": "English",
+    "category": "Data Engineering",
+    "tone": "Friendly",
+    "audience": {"age_range": {"start": 18, "end": 40}, "familiarity": "Beginner"},
+    "structure": {"course_duration": 4, "lesson_length": 30, "word_count": 1200},
+    "content": {"main_content": "pipelines, idempotency, orchestration, data quality, warehousing"},
+}
+
+class StageTimer:
+    """wall + thread CPU time per generator method"""
+
+    def __init__(self):
+        self.stats = {stage: {"calls": 0, "wall": 0.0, "cpu": 0.0} for stage in STAGES}
+
+    def instrument(self, generator):
+        for stage in STAGES:
+            setattr(generator, stage, self._timed(stage, getattr(generator, stage)))
+        return generator
+
+    def _timed(self, stage, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                entry = self.stats[stage]
+                entry["calls"] += 1
+                entry["wall"] += time.perf_counter() - wall
+                entry["cpu"] += time.thread_time() - cpu
+        return wrapper
+
+def start_mock(args):
+    """launch mock_openai.py on a free port, returns (process, base_url)"""
+    command = [
+        sys.executable, str(ROOT / "benchmarks" / "mock_openai.py"), "--port", "0",
+        "--run-latency", args.run_latency, "--ttft", args.ttft, "--api-latency", args.api_latency,
+        "--tps", str(args.tps), "--rate-limit-rate", str(args.rate_limit_rate),
+        "--fail-rate", str(args.fail_rate), "--seed", str(args.seed),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+def mock_stats(base_url):
+    with urllib.request.urlopen(base_url[:-len("/v1")] + "/_stats") as response:
+        return json.load(response)
+
+def configure_limiter(args):
+    """swap the process-wide token bucket for the one this run asked for
+
+    --rps 0 (the default against the mock/replay) turns it off, --live keeps
+    $OPENAI_REQUESTS_PER_SECOND unless --rps overrides it
+    """
+    rps = args.rps
+    if rps is None:
+        rps = float(os.environ.get("OPENAI_REQUESTS_PER_SECOND", 8)) if args.live else 0
+    DEFAULT_RESILIENCE.limiter = TokenBucket(rps) if rps > 0 else None
+    return DEFAULT_RESILIENCE.limiter
+
+def run(args, client):
+    timer = StageTimer()
+    limiter = configure_limiter(args)
+    # polling intervals tuned for real runs would dominate a zero-latency mock,
+    # keep the production policy unless asked so poll overhead shows up honestly
+    policy = BackoffPolicy(initial=args.poll_initial) if args.poll_initial else None
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for n in range(args.courses):
+        generator = CourseGenerator(
+            client,
+            stream=args.stream,
+            poll_policy=policy,
+            backend=ChatCompletionsBackend(client) if args.backend == "chat" else None,
+        )
+        timer.instrument(generator)
+        user_input = dict(USER_INPUT, content={"main_content": f"{USER_INPUT['content']['main_content']} #{n}"})
+        generate_course(generator, user_input, quizzes=not args.no_quizzes)
+        generator.threads.drain()
+
+    return {
+        "courses": args.courses,
+        "wall": time.perf_counter() - wall,
+        "cpu": time.process_time() - cpu,
+        "stages": timer.stats,
+        "steps": latency.snapshot(),
+        "limiter": {"rps": limiter.rate, "waited": limiter.waited} if limiter else None,
+    }
+
+def report(result, stats):
+    print(f"{result['courses']} course(s): {result['wall']:.2f}s wall, {result['cpu']:.2f}s cpu "
+          f"({result['wall'] / result['courses']:.2f}s / course)")
+    if result["limiter"]:
+        # summed over concurrent callers, so it can exceed wall time
+        print(f"rate limiter at {result['limiter']['rps']:g} rps held requests back "
+              f"{result['limiter']['waited']:.2f}s in total")
+    else:
+        print("rate limiter off")
+    print(f"\n{'stage':<30}{'calls':>7}{'wall s':>10}{'cpu s':>9}{'cpu ms/call':>13}")
+    for stage, entry in result["stages"].items():
+        if entry["calls"]:
+            print(f"{stage:<30}{entry['calls']:>7}{entry['wall']:>10.3f}{entry['cpu']:>9.3f}"
+                  f"{entry['cpu'] / entry['calls'] * 1e3:>13.2f}")
+    print(f"\n{stats['total']} api calls")
+    for endpoint, count in sorted(stats["calls"].items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>6}  {endpoint}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--courses", type=int, default=1)
+    parser.add_argument("--backend", choices=["assistants", "chat"], default="assistants")
+    parser.add_argument("--stream", action="store_true", help="stream runs instead of polling")
+    parser.add_argument("--no-quizzes", action="store_true")
+    parser.add_argument("--rps", type=float, default=None,
+                        help="shared request limit, 0 = off (default off, $OPENAI_REQUESTS_PER_SECOND with --live)")
+    parser.add_argument("--poll-initial", type=float, default=None, help="first poll delay override (seconds)")
+    parser.add_argument("--json", help="also write the raw results here")
+    parser.add_argument("--live", action="store_true", help="use the real api ($OPENAI_API_KEY) instead of the mock")
+    parser.add_argument("--record", help="save the traffic to this cassette")
+    parser.add_argument("--replay", help="serve this cassette instead of the mock")
+    parser.add_argument("--replay-latency", choices=["original", "zero"], default="zero")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        result = run(args, cassette_client(args.replay, "replay", args.replay_latency))
+        served = dict(open_cassette(args.replay).served)
+        stats = {"calls": served, "total": sum(served.values())}
+    elif args.live:
+        client = cassette_client(args.record, "record") if args.record else OpenAI()
+        result = run(args, client)
+        stats = {"calls": {}, "total": 0}
+    else:
+        process, base_url = start_mock(args)
+        try:
+            if args.record:
+                client = cassette_client(args.record, "record", base_url=base_url, api_key="mock")
+            else:
+                client = OpenAI(base_url=base_url, api_key="mock")
+            result = run(args, client)
+            stats = mock_stats(base_url)
+        finally:
+            process.terminate()
+            process.wait()
+
+    report(result, stats)
+    if args.json:
+        Path(args.json).write_text(json.dumps({**result, "api": stats}, indent=2), encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
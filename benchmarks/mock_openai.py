@@ -0,0 +1,623 @@
+"""Offline stand-in for the OpenAI endpoints the generator uses
+
+    python benchmarks/mock_openai.py --port 8765 --run-latency lognormal:2,0.5 --tps 80
+
+point a client at it with OpenAI(base_url="http://127.0.0.1:8765/v1", api_key="mock").
+implements assistants, threads, messages, runs (polled and streamed), files,
+vector stores + file batches and chat completions - just enough of each for
+CourseGenerator, utils.file_handler and the vector store manifest.
+
+outputs are canned but shaped like the real thing: the step is recognized from
+the prompt at the top of the message, and word counts / lesson counts come from
+the step's context, so parsing and normalization see production-sized text.
+latency is sampled per run from a configurable distribution, optionally with
+injected 429s and failed runs to exercise utils.resilience.
+
+GET /_stats returns call counts per endpoint, POST /_reset clears them
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generator.prompts import PROMPT_NAMES  # noqa: E402
+
+# --- latency --- #
+
+@dataclass
+class Latency:
+    """seconds sampled from fixed:s, uniform:lo,hi or lognormal:median,sigma"""
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec):
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v] or [0.0]
+        return cls(kind, values[0], values[1] if len(values) > 1 else 0.0)
+
+    def sample(self, rng):
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(0, self.b) * self.a if self.a else 0.0
+        return self.a
+
+@dataclass
+class MockConfig:
+    run_latency: Latency = field(default_factory=Latency)  # polled run: created -> completed
+    ttft: Latency = field(default_factory=Latency)         # streamed run/completion: first token
+    api_latency: Latency = field(default_factory=Latency)  # every request, before responding
+    tokens_per_second: float = 0.0     # streaming pace, 0 = as fast as possible
+    rate_limit_rate: float = 0.0       # fraction of run/completion creates answered with 429
+    fail_rate: float = 0.0             # fraction of runs ending failed/server_error
+    seed: int = 0
+
+# --- canned outputs --- #
+
+WORDS = ("data pipeline system model design concept process example result method "
+         "structure principle practice pattern analysis feature layer signal state value").split()
+
+def split_message(message):
+    """(step name, context dict) from a ContextBuilder message"""
+    prompt, _, context = message.partition("\n\nContext: ")
+    name = PROMPT_NAMES.get(prompt, "custom")
+    try:
+        return name, json.loads(context)
+    except json.JSONDecodeError:
+        return name, {}
+
+def _sentence(rng, words):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+def _paragraph(rng, words):
+    parts, left = [], words
+    while left > 0:
+        n = min(left, rng.randint(8, 18))
+        parts.append(_sentence(rng, n))
+        left -= n
+    return " ".join(parts)
+
+def canned_output(message):
+    """plausible output for the step the message belongs to"""
+    name, context = split_message(message)
+    rng = random.Random(hashlib.sha256(message.encode("utf-8")).digest())
+    category = context.get("category", "General")
+    structure = context.get("structure", {})
+
+    if name == "toc":
+        lines = []
+        for i in range(1, 5):
+            lines.append(f"{i}. {_sentence(rng, 3)[:-1]}")
+            lines.extend(f"   {i}.{j} {_sentence(rng, 4)[:-1]}" for j in range(1, 4))
+        return "\n".join(lines)
+
+    if name == "course_info":
+        return "\n".join([
+            f"# {category}: {_sentence(rng, 4)[:-1]}",
+            "## Overview",
+            _paragraph(rng, 90),
+            "## What You Need",
+            *(f"- {_sentence(rng, 6)}" for _ in range(4)),
+            "## Course Structure",
+            _paragraph(rng, 60),
+        ])
+
+    if name == "sections":
+        lesson_length = structure.get("lesson_length", 30)
+        sections = []
+        for _ in range(rng.randint(3, 5)):
+            lessons = [
+                {"title": _sentence(rng, 4)[:-1], "brief": _sentence(rng, 14), "duration": lesson_length}
+                for _ in range(rng.randint(2, 4))
+            ]
+            sections.append({
+                "title": _sentence(rng, 3)[:-1],
+                "description": _sentence(rng, 16),
+                "lessons": lessons,
+                "estimated_time": lesson_length * len(lessons),
+            })
+        return json.dumps({"sections": sections}, indent=2)
+
+    if name == "lessons":
+        count = context.get("total_lessons_needed") or 3
+        lesson_length = structure.get("lesson_length", 30)
+        return json.dumps({"lessons": [
+            {"title": _sentence(rng, 4)[:-1], "duration": lesson_length, "brief": _sentence(rng, 18)}
+            for _ in range(count)
+        ]}, indent=2)
+
+    if name == "lesson_detail":
+        target = context.get("word_count") or 800
+        title = (context.get("lesson") or {}).get("title", "Lesson")
+        parts, words = [f"# {title}", "## Overview"], 0
+        while words < target:
+            parts.append(f"## {_sentence(rng, 3)[:-1]}")
+            chunk = min(target - words, rng.randint(80, 160))
+            parts.append(_paragraph(rng, chunk))
+            parts.extend(f"- {_sentence(rng, 8)}" for _ in range(3))
+            words += chunk + 24
+        return "\n\n".join(parts)
+
+    if name == "quiz":
+        questions = []
+        for i in range(6):
+            if i % 2:
+                questions.append({"type": "true_false", "statement": _sentence(rng, 10),
+                                  "correct": rng.random() < 0.5, "explanation": _sentence(rng, 14)})
+            else:
+                questions.append({"type": "multi_choice", "question": _sentence(rng, 10)[:-1] + "?",
+                                  "options": [_sentence(rng, 4) for _ in range(4)], "correct": rng.randrange(4)})
+        return json.dumps({"questions": questions, "meta": {"total_questions": 6, "estimated_minutes": 5}}, indent=2)
+
+    return _paragraph(rng, 120)
+
+def tokens(text):
+    """rough token count, same 4 chars/token heuristic as utils.corpus"""
+    return max(1, len(text) // 4)
+
+# --- state --- #
+
+def _id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+class MockState:
+    """everything the server has been asked to create"""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.RLock()  # new_run samples latency while the caller holds it
+        self.assistants = {}
+        self.threads = {}     # id -> {"messages": [...], "metadata": ...}
+        self.runs = {}        # id -> run dict + private "_ready_at"/"_output"
+        self.files = {}
+        self.vector_stores = {}
+        self.batches = {}
+        self.calls = {}
+
+    def count(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def sample(self, latency):
+        with self.lock:
+            return latency.sample(self.rng)
+
+    def roll(self, rate):
+        with self.lock:
+            return self.rng.random() < rate
+
+    def message(self, thread_id, role, content, run_id=None, assistant_id=None):
+        msg = {
+            "id": _id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+            "run_id": run_id,
+            "assistant_id": assistant_id,
+            "attachments": [],
+            "metadata": {},
+            "status": "completed",
+        }
+        self.threads[thread_id]["messages"].append(msg)
+        return msg
+
+    def new_run(self, thread_id, assistant_id):
+        thread = self.threads[thread_id]
+        prompt = next((m["content"][0]["text"]["value"] for m in reversed(thread["messages"]) if m["role"] == "user"), "")
+        output = canned_output(prompt)
+        run = {
+            "id": _id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "status": "queued",
+            "last_error": None,
+            "usage": None,
+            "_ready_at": time.monotonic() + self.sample(self.config.run_latency),
+            "_output": output,
+            "_prompt_tokens": tokens(prompt),
+            "_fails": self.roll(self.config.fail_rate),
+        }
+        self.runs[run["id"]] = run
+        return run
+
+    def advance(self, run):
+        """move a polled run along its lifecycle, returns the public view"""
+        if run["status"] == "queued":
+            run["status"] = "in_progress"
+        elif run["status"] == "in_progress" and time.monotonic() >= run["_ready_at"]:
+            self.finish(run)
+        return public(run)
+
+    def finish(self, run):
+        if run["_fails"]:
+            run["status"] = "failed"
+            run["last_error"] = {"code": "server_error", "message": "mock injected failure"}
+            return
+        self.message(run["thread_id"], "assistant", run["_output"], run["id"], run["assistant_id"])
+        run["status"] = "completed"
+        completion = tokens(run["_output"])
+        run["usage"] = {"prompt_tokens": run["_prompt_tokens"], "completion_tokens": completion,
+                        "total_tokens": run["_prompt_tokens"] + completion}
+
+def public(obj):
+    return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+def page(items):
+    return {"object": "list", "data": items, "first_id": items[0]["id"] if items else None,
+            "last_id": items[-1]["id"] if items else None, "has_more": False}
+
+def chunks(text, tokens_per_chunk=4):
+    """split text into roughly token-sized deltas"""
+    size = tokens_per_chunk * 4
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+# --- http --- #
+
+ROUTES = []
+
+def route(method, pattern):
+    def register(fn):
+        ROUTES.append((method, re.compile(f"^/v1{pattern}$"), fn))
+        return fn
+    return register
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, *args):
+        pass  # keep benchmark output clean
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        self.body = {}
+        if raw and self.headers.get("Content-Type", "").startswith("application/json"):
+            self.body = json.loads(raw)
+
+        if url.path == "/_stats":
+            return self.send_json(self.stats())
+        if url.path == "/_reset":
+            with self.state.lock:
+                self.state.calls.clear()
+            return self.send_json({"ok": True})
+
+        for route_method, pattern, fn in ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                self.state.count(f"{method} {pattern.pattern[4:-1].replace('([^/]+)', '{id}')}")
+                delay = self.state.sample(self.state.config.api_latency)
+                if delay:
+                    time.sleep(delay)
+                return fn(self, *match.groups())
+        self.send_error_json(404, f"no mock route for {method} {url.path}")
+
+    def stats(self):
+        with self.state.lock:
+            return {"calls": dict(self.state.calls), "total": sum(self.state.calls.values()),
+                    "runs": len(self.state.runs)}
+
+    def send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json({"error": {"message": message, "type": "mock_error", "code": None}}, status, headers)
+
+    def rate_limited(self):
+        """maybe answer with an injected 429, returns True if it did"""
+        if self.state.roll(self.state.config.rate_limit_rate):
+            self.send_error_json(429, "mock rate limit", {"retry-after-ms": "200"})
+            return True
+        return False
+
+    def start_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def event(self, data, name=None):
+        line = f"event: {name}\n" if name else ""
+        self.wfile.write(f"{line}data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def pace(self, deltas):
+        """sleep for ttft, then yield deltas at tokens_per_second"""
+        config = self.state.config
+        ttft = self.state.sample(config.ttft)
+        if ttft:
+            time.sleep(ttft)
+        for delta in deltas:
+            yield delta
+            if config.tokens_per_second:
+                time.sleep(tokens(delta) / config.tokens_per_second)
+
+# assistants
+
+@route("POST", "/assistants")
+def create_assistant(h):
+    assistant = {"id": _id("asst"), "object": "assistant", "created_at": int(time.time()),
+                 "name": h.body.get("name"), "model": h.body.get("model"),
+                 "instructions": h.body.get("instructions"), "tools": h.body.get("tools", []),
+                 "metadata": h.body.get("metadata") or {}, "tool_resources": h.body.get("tool_resources")}
+    h.state.assistants[assistant["id"]] = assistant
+    h.send_json(assistant)
+
+@route("GET", "/assistants")
+def list_assistants(h):
+    h.send_json(page(list(h.state.assistants.values())))
+
+@route("GET", "/assistants/([^/]+)")
+def get_assistant(h, assistant_id):
+    if assistant_id not in h.state.assistants:
+        return h.send_error_json(404, "no such assistant")
+    h.send_json(h.state.assistants[assistant_id])
+
+@route("POST", "/assistants/([^/]+)")
+def update_assistant(h, assistant_id):
+    h.state.assistants[assistant_id].update(h.body)
+    h.send_json(h.state.assistants[assistant_id])
+
+@route("DELETE", "/assistants/([^/]+)")
+def delete_assistant(h, assistant_id):
+    h.state.assistants.pop(assistant_id, None)
+    h.send_json({"id": assistant_id, "object": "assistant.deleted", "deleted": True})
+
+# threads + messages
+
+@route("POST", "/threads")
+def create_thread(h):
+    thread_id = _id("thread")
+    with h.state.lock:
+        h.state.threads[thread_id] = {"messages": [], "tool_resources": h.body.get("tool_resources")}
+        for msg in h.body.get("messages", []):
+            h.state.message(thread_id, msg["role"], msg["content"])
+    h.send_json({"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {},
+                 "tool_resources": h.body.get("tool_resources")})
+
+@route("DELETE", "/threads/([^/]+)")
+def delete_thread(h, thread_id):
+    with h.state.lock:
+        h.state.threads.pop(thread_id, None)
+    h.send_json({"id": thread_id, "object": "thread.deleted", "deleted": True})
+
+@route("POST", "/threads/([^/]+)/messages")
+def create_message(h, thread_id):
+    with h.state.lock:
+        msg = h.state.message(thread_id, h.body.get("role", "user"), h.body["content"])
+    h.send_json(msg)
+
+@route("GET", "/threads/([^/]+)/messages")
+def list_messages(h, thread_id):
+    with h.state.lock:
+        messages = list(h.state.threads.get(thread_id, {"messages": []})["messages"])
+    if h.query.get("run_id"):
+        messages = [m for m in messages if m["run_id"] == h.query["run_id"]]
+    if h.query.get("order", "desc") == "desc":
+        messages.reverse()
+    h.send_json(page(messages[:int(h.query.get("limit", 20))]))
+
+# runs
+
+@route("POST", "/threads/([^/]+)/runs")
+def create_run(h, thread_id):
+    if h.rate_limited():
+        return
+    with h.state.lock:
+        run = h.state.new_run(thread_id, h.body.get("assistant_id"))
+    if not h.body.get("stream"):
+        return h.send_json(public(run))
+
+    h.start_events()
+    run["status"] = "in_progress"
+    h.event(public(run), "thread.run.created")
+    h.event(public(run), "thread.run.in_progress")
+    msg_id = _id("msg")
+    snapshot = {"id": msg_id, "object": "thread.message", "created_at": int(time.time()), "thread_id": thread_id,
+                "role": "assistant", "content": [], "run_id": run["id"], "assistant_id": run["assistant_id"],
+                "attachments": [], "metadata": {}, "status": "in_progress"}
+    h.event(snapshot, "thread.message.created")
+    deltas = [] if run["_fails"] else chunks(run["_output"])
+    for delta in h.pace(deltas):
+        h.event({"id": msg_id, "object": "thread.message.delta",
+                 "delta": {"content": [{"index": 0, "type": "text", "text": {"value": delta, "annotations": []}}]}},
+                "thread.message.delta")
+    with h.state.lock:
+        h.state.finish(run)
+    if run["status"] == "completed":
+        h.event(h.state.threads[thread_id]["messages"][-1], "thread.message.completed")
+        h.event(public(run), "thread.run.completed")
+    else:
+        h.event(public(run), "thread.run.failed")
+    h.event("[DONE]", "done")
+
+@route("GET", "/threads/([^/]+)/runs/([^/]+)")
+def get_run(h, thread_id, run_id):
+    with h.state.lock:
+        run = h.state.runs.get(run_id)
+        view = h.state.advance(run) if run else None
+    if view is None:
+        return h.send_error_json(404, "no such run")
+    h.send_json(view)
+
+# files + vector stores
+
+@route("POST", "/files")
+def create_file(h):
+    file_id = _id("file")
+    h.state.files[file_id] = True
+    h.send_json({"id": file_id, "object": "file", "bytes": int(h.headers.get("Content-Length") or 0),
+                 "created_at": int(time.time()), "filename": "upload", "purpose": "assistants", "status": "processed"})
+
+@route("DELETE", "/files/([^/]+)")
+def delete_file(h, file_id):
+    h.state.files.pop(file_id, None)
+    h.send_json({"id": file_id, "object": "file", "deleted": True})
+
+def _vector_store(store_id, file_count=0):
+    return {"id": store_id, "object": "vector_store", "created_at": int(time.time()), "name": "mock",
+            "status": "completed", "usage_bytes": 0, "metadata": {},
+            "file_counts": {"in_progress": 0, "completed": file_count, "failed": 0, "cancelled": 0,
+                            "total": file_count}}
+
+@route("POST", "/vector_stores")
+def create_vector_store(h):
+    store = _vector_store(_id("vs"))
+    h.state.vector_stores[store["id"]] = store
+    h.send_json(store)
+
+@route("GET", "/vector_stores/([^/]+)")
+def get_vector_store(h, store_id):
+    if store_id not in h.state.vector_stores:
+        return h.send_error_json(404, "no such vector store")
+    h.send_json(h.state.vector_stores[store_id])
+
+@route("DELETE", "/vector_stores/([^/]+)")
+def delete_vector_store(h, store_id):
+    h.state.vector_stores.pop(store_id, None)
+    h.send_json({"id": store_id, "object": "vector_store.deleted", "deleted": True})
+
+@route("POST", "/vector_stores/([^/]+)/file_batches")
+def create_batch(h, store_id):
+    count = len(h.body.get("file_ids", []))
+    batch = {"id": _id("vsfb"), "object": "vector_store.file_batch", "created_at": int(time.time()),
+             "vector_store_id": store_id, "status": "completed",
+             "file_counts": _vector_store(store_id, count)["file_counts"]}
+    h.state.batches[batch["id"]] = batch
+    h.send_json(batch)
+
+@route("GET", "/vector_stores/([^/]+)/file_batches/([^/]+)")
+def get_batch(h, store_id, batch_id):
+    h.send_json(h.state.batches[batch_id])
+
+# chat completions (ChatCompletionsBackend, context summaries)
+
+@route("POST", "/chat/completions")
+def chat_completion(h):
+    if h.rate_limited():
+        return
+    prompt = h.body["messages"][-1]["content"]
+    output = canned_output(prompt)
+    usage = {"prompt_tokens": tokens(prompt), "completion_tokens": tokens(output),
+             "total_tokens": tokens(prompt) + tokens(output)}
+    completion_id = _id("chatcmpl")
+    if not h.body.get("stream"):
+        time.sleep(h.state.sample(h.state.config.run_latency))
+        return h.send_json({
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+            "model": h.body.get("model"), "usage": usage,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": output}}],
+        })
+
+    h.start_events()
+    for delta in h.pace(chunks(output)):
+        h.event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": h.body.get("model"),
+                 "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]})
+    h.event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+             "model": h.body.get("model"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    h.event("[DONE]")
+
+# --- entry points --- #
+
+class MockServer:
+    """run the mock on a background thread: with MockServer(config) as server: server.base_url"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        handler = type("BoundHandler", (Handler,), {"state": MockState(config or MockConfig())})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.state = handler.state
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-openai", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def config_from_args(args):
+    return MockConfig(
+        run_latency=Latency.parse(args.run_latency),
+        ttft=Latency.parse(args.ttft),
+        api_latency=Latency.parse(args.api_latency),
+        tokens_per_second=args.tps,
+        rate_limit_rate=args.rate_limit_rate,
+        fail_rate=args.fail_rate,
+        seed=args.seed,
+    )
+
+def add_arguments(parser):
+    parser.add_argument("--run-latency", default="fixed:0", help="polled run / completion time, e.g. lognormal:2,0.5")
+    parser.add_argument("--ttft", default="fixed:0", help="streamed time to first token")
+    parser.add_argument("--api-latency", default="fixed:0", help="added to every request")
+    parser.add_argument("--tps", type=float, default=0.0, help="streamed tokens per second, 0 = unthrottled")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of creates answered 429")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of runs that fail")
+    parser.add_argument("--seed", type=int, default=0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="offline mock of the OpenAI endpoints the generator uses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockServer(config_from_args(args), args.host, args.port)
+    # first line of stdout is the base url, bench_pipeline.py reads it
+    print(server.base_url, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Headless batch entry point
+
+    python -m generator courses.jsonl --out courses/ --workers 4
+
+each input line is either a bare user_input (the dict app.py builds) or
+{"id": ..., "user_input": {...}, "files": ["path/to/book.pdf", ...]}
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from utils.cassette import cassette_client
+from utils.file_handler import LocalFile
+from utils.paths import data_dir
+from utils.vector_manifest import VectorStoreManifest
+from .assistants import AssistantRegistry, ThreadPool
+from .cache import SQLiteCache
+from .course import CourseGenerator
+from .backends import ChatCompletionsBackend
+from .pipeline import generate_course, write_course, slugify
+
+logger = logging.getLogger("course_generator")
+
+def load_specs(path):
+    """read the jsonl, normalizing every line to {"id", "user_input", "files"}"""
+    specs = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            spec = json.loads(line)
+            if "user_input" not in spec:
+                spec = {"user_input": spec}
+            spec.setdefault("id", f"{n:04d}-{slugify(spec['user_input'].get('category'))}")
+            spec.setdefault("files", [])
+            specs.append(spec)
+    return specs
+
+def run_spec(client, spec, args, cache, manifest, registry=None, threads=None):
+    """generate + write one course, returns its output dir"""
+    generator = CourseGenerator(
+        client,
+        model=args.model,
+        cache=cache,
+        registry=registry,
+        threads=threads,
+        retrieval=None if args.retrieval == "off" else args.retrieval,
+        backend=ChatCompletionsBackend(client, args.model) if args.backend == "chat" else None
+    )
+    generator.course_id = spec["id"]
+    files = [LocalFile(p) for p in spec["files"]]
+    course = generate_course(
+        generator,
+        spec["user_input"],
+        files,
+        quizzes=not args.no_quizzes,
+        manifest=manifest,
+        remote_search=not args.no_file_search and args.backend == "assistants"
+    )
+    return write_course(course, Path(args.out) / spec["id"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m generator", description="generate courses in batch")
+    parser.add_argument("specs", help="jsonl file of user_input specs")
+    parser.add_argument("--out", default="courses", help="output directory (one subdir per course)")
+    parser.add_argument("--workers", type=int, default=4, help="courses generated in parallel")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--no-quizzes", action="store_true", help="skip quiz generation")
+    parser.add_argument("--no-cache", action="store_true", help="always call the api")
+    parser.add_argument("--backend", choices=["assistants", "chat"], default="assistants",
+                        help="assistants threads + runs, or one chat completion per step")
+    parser.add_argument("--retrieval", choices=["bm25", "vector", "off"], default="bm25",
+                        help="local index over uploaded files")
+    parser.add_argument("--no-file-search", action="store_true",
+                        help="don't upload files to an OpenAI vector store")
+    parser.add_argument("--skip-existing", action="store_true", help="skip courses already written to --out")
+    parser.add_argument("--cassette", help="gzipped jsonl of api traffic to record to / replay from")
+    parser.add_argument("--cassette-mode", choices=["record", "replay"], default="record")
+    parser.add_argument("--replay-latency", choices=["original", "zero"], default="original",
+                        help="replay with the recorded timing or as fast as possible")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    replaying = args.cassette and args.cassette_mode == "replay"
+    if not (replaying or os.environ.get("OPENAI_API_KEY")):
+        parser.error("OPENAI_API_KEY is not set")
+
+    if args.cassette:
+        client = cassette_client(args.cassette, args.cassette_mode, args.replay_latency)
+    else:
+        client = OpenAI()
+    cache = None if args.no_cache else SQLiteCache(data_dir("responses.sqlite3"))
+    manifest = VectorStoreManifest()
+    registry = AssistantRegistry(client)
+    threads = ThreadPool(client)
+    specs = load_specs(args.specs)
+    if args.skip_existing:
+        specs = [s for s in specs if not (Path(args.out) / s["id"] / "course.json").exists()]
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(run_spec, client, spec, args, cache, manifest, registry, threads): spec for spec in specs}
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                logger.info("✅ %s -> %s", spec["id"], future.result())
+            except Exception as e:
+                failed += 1
+                logger.error("💥 %s failed: %s", spec["id"], e)
+
+    logger.info("done: %d ok, %d failed", len(specs) - failed, failed)
+    threads.drain()
+    logger.info("vector store gc: %s", manifest.gc(client))
+    logger.info("orphaned threads swept: %d", threads.sweep())
+    logger.info("stale assistants swept: %d", registry.sweep())
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""Assistant reuse + thread lifecycle for the Assistants API"""
+
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import openai
+from utils.paths import data_dir
+from utils.resilience import account_key, resilient
+from .prompts import ASSISTANT_INSTRUCTIONS
+
+# metadata tag on everything we create, so sweeps never touch other apps' assistants
+APP_TAG = "course_generator"
+FILE_SEARCH_TOOLS = [{"type": "file_search"}]
+
+def assistant_signature(model, instructions=ASSISTANT_INSTRUCTIONS, tools=FILE_SEARCH_TOOLS):
+    payload = json.dumps({"model": model, "instructions": instructions, "tools": tools}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def tool_resources(vector_store_id):
+    """per-thread file_search resources instead of mutating the shared assistant"""
+    if not vector_store_id:
+        return None
+    return {"file_search": {"vector_store_ids": [vector_store_id]}}
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+class _JsonFile:
+    """tiny locked json dict on disk, one lock per path across instances"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        with _file_locks_guard:
+            self.lock = _file_locks.setdefault(self.path, threading.Lock())
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+class AssistantRegistry:
+    """one assistant per (model, instructions, tools) signature, reused across courses
+
+    lookup order: in-process memo -> local registry file -> remote assistants
+    tagged with our signature -> create a new one. everything is keyed by
+    account (api key + org), so a server handling several keys never hands one
+    key's assistant to another
+    """
+
+    _verified = {}  # (account, signature) -> assistant id, per process
+    _verified_lock = threading.Lock()
+
+    def __init__(self, client, path=None):
+        self.client = resilient(client)
+        self.account = account_key(client)
+        self.file = _JsonFile(path or data_dir("assistants.json"))
+
+    def get(self, model, instructions=ASSISTANT_INSTRUCTIONS, tools=FILE_SEARCH_TOOLS):
+        signature = assistant_signature(model, instructions, tools)
+        with self._verified_lock:
+            if (self.account, signature) in self._verified:
+                return self._verified[self.account, signature]
+
+        assistant_id = self._known(signature)
+        if assistant_id is None:
+            assistant_id = self._find_remote(signature)
+        if assistant_id is None:
+            assistant_id = self.client.beta.assistants.create(
+                name="Course Generator",
+                instructions=instructions,
+                model=model,
+                tools=tools,
+                metadata={"app": APP_TAG, "signature": signature}
+            ).id
+            self._remember(signature, assistant_id, created=True)
+        else:
+            self._remember(signature, assistant_id)
+        return assistant_id
+
+    async def aget(self, model, instructions=ASSISTANT_INSTRUCTIONS, tools=FILE_SEARCH_TOOLS):
+        """get() for an AsyncOpenAI client"""
+        signature = assistant_signature(model, instructions, tools)
+        with self._verified_lock:
+            if (self.account, signature) in self._verified:
+                return self._verified[self.account, signature]
+
+        assistant_id = self._entry()["assistants"].get(signature)
+        if assistant_id:
+            try:
+                await self.client.beta.assistants.retrieve(assistant_id)
+            except openai.NotFoundError:
+                assistant_id = None
+        if assistant_id is not None:
+            self._remember(signature, assistant_id)
+            return assistant_id
+        assistant_id = (await self.client.beta.assistants.create(
+            name="Course Generator",
+            instructions=instructions,
+            model=model,
+            tools=tools,
+            metadata={"app": APP_TAG, "signature": signature}
+        )).id
+        self._remember(signature, assistant_id, created=True)
+        return assistant_id
+
+    def forget(self, assistant_id):
+        """drop a memoized id the api no longer knows - the next get() re-verifies"""
+        with self._verified_lock:
+            for key in [k for k, v in self._verified.items() if k[0] == self.account and v == assistant_id]:
+                del self._verified[key]
+
+    def sweep(self, older_than=24 * 3600):
+        """delete assistants this registry created that no signature points at anymore
+
+        only ids recorded as created under this account are candidates -
+        assistants from other hosts, processes or apps on the account are left
+        alone. returns the number deleted
+        """
+        entry = self._entry()
+        registered = set(entry["assistants"].values())
+        cutoff = time.time() - older_than
+        gone = []
+        for assistant_id, created in entry["created"].items():
+            if assistant_id in registered or created > cutoff:
+                continue
+            try:
+                self.client.beta.assistants.delete(assistant_id)
+            except openai.NotFoundError:
+                pass
+            except Exception as e:
+                print(f"Failed to delete assistant {assistant_id}: {e}")
+                continue
+            gone.append(assistant_id)
+        if gone:
+            with self.file.lock:
+                data = self.file.load()
+                created = data.get(self.account, {}).get("created", {})
+                for assistant_id in gone:
+                    created.pop(assistant_id, None)
+                self.file.save(data)
+        return len(gone)
+
+    def _entry(self):
+        """this account's {"assistants": {signature: id}, "created": {id: ts}}"""
+        entry = self.file.load().get(self.account)
+        if not isinstance(entry, dict):
+            return {"assistants": {}, "created": {}}
+        return {"assistants": entry.get("assistants", {}), "created": entry.get("created", {})}
+
+    def _known(self, signature):
+        assistant_id = self._entry()["assistants"].get(signature)
+        if not assistant_id:
+            return None
+        try:
+            self.client.beta.assistants.retrieve(assistant_id)
+            return assistant_id
+        except openai.NotFoundError:
+            return None  # deleted remotely
+
+    def _find_remote(self, signature):
+        for assistant in self.client.beta.assistants.list(limit=100):
+            if (assistant.metadata or {}).get("signature") == signature:
+                return assistant.id
+        return None
+
+    def _remember(self, signature, assistant_id, created=False):
+        with self._verified_lock:
+            self._verified[self.account, signature] = assistant_id
+        with self.file.lock:
+            data = self.file.load()
+            entry = data.get(self.account)
+            if not isinstance(entry, dict):
+                entry = data[self.account] = {"assistants": {}, "created": {}}
+            entry.setdefault("assistants", {})[signature] = assistant_id
+            if created:
+                entry.setdefault("created", {})[assistant_id] = time.time()
+            self.file.save(data)
+
+class ThreadPool:
+    """hands out step threads and recycles them off the critical path
+
+    an assistants thread can't be emptied cheaply, so "recycling" means the
+    delete happens on a background worker instead of inside the step. every
+    thread is written to a local ledger and marked there when released, so
+    sweep() can collect released threads a crash or failed delete left behind
+    without touching ones still in use. the ledger is keyed by account like
+    the assistant registry, so one key's sweep never sees another key's threads
+    """
+
+    def __init__(self, client, ledger_path=None):
+        self.client = resilient(client)
+        self.account = account_key(client)
+        self.ledger = _JsonFile(ledger_path or data_dir("threads.json"))
+        self._released = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def acquire(self, message=None, vector_store_id=None):
+        """new thread, optionally seeded with a user message, tracked in the ledger"""
+        kwargs = {}
+        if message is not None:
+            kwargs["messages"] = [{"role": "user", "content": message}]
+        resources = tool_resources(vector_store_id)
+        if resources:
+            kwargs["tool_resources"] = resources
+        thread_id = self.client.beta.threads.create(**kwargs).id
+        self.track(thread_id)
+        return thread_id
+
+    def release(self, thread_id):
+        """mark the thread released and queue it for deletion, returns immediately"""
+        self.mark_released(thread_id)
+        self._released.put(thread_id)
+        self._ensure_worker()
+
+    def track(self, thread_id):
+        """ledger a thread created elsewhere (the async engine's own client)"""
+        with self.ledger.lock:
+            data = self.ledger.load()
+            self._entries(data)[thread_id] = {"created": time.time(), "released": None}
+            self.ledger.save(data)
+
+    def mark_released(self, thread_id):
+        """the thread is done with - sweep() may delete it from now on"""
+        with self.ledger.lock:
+            data = self.ledger.load()
+            entry = self._entries(data).get(thread_id)
+            if isinstance(entry, dict):
+                entry["released"] = time.time()
+                self.ledger.save(data)
+
+    def untrack(self, thread_id):
+        """the thread is deleted, drop it from the ledger"""
+        with self.ledger.lock:
+            data = self.ledger.load()
+            if self._entries(data).pop(thread_id, None) is not None:
+                self.ledger.save(data)
+
+    def drain(self, timeout=30):
+        """wait for queued deletions, including one in flight - call before the process exits"""
+        deadline = time.monotonic() + timeout
+        with self._released.all_tasks_done:
+            while self._released.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._released.all_tasks_done.wait(remaining)
+
+    def sweep(self, older_than=3600):
+        """delete threads released more than older_than seconds ago but never
+        deleted (crash, failed delete), returns the count
+
+        threads acquired and not yet released - a session's shared course
+        thread, steps in flight elsewhere - are never touched
+        """
+        cutoff = time.time() - older_than
+        stale = [
+            thread_id for thread_id, entry in self._entries(self.ledger.load()).items()
+            if isinstance(entry, dict) and entry.get("released") and entry["released"] < cutoff
+        ]
+        for thread_id in stale:
+            self._delete(thread_id)
+        return len(stale)
+
+    def _entries(self, data):
+        """this account's {thread_id: {created, released}}"""
+        entries = data.get(self.account)
+        if not isinstance(entries, dict):
+            entries = data[self.account] = {}
+        return entries
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._drain_forever, name="thread-recycler", daemon=True)
+                self._worker.start()
+
+    def _drain_forever(self):
+        while True:
+            thread_id = self._released.get()
+            try:
+                self._delete(thread_id)
+            finally:
+                self._released.task_done()
+
+    def _delete(self, thread_id):
+        try:
+            self.client.beta.threads.delete(thread_id)
+        except openai.NotFoundError:
+            pass  # already gone - untrack only drops it if this account ledgered it
+        except Exception as e:
+            print(f"Failed to delete thread: {e}")
+            return
+        self.untrack(thread_id)
@@ -0,0 +1,305 @@
+"""Async generation engine - same steps as CourseGenerator, fanned out concurrently"""
+
+import asyncio
+import copy
+import time
+import openai
+from .prompts import *
+from .course import CourseGenerator, RUN_FAILED_STATES
+from .schemas import SECTIONS_SCHEMA
+from .assistants import tool_resources
+from .backends import ChatCompletionsBackend, AsyncChatCompletionsBackend
+from utils.polling import PollFailed, apoll
+from utils.resilience import RunFailed
+from utils.metrics import latency
+from utils.tracing import annotate, count, record_usage, span
+
+class AsyncCourseGenerator(CourseGenerator):
+    """awaitable CourseGenerator built on AsyncOpenAI
+
+    the assistants api refuses new messages on a thread with an active run,
+    so every step here is isolated on its own throwaway thread regardless of
+    thread_scope - that's what lets us run a whole course worth of lessons at once
+    """
+
+    def __init__(self, client, model="gpt-4o-mini", max_concurrency=4, stream=False, poll_policy=None,
+                 cache=None, reporter=None, backend=None):
+        super().__init__(client, model, stream=stream, poll_policy=poll_policy, cache=cache, reporter=reporter,
+                         backend=backend)
+        self.max_concurrency = max_concurrency
+        # _summarize would hand the builder a coroutine - fall back to truncating
+        self.context_builder.summarize = None
+
+    @classmethod
+    def from_generator(cls, generator, client, max_concurrency=4):
+        """reuse the assistant + extracted content of a sync generator"""
+        engine = cls(client, generator.model, max_concurrency, generator.stream, generator.poll_policy,
+                     generator.cache, generator.reporter)
+        engine.assistant_id = generator.assistant_id
+        engine.thread_id = generator.thread_id
+        engine.vector_store_id = generator.vector_store_id
+        engine.raw_content = generator.raw_content
+        engine.corpus = generator.corpus
+        engine.preview_tokens = generator.preview_tokens
+        # same budget/settings, but summarize must not call the blocking sync _summarize
+        engine.context_builder = copy.copy(generator.context_builder)
+        engine.context_builder.summarize = None
+        engine.threads = generator.threads
+        engine.index = generator.index
+        if isinstance(generator.backend, ChatCompletionsBackend):
+            engine.backend = AsyncChatCompletionsBackend(client, generator.backend.model, generator.backend.instructions)
+        engine.structure = generator.structure
+        engine.course_id = generator.course_id
+        return engine
+
+    async def init_assistant(self, vector_store_id=None):
+        """set up our AI teaching assistant"""
+        if self.backend:
+            return
+        self.assistant_id = await self.registry.aget(self.model)
+        self.vector_store_id = vector_store_id
+
+    async def generate_course_info(self, user_input, bypass_cache=False, on_token=None):
+        """generate course info - returns markdown content"""
+        content = await self._generate_step(
+            COURSE_INFO_PROMPT,
+            self._course_context(user_input),
+            requires_json=False,
+            on_token=on_token,
+            bypass_cache=bypass_cache
+        )
+        return self._unwrap_course_info(content)
+
+    async def generate_sections(self, user_input, course_info, bypass_cache=False, on_partial=None):
+        """generate course sections - needs json for UI"""
+        return await self._generate_step(
+            SECTION_GENERATION_PROMPT,
+            self._course_context(user_input),
+            requires_json=True,
+            bypass_cache=bypass_cache,
+            on_token=self._partial_json(on_partial, SECTIONS_SCHEMA)
+        )
+
+    async def generate_lesson_detail(self, user_input, course_info, section_title, lesson, custom_instruction=None,
+                                     bypass_cache=False, on_token=None):
+        """generate detailed lesson content - returns markdown"""
+        context = self._lesson_detail_context(user_input, course_info, section_title, lesson, custom_instruction)
+        content = await self._generate_step(
+            LESSON_DETAIL_PROMPT,
+            context,
+            requires_json=False,
+            on_token=on_token,
+            bypass_cache=bypass_cache
+        )
+        self._check_word_count(content, context["word_count"])
+        return content
+
+    async def generate_lessons_for_section(self, user_input, course_info, section, bypass_cache=False):
+        """generate lesson outlines - needs json for UI"""
+        lessons = await self._generate_step(
+            LESSON_GENERATION_PROMPT,
+            self._section_lessons_context(user_input, course_info, section),
+            requires_json=True,
+            bypass_cache=bypass_cache
+        )
+        return self._section_lessons(section, lessons)
+
+    async def generate_quiz(self, lesson, lesson_detail, bypass_cache=False):
+        """generate quiz - needs json for UI"""
+        return await self._generate_step(
+            QUIZ_GENERATION_PROMPT,
+            self._quiz_context(lesson, lesson_detail),
+            requires_json=True,
+            bypass_cache=bypass_cache
+        )
+
+    # --- fan-out --- #
+
+    async def generate_all_section_lessons(self, user_input, course_info, sections):
+        """lesson outlines for every section at once, in section order
+
+        returns (outlines, failures) - outlines holds None for a section that
+        failed, failures maps its index to the exception
+        """
+        results = await self._gather(
+            self.generate_lessons_for_section(user_input, course_info, section)
+            for section in sections
+        )
+        failures = {i: result for i, result in enumerate(results) if isinstance(result, Exception)}
+        return [None if i in failures else result for i, result in enumerate(results)], failures
+
+    async def generate_all_lesson_details(self, user_input, course_info, section_lessons):
+        """lesson bodies for every (section, lesson) pair at once
+
+        section_lessons is a list of {"section_title", "lessons"} dicts -
+        either generate_lessons_for_section output or a sections["sections"] list
+        returns ({(section_title, lesson_title): markdown}, {same key: exception})
+        for the lessons that finished and the ones that failed
+        """
+        pairs = [
+            (section.get("section_title", section.get("title")), lesson)
+            for section in section_lessons
+            for lesson in section["lessons"]
+        ]
+        details = await self._gather(
+            self.generate_lesson_detail(user_input, course_info, section_title, lesson)
+            for section_title, lesson in pairs
+        )
+        done, failures = {}, {}
+        for (section_title, lesson), detail in zip(pairs, details):
+            (failures if isinstance(detail, Exception) else done)[section_title, lesson["title"]] = detail
+        return done, failures
+
+    async def _gather(self, coros):
+        """run coroutines with at most max_concurrency in flight
+
+        results in order, a failed coroutine's exception in its place - one
+        bad lesson doesn't throw away the ones that finished
+        """
+        # semaphores bind to the running loop so make a fresh one per fan-out
+        limit = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(coro):
+            async with limit:
+                return await coro
+
+        results = await asyncio.gather(*(bounded(c) for c in coros), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result  # cancellation / interrupts still propagate
+        return results
+
+    # --- single step --- #
+
+    async def _generate_step(self, prompt, context, requires_json=False, on_token=None, bypass_cache=False):
+        """run a single generation step"""
+        name = prompt_name(prompt)
+        # each gathered step runs in its own task, so its span context is its own
+        with span("step", prompt=name, model=self.model, course_id=self.course_id):
+            key = self._cache_key(prompt, context)
+            if not bypass_cache:
+                cached = self._cache_get(key)
+                if cached is not None:
+                    annotate(cache_hit=True)
+                    if on_token:
+                        on_token(cached["raw"])
+                    return cached["result"]
+
+            message = self._step_message(prompt, context)
+            content = await self._run_step(prompt, message, name, on_token)
+            try:
+                result = self._parse_response(prompt, content, requires_json)
+            except Exception as e:
+                if not requires_json:
+                    raise
+                self.reporter.warning(f"retrying {name}: {e}")
+                annotate(parse_retry=True)
+                content = await self._run_step(prompt, message, name)
+                result = self._parse_response(prompt, content, requires_json)
+            self._cache_put(key, content, result)
+            return result
+
+    async def _run_step(self, prompt, message, name, on_token=None):
+        started = time.monotonic()
+        if self.backend:
+            content = await self._backend_step(prompt, message, name, started, on_token)
+        else:
+            content = await self._assistant_step(message, name, started, on_token)
+        latency.record(name, "total", time.monotonic() - started)
+        return content
+
+    async def _backend_step(self, prompt, message, name, started, on_token=None):
+        if not (self.stream or on_token):
+            return await self.backend.complete(prompt, message)
+        return await self.backend.complete(prompt, message, on_token=self._timed(name, started, on_token))
+
+    async def _assistant_step(self, message, name, started, on_token=None):
+        """always on a fresh thread, see class docstring"""
+        kwargs = {"messages": [{"role": "user", "content": message}]}
+        if self.vector_store_id:
+            kwargs["tool_resources"] = tool_resources(self.vector_store_id)
+        thread = await self.client.beta.threads.create(**kwargs)
+        self.threads.track(thread.id)
+        try:
+            try:
+                return await self.run_retry.acall(self._run_once, thread.id, name, started, on_token)
+            except openai.NotFoundError:
+                if not await self._refresh_assistant():
+                    raise
+                return await self.run_retry.acall(self._run_once, thread.id, name, started, on_token)
+        finally:
+            await self._discard_thread(thread.id)
+
+    async def _refresh_assistant(self):
+        stale = self.assistant_id
+        self.registry.forget(stale)
+        self.assistant_id = await self.registry.aget(self.model)
+        return self.assistant_id != stale
+
+    async def _run_once(self, thread_id, name, started, on_token=None):
+        if self.stream or on_token:
+            return await self._stream_run(thread_id, name, started, on_token)
+
+        run = await self.client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=self.assistant_id
+        )
+        run = await self.wait_for_run(run.id, thread_id)
+        record_usage(run.usage)
+
+        messages = await self.client.beta.threads.messages.list(
+            thread_id=thread_id,
+            run_id=run.id,
+            order="desc",
+            limit=1
+        )
+        return self._run_output(messages.data, run.id)
+
+    async def _discard_thread(self, thread_id):
+        """delete with our own client, leaving a failure to ThreadPool.sweep"""
+        try:
+            await self.client.beta.threads.delete(thread_id)
+        except openai.NotFoundError:
+            pass  # already gone
+        except Exception as e:
+            self.reporter.warning(f"failed to delete thread {thread_id}, left for sweep: {e}")
+            self.threads.mark_released(thread_id)
+            return
+        self.threads.untrack(thread_id)
+
+    async def _stream_run(self, thread_id, name, started, on_token=None):
+        """stream a run, returns the full assistant text"""
+        parts = []
+        on_token = self._timed(name, started, on_token)
+        async with self.client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=self.assistant_id
+        ) as stream:
+            async for delta in stream.text_deltas:
+                parts.append(delta)
+                on_token(delta)
+            run = await stream.get_final_run()
+        record_usage(run.usage)
+
+        if run.status != "completed":
+            if parts:
+                raise Exception(f"run failed: {run.last_error}")
+            raise RunFailed(run)
+        return "".join(parts)
+
+    async def wait_for_run(self, run_id, thread_id=None):
+        """wait for AI response"""
+        try:
+            run, polls = await apoll(
+                lambda: self.client.beta.threads.runs.retrieve(
+                    thread_id=thread_id or self.thread_id,
+                    run_id=run_id
+                ),
+                is_done=lambda r: r.status == "completed",
+                is_failed=lambda r: r.status in RUN_FAILED_STATES,
+                policy=self.poll_policy
+            )
+        except PollFailed as e:
+            raise RunFailed(e.obj)
+        count(polls=polls)
+        return run
@@ -0,0 +1,85 @@
+"""Pluggable step backends - how a step message becomes assistant text
+
+CourseGenerator talks to the Assistants API (threads + runs) itself when
+no backend is set; these are the alternatives
+"""
+
+from utils.resilience import resilient
+from utils.tracing import record_usage
+from .prompts import ASSISTANT_INSTRUCTIONS, prompt_name
+from .schemas import STEP_SCHEMAS
+
+class Backend:
+    """one request per step, returns the raw assistant text"""
+
+    name = None  # part of the response cache key, same answers = same name
+
+    def complete(self, prompt, message, on_token=None) -> str:
+        raise NotImplementedError
+
+class ChatCompletionsBackend(Backend):
+    """single chat.completions call per step
+
+    json steps use structured outputs against generator.schemas so the
+    reply always parses, markdown steps stream when on_token is given
+    """
+
+    name = "chat_completions"
+
+    def __init__(self, client, model="gpt-4o-mini", instructions=ASSISTANT_INSTRUCTIONS):
+        self.client = resilient(client)
+        self.model = model
+        self.instructions = instructions
+
+    def _request(self, prompt, message, stream):
+        kwargs = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.instructions},
+                {"role": "user", "content": message},
+            ],
+        }
+        name = prompt_name(prompt)
+        if name in STEP_SCHEMAS:
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": name, "schema": STEP_SCHEMAS[name], "strict": True},
+            }
+        if stream:
+            kwargs["stream"] = True
+            # usage arrives on a final chunk with no choices
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
+    def complete(self, prompt, message, on_token=None):
+        if on_token is None:
+            response = self.client.chat.completions.create(**self._request(prompt, message, False))
+            record_usage(response.usage)
+            return response.choices[0].message.content
+
+        parts = []
+        for chunk in self.client.chat.completions.create(**self._request(prompt, message, True)):
+            record_usage(getattr(chunk, "usage", None))
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        return "".join(parts)
+
+class AsyncChatCompletionsBackend(ChatCompletionsBackend):
+    """same as ChatCompletionsBackend on an AsyncOpenAI client"""
+
+    async def complete(self, prompt, message, on_token=None):
+        if on_token is None:
+            response = await self.client.chat.completions.create(**self._request(prompt, message, False))
+            record_usage(response.usage)
+            return response.choices[0].message.content
+
+        parts = []
+        async for chunk in await self.client.chat.completions.create(**self._request(prompt, message, True)):
+            record_usage(getattr(chunk, "usage", None))
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        return "".join(parts)
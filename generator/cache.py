@@ -0,0 +1,199 @@
+"""Content-addressed cache for generation step responses"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+def cache_key(prompt, model, context, custom_instruction=None, scope=None) -> str:
+    """sha256 over the prompt, model, canonicalized context and scope
+
+    scope is whatever else shapes the answer without being in the message -
+    the vector store, the uploaded corpus, the backend
+    """
+    payload = json.dumps(
+        {
+            "prompt": prompt,
+            "model": model,
+            "context": context,
+            "custom_instruction": custom_instruction,
+            "scope": scope,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """base cache - entries are {"raw": str, "result": json-able, "created": ts}
+
+    bounded by max_entries / max_bytes with least-recently-used eviction,
+    entries older than ttl seconds are treated as misses
+    """
+
+    def __init__(self, max_entries=5000, max_bytes=256 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._get(key)
+        if entry is not None and self._expired(entry["created"]):
+            self.delete(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, raw, result):
+        self._put(key, {"raw": raw, "result": result, "created": time.time()})
+        self._evict()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _put(self, key, entry):
+        raise NotImplementedError
+
+    def _evict(self):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class SQLiteCache(ResponseCache):
+    """single-file cache, safe to share between processes"""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    entry TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT entry FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def _put(self, key, entry):
+        blob = json.dumps(entry, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob.encode("utf-8")), entry["created"], time.time()),
+            )
+
+    def _evict(self):
+        with self._lock, self._conn:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed")
+            doomed = []
+            for key, entry_size in rows:
+                if count <= self.max_entries and size <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                count -= 1
+                size -= entry_size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+class DirectoryCache(ResponseCache):
+    """one json file per entry, file mtime doubles as the LRU clock"""
+
+    def __init__(self, root, **kwargs):
+        super().__init__(**kwargs)
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.root / key[:2] / f"{key}.json"
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # touch for LRU
+            return entry
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _put(self, key, entry):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        # write-then-rename so concurrent readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _evict(self):
+        files = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        count = len(files)
+        size = sum(f[1] for f in files)
+        for _, file_size, path in sorted(files):
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            count -= 1
+            size -= file_size
+
+    def delete(self, key):
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        for path in self.root.glob("*/*.json"):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,148 @@
+"""Token-aware step context: measure, budget and compact before sending"""
+
+import hashlib
+import json
+import logging
+import re
+from utils.corpus import estimate_tokens
+from .prompts import prompt_name
+
+logger = logging.getLogger("course_generator")
+
+# max context tokens per prompt type (the prompt text itself isn't counted)
+PROMPT_BUDGETS = {
+    "toc": 16000,
+    "course_info": 8000,
+    "sections": 8000,
+    "lessons": 4000,
+    "lesson_detail": 4000,
+    "quiz": 8000,
+    "custom": 8000,
+}
+
+# fields we're allowed to shrink, everything else is sent as-is
+COMPACTABLE = ("content", "content_preview", "source_material", "extracted_structure", "course_info")
+
+# never shrink a field below this, a 20-token ToC is worse than none
+MIN_FIELD_TOKENS = 256
+
+class Tokenizer:
+    """tiktoken when installed, otherwise the ~4 chars/token estimate"""
+
+    def __init__(self, model="gpt-4o-mini"):
+        try:
+            import tiktoken
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+        except ImportError:
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return estimate_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._encoding is None:
+            return text[:max_tokens * 4]
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return self._encoding.decode(tokens[:max_tokens])
+
+def relevant_chunks(text, query, max_tokens, tokenizer, chunk_tokens=200):
+    """paragraph chunks of text that share the most words with query, in original order"""
+    terms = set(re.findall(r"\w{3,}", query.lower()))
+    chunks = [c for c in re.split(r"\n\s*\n", text) if c.strip()]
+    scored = sorted(
+        range(len(chunks)),
+        key=lambda i: -len(terms & set(re.findall(r"\w{3,}", chunks[i].lower())))
+    )
+    picked, used = [], 0
+    for i in scored:
+        chunk = tokenizer.truncate(chunks[i], chunk_tokens)
+        cost = tokenizer.count(chunk)
+        if used + cost > max_tokens:
+            break
+        picked.append(i)
+        used += cost
+    return "\n\n".join(tokenizer.truncate(chunks[i], chunk_tokens) for i in sorted(picked))
+
+class ContextBuilder:
+    """turns (prompt, context) into the step message within a token budget
+
+    oversized COMPACTABLE fields are shrunk with one of:
+      truncate  - keep the head of the field
+      summarize - summarize(text, max_tokens) once, reuse for identical text
+      retrieve  - keep only chunks relevant to the step (lesson/section titles)
+    """
+
+    def __init__(self, model="gpt-4o-mini", budgets=None, strategy="truncate", summarize=None, retrieve=None):
+        self.tokenizer = Tokenizer(model)
+        self.budgets = {**PROMPT_BUDGETS, **(budgets or {})}
+        self.strategy = strategy
+        self.summarize = summarize
+        self.retrieve = retrieve or (
+            lambda text, query, max_tokens: relevant_chunks(text, query, max_tokens, self.tokenizer)
+        )
+        self._summaries = {}
+
+    def measure(self, context):
+        """tokens per top-level field"""
+        return {key: self.tokenizer.count(_as_text(value)) for key, value in context.items()}
+
+    def build(self, prompt, context):
+        """step message text, compacted to the prompt's budget"""
+        name = prompt_name(prompt)
+        budget = self.budgets.get(name, self.budgets["custom"])
+        sizes = self.measure(context)
+        total = sum(sizes.values())
+
+        compacted = dict(context)
+        if total > budget:
+            query = step_query(context)
+            for key in sorted(COMPACTABLE, key=lambda k: -sizes.get(k, 0)):
+                if total <= budget or not compacted.get(key):
+                    continue
+                target = max(MIN_FIELD_TOKENS, sizes[key] - (total - budget))
+                if target >= sizes[key]:
+                    continue
+                compacted[key] = self._compact(_as_text(compacted[key]), target, query)
+                new_size = self.tokenizer.count(compacted[key])
+                total -= sizes[key] - new_size
+                sizes[key] = new_size
+
+        logger.info(
+            "step %s: %d context tokens (budget %d) %s",
+            name, total, budget,
+            {k: v for k, v in sorted(sizes.items(), key=lambda kv: -kv[1])[:4]}
+        )
+        return f"{prompt}\n\nContext: {json.dumps(compacted, separators=(',', ':'), ensure_ascii=False)}"
+
+    def _compact(self, text, max_tokens, query):
+        if self.strategy == "retrieve" and query:
+            return self.retrieve(text, query, max_tokens)
+        if self.strategy == "summarize" and self.summarize:
+            key = (hashlib.sha256(text.encode("utf-8")).hexdigest(), max_tokens)
+            if key not in self._summaries:
+                self._summaries[key] = self.tokenizer.truncate(self.summarize(text, max_tokens), max_tokens)
+            return self._summaries[key]
+        return self.tokenizer.truncate(text, max_tokens)
+
+def _as_text(value):
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def step_query(context):
+    """what this step is about, for picking relevant chunks"""
+    lesson = context.get("lesson") or {}
+    section = context.get("section") or {}
+    parts = [
+        context.get("section_title"),
+        context.get("lesson_title"),
+        lesson.get("title") if isinstance(lesson, dict) else None,
+        lesson.get("brief") if isinstance(lesson, dict) else None,
+        section.get("title") if isinstance(section, dict) else None,
+        section.get("description") if isinstance(section, dict) else None,
+        context.get("custom_instruction"),
+    ]
+    return " ".join(p for p in parts if p)
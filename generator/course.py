@@ -1,354 +1,612 @@
 """Core course generation logic using OpenAI's API"""
 
+import hashlib
 import json
 import time
-import re
+import openai
 from .prompts import *
 from utils.file_handler import ensure_vector_store_ready, cleanup_vector_store, process_files_for_content
-import streamlit as st
+from utils.polling import DEFAULT_POLICY, PollFailed, poll
+from utils.resilience import Resilience, RetryPolicy, RunFailed, resilient
+from utils.metrics import latency
+from utils.tracing import annotate, count, record_usage, span
+from .cache import cache_key
+from .context import ContextBuilder, step_query
+from .assistants import AssistantRegistry, ThreadPool
+from .jsonparse import JSONExtractionError, JsonStream, SchemaError, parse_json
+from .schemas import PARSE_SCHEMAS, SECTIONS_SCHEMA
+from .markdown import extract_markdown, normalize_markdown, unwrap_content
+from .retrieval import BM25Index, VectorIndex, chunk_corpus, format_hits, hashing_embedder
+from utils.paths import data_dir
+from .reporting import Reporter
+
+RUN_FAILED_STATES = ("failed", "expired", "cancelled", "incomplete")
+
+# "isolated": every step gets a fresh thread seeded with just its own context
+# "shared": every step appends to one course-long thread (the old behavior)
+THREAD_SCOPES = ("isolated", "shared")
 
 class CourseGenerator:
-    def __init__(self, client, model="gpt-4o-mini"):
-        self.client = client
+    def __init__(self, client, model="gpt-4o-mini", stream=False, poll_policy=None,
+                 thread_scope="isolated", shared_steps=(), cache=None, reporter=None,
+                 preview_tokens=12000, compaction="truncate", budgets=None,
+                 retrieval=None, retrieval_k=6, embed=None, backend=None, registry=None, threads=None,
+                 run_retry=None):
+        if thread_scope not in THREAD_SCOPES:
+            raise ValueError(f"thread_scope must be one of {THREAD_SCOPES}")
+        # every api call goes through the shared limiter/retry/breaker
+        self.client = resilient(client)
         self.model = model
+        self.stream = stream  # event-driven runs instead of polling
+        self.poll_policy = poll_policy or DEFAULT_POLICY
+        self.thread_scope = thread_scope
+        # prompt names ("toc", "course_info", ...) that opt into the shared thread
+        self.shared_steps = set(shared_steps)
+        self.cache = cache  # ResponseCache, None = always call the api
+        self.reporter = reporter or Reporter()
+        # generator.backends.Backend, None = Assistants API threads + runs
+        self.backend = backend
+        self.registry = registry or AssistantRegistry(self.client)
+        self.threads = threads or ThreadPool(self.client)
+        # whole-run retries for runs that fail on rate limits/server errors,
+        # separate from the per-request layer so a run isn't charged to the limiter twice
+        self.run_retry = run_retry or Resilience(policy=RetryPolicy(attempts=3, initial=2.0))
+        self.course_id = None  # tags trace spans, set by whoever drives the course
+        self.vector_store_id = None
         self.assistant_id = None
         self.thread_id = None
         self.raw_content = None
+        self.corpus = None  # utils.corpus.Corpus, per-file provenance for raw_content
+        self.preview_tokens = preview_tokens  # cap on uploaded text sent with a step
+        # local index over uploads: None, "bm25" or "vector" (embed defaults to offline hashing)
+        self.retrieval = retrieval
+        self.retrieval_k = retrieval_k
+        self.embed = embed
+        self.index = None
+        self.context_builder = ContextBuilder(
+            model,
+            budgets=budgets,
+            strategy=compaction,
+            summarize=self._summarize
+        )
         self.structure = None
 
+    def state(self):
+        """ids and settings needed to pick this generator back up later"""
+        return {
+            "model": self.model,
+            "assistant_id": self.assistant_id,
+            "thread_id": self.thread_id,
+            "thread_scope": self.thread_scope,
+            "vector_store_id": self.vector_store_id,
+        }
+
+    def restore(self, state):
+        """inverse of state() - reattach to a previously created assistant/thread"""
+        self.model = state.get("model", self.model)
+        self.assistant_id = state.get("assistant_id")
+        self.thread_id = state.get("thread_id")
+        self.thread_scope = state.get("thread_scope", self.thread_scope)
+        self.vector_store_id = state.get("vector_store_id")
+        return self
+
+    def load_corpus(self, corpus):
+        """ground steps in previously extracted uploads (utils.corpus.Corpus)"""
+        self.corpus = corpus
+        self.raw_content = corpus.text
+        self.index = self._build_index(corpus) if self.retrieval else None
+        return self
+
     def process_files(self, uploaded_files):
         """extract content from files"""
         try:
-            extracted = process_files_for_content(uploaded_files)
+            extracted = process_files_for_content(
+                uploaded_files,
+                on_error=self.reporter.error,
+                # retrieval wants whole documents, the preview only needs the front
+                **({"pdf_pages": None} if self.retrieval else {})
+            )
             if not extracted:
-                st.warning("no content found in files")
+                self.reporter.warning("no content found in files")
                 return False
 
             if not extracted.get("content"):
-                st.warning("content extraction returned empty result")
+                self.reporter.warning("content extraction returned empty result")
                 return False
 
-            self.raw_content = extracted["content"]
+            self.load_corpus(extracted["corpus"])
             return True
 
         except Exception as e:
-            st.error(f"failed to process files: {str(e)}")
+            self.reporter.error(f"failed to process files: {str(e)}")
             # might wanna log the full traceback here
             return False
 
     def init_assistant(self, vector_store_id=None):
         """set up our AI teaching assistant"""
-        assistant = self.client.beta.assistants.create(
-            name="Course Generator",
-            instructions="""You are an expert course designer with:
-            1. Perfect content structure detection
-            2. Audience adaptation skills
-            3. Consistent tone maintenance
-            4. Complex topic breakdown abilities""",
-            model=self.model,
-            tools=[{"type": "file_search"}]
-        )
-        self.assistant_id = assistant.id
+        if self.backend:
+            return  # backends don't need an assistant or threads
+        # same instructions every course, so reuse the assistant and hang the
+        # vector store off each thread instead
+        self.assistant_id = self.registry.get(self.model)
+        self.vector_store_id = vector_store_id
 
-        if vector_store_id:
-            self.client.beta.assistants.update(
-                assistant_id=self.assistant_id,
-                tool_resources={"file_search": {"vector_store_ids": [vector_store_id]}}
-            )
+        if self.thread_scope == "shared" or self.shared_steps:
+            self.thread_id = self.threads.acquire(vector_store_id=vector_store_id)
 
-        thread = self.client.beta.threads.create()
-        self.thread_id = thread.id
-
-    def extract_toc(self):
+    def extract_toc(self, user_input, bypass_cache=False):
         """let AI find/generate structure"""
-        if not self.thread_id:
-            st.error("assistant not initialized!")
+        if not (self.assistant_id or self.backend):
+            self.reporter.error("assistant not initialized!")
             return None
 
         # try extraction first
         response = self._generate_step(
             TOC_EXTRACTION_PROMPT,
             {
-                "content": self.raw_content if self.raw_content else None,
-                "category": st.session_state.user_input["category"],
-                "familiarity": st.session_state.user_input["audience"]["familiarity"],
-                "course_duration": st.session_state.user_input["structure"]["course_duration"]
+                "content": self._content_preview(),
+                "category": user_input["category"],
+                "familiarity": user_input["audience"]["familiarity"],
+                "course_duration": user_input["structure"]["course_duration"]
             },
-            requires_json=False  # raw first
+            requires_json=False,  # raw first
+            bypass_cache=bypass_cache
         )
 
         # if we got a valid response (either raw TOC or json)
         if response:
-            st.write("🎯 found/generated structure!")
-            st.code(response if isinstance(response, str) else json.dumps(response, indent=2))
+            self.reporter.info("🎯 found/generated structure!")
+            self.reporter.code(response if isinstance(response, str) else json.dumps(response, indent=2))
             self.structure = response
             return response
 
-        st.write("⚠️ no structure found")
+        self.reporter.info("⚠️ no structure found")
         return None
 
-    def generate_course_info(self, user_input):
+    def generate_course_info(self, user_input, bypass_cache=False, on_token=None):
         """generate course info - returns markdown content"""
-
-        context = {**user_input}
-        if self.structure:
-            context["extracted_structure"] = self.structure
-        if self.raw_content:
-            context["content_preview"] = self.raw_content
-
         try:
             content = self._generate_step(
                 COURSE_INFO_PROMPT,
-                context,
-                requires_json=False
+                self._course_context(user_input),
+                requires_json=False,
+                on_token=on_token,
+                bypass_cache=bypass_cache
             )
-
-            # if we got raw markdown without tags, that's fine
-            if not content.strip().startswith('<content>'):
-                return content.strip()
-
-            # if we got tags, extract the content
-            content_match = re.search(r'<content>(.*?)</content>',
-                                    content,
-                                    re.DOTALL)
-            if content_match:
-                return content_match.group(1).strip()
-
-            # if neither worked, show what we got
-            st.warning("unexpected content format:")
-            st.code(content)
-            return content.strip()  # return it anyway
+            return self._unwrap_course_info(content)
 
         except Exception as e:
-            st.error(f"failed to generate course info: {str(e)}")
+            self.reporter.error(f"failed to generate course info: {str(e)}")
             raise
 
-    def generate_sections(self, user_input, course_info):
-        """generate course sections - needs json for UI"""
-        # st.write("📑 structuring course sections...")
-        context = {**user_input}
-        if self.structure:
-            context["extracted_structure"] = self.structure
-        if self.raw_content:
-            context["content_preview"] = self.raw_content
+    def generate_sections(self, user_input, course_info, bypass_cache=False, on_partial=None):
+        """generate course sections - needs json for UI
 
+        on_partial(sections) gets the partially parsed structure while it streams
+        """
+        # st.write("📑 structuring course sections...")
         sections = self._generate_step(
             SECTION_GENERATION_PROMPT,
-            context,
-            requires_json=True
+            self._course_context(user_input),
+            requires_json=True,
+            bypass_cache=bypass_cache,
+            on_token=self._partial_json(on_partial, SECTIONS_SCHEMA)
         )
         # st.write("✅ sections structured!")
         return sections
 
-    def generate_lesson_detail(self, user_input, course_info, section_title, lesson, custom_instruction=None):
-        """generate detailed lesson content - returns markdown"""
-        context = {
-            **user_input,
-            "section_title": section_title,
-            "lesson": lesson,
-            "word_count": user_input["structure"]["word_count"]  # NEW: pass through word count
-        }
-        if custom_instruction:
-            context["custom_instruction"] = custom_instruction
+    def generate_lesson_detail(self, user_input, course_info, section_title, lesson, custom_instruction=None,
+                               bypass_cache=False, on_token=None):
+        """generate detailed lesson content - returns markdown
+
+        on_token(delta) gets the raw text as it streams in
+        """
+        context = self._lesson_detail_context(user_input, course_info, section_title, lesson, custom_instruction)
 
         # WAIT - might wanna add word count validation
         content = self._generate_step(
             LESSON_DETAIL_PROMPT,
             context,
-            requires_json=False
+            requires_json=False,
+            on_token=on_token,
+            bypass_cache=bypass_cache
         )
 
-        # ngl might be nice to check actual word count
-        word_count = len(content.split())
-        target = context["word_count"]
-        if abs(word_count - target) > target * 0.2:  # 20% tolerance
-            st.warning(f"⚠️ heads up: lesson length ({word_count} words) is pretty different from target ({target})")
-
+        self._check_word_count(content, context["word_count"])
         return content
 
-    def generate_lessons_for_section(self, user_input, course_info, section):
+    def generate_lessons_for_section(self, user_input, course_info, section, bypass_cache=False):
         """generate lesson outlines - needs json for UI"""
+        lessons = self._generate_step(
+            LESSON_GENERATION_PROMPT,
+            self._section_lessons_context(user_input, course_info, section),
+            requires_json=True,
+            bypass_cache=bypass_cache
+        )
+        return self._section_lessons(section, lessons)
+
+    def generate_quiz(self, lesson, lesson_detail, bypass_cache=False):
+        """generate quiz - needs json for UI"""
+        return self._generate_step(
+            QUIZ_GENERATION_PROMPT,
+            self._quiz_context(lesson, lesson_detail),
+            requires_json=True,
+            bypass_cache=bypass_cache
+        )
+
+    # --- step context builders (shared with the async engine) --- #
+
+    def _course_context(self, user_input):
+        """context for course-level steps (info + sections)"""
+        context = {**user_input}
+        if self.structure:
+            context["extracted_structure"] = self.structure
+        if self.raw_content:
+            context["content_preview"] = self._content_preview()
+        return context
+
+    def _content_preview(self):
+        """uploaded content trimmed to preview_tokens, every file represented"""
+        if self.corpus:
+            return self.corpus.preview(self.preview_tokens)
+        if self.raw_content:
+            return self.raw_content[:self.preview_tokens * 4]
+        return None
+
+    def _lesson_detail_context(self, user_input, course_info, section_title, lesson, custom_instruction=None):
+        # steps run on their own threads, so the overview has to travel with them
         context = {
             **user_input,
+            "course_info": course_info,
+            "section_title": section_title,
+            "lesson": lesson,
+            "word_count": user_input["structure"]["word_count"]  # NEW: pass through word count
+        }
+        if custom_instruction:
+            context["custom_instruction"] = custom_instruction
+        return self._with_source_material(context)
+
+    def _section_lessons_context(self, user_input, course_info, section):
+        context = {
+            **user_input,
+            "course_info": course_info,
             "section": section,
             "current_section_time": section["estimated_time"],
             "total_lessons_needed": max(1, section["estimated_time"] // user_input["structure"]["lesson_length"])
         }
         if self.structure:
             context["extracted_structure"] = self.structure
+        return self._with_source_material(context)
+
+    def _with_source_material(self, context):
+        """attach the top-k local chunks relevant to this section/lesson"""
+        if self.index is None:
+            return context
+        hits = self.index.search(step_query(context), self.retrieval_k)
+        if hits:
+            context["source_material"] = format_hits(hits)
+        return context
+
+    def _build_index(self, corpus):
+        chunks = chunk_corpus(corpus)
+        if self.retrieval == "vector":
+            return VectorIndex.build(chunks, self.embed or hashing_embedder(), path=data_dir("indexes", corpus.fingerprint()[:16]))
+        return BM25Index(chunks)
+
+    def _quiz_context(self, lesson, lesson_detail):
+        return {
+            "lesson_title": lesson.get("title", "Untitled"),
+            "content": lesson_detail
+        }
 
-        lessons = self._generate_step(
-            LESSON_GENERATION_PROMPT,
-            context,
-            requires_json=True
-        )
-
+    def _section_lessons(self, section, lessons):
         return {
             "section_title": section["title"],
             "section_description": section["description"],
             "lessons": lessons["lessons"]
         }
 
-    def generate_quiz(self, lesson, lesson_detail):
-        """generate quiz - needs json for UI"""
-        context = {
-            "lesson_title": lesson.get("title", "Untitled"),
-            "content": lesson_detail
-        }
-        return self._generate_step(
-            QUIZ_GENERATION_PROMPT,
-            context,
-            requires_json=True
-        )
+    def _unwrap_course_info(self, content):
+        """strip optional <content> tags from course info"""
+        # raw markdown without tags is fine, tagged content gets unwrapped
+        unwrapped = unwrap_content(content)
+        if unwrapped is not None:
+            return unwrapped
 
-    def _generate_step(self, prompt, context, requires_json=False):
-        """run a single generation step"""
-        message = self.client.beta.threads.messages.create(
-            thread_id=self.thread_id,
-            role="user",
-            content=f"{prompt}\n\nContext: {json.dumps(context)}"
-        )
+        # if neither worked, show what we got
+        self.reporter.warning("unexpected content format:")
+        self.reporter.code(content)
+        return content.strip()  # return it anyway
+
+    def _check_word_count(self, content, target):
+        # ngl might be nice to check actual word count
+        word_count = len(content.split())
+        if abs(word_count - target) > target * 0.2:  # 20% tolerance
+            self.reporter.warning(f"⚠️ heads up: lesson length ({word_count} words) is pretty different from target ({target})")
+
+    def _generate_step(self, prompt, context, requires_json=False, on_token=None, bypass_cache=False):
+        """run a single generation step
+
+        streams when self.stream is set or on_token is given, otherwise
+        polls the run with backoff. bypass_cache skips the cache read but
+        still stores the fresh result. each step is one "step" trace span
+        """
+        name = prompt_name(prompt)
+        with span("step", prompt=name, model=self.model, course_id=self.course_id):
+            key = self._cache_key(prompt, context)
+            if not bypass_cache:
+                cached = self._cache_get(key)
+                if cached is not None:
+                    annotate(cache_hit=True)
+                    if on_token:
+                        on_token(cached["raw"])
+                    return cached["result"]
+
+            message = self._step_message(prompt, context)
+            content = self._run_step(prompt, message, name, on_token)
+            try:
+                result = self._parse_response(prompt, content, requires_json)
+            except Exception as e:
+                if not requires_json:
+                    raise
+                # tolerant parsing still failed - ask once more, quietly, before giving up
+                self.reporter.warning(f"retrying {name}: {e}")
+                annotate(parse_retry=True)
+                content = self._run_step(prompt, message, name)
+                result = self._parse_response(prompt, content, requires_json)
+            self._cache_put(key, content, result)
+            return result
+
+    def _run_step(self, prompt, message, name, on_token=None):
+        """one model call for a step, returns the raw text"""
+        started = time.monotonic()
+        progress_text = self.reporter.status("generating...")
+        try:
+            if self.backend:
+                content = self._backend_step(prompt, message, name, started, on_token)
+            else:
+                content = self._assistant_step(message, name, started, on_token)
+        finally:
+            progress_text.clear()
+        latency.record(name, "total", time.monotonic() - started)
+        return content
+
+    def _backend_step(self, prompt, message, name, started, on_token=None):
+        """one request through self.backend"""
+        if not (self.stream or on_token):
+            return self.backend.complete(prompt, message)
+        return self.backend.complete(prompt, message, on_token=self._timed(name, started, on_token))
+
+    def _partial_json(self, on_partial, schema):
+        """on_token callback feeding a JsonStream, calls on_partial when the value grows"""
+        if on_partial is None:
+            return None
+        stream = JsonStream(schema)
+        last = [None]
+
+        def on_token(delta):
+            value = stream.feed(delta)
+            if value is not None and value != last[0]:
+                last[0] = value
+                on_partial(value)
+        return on_token
+
+    def _timed(self, name, started, on_token=None):
+        """wrap on_token so the first token records time-to-first-token"""
+        first = [True]
+
+        def callback(delta):
+            if first[0]:
+                first[0] = False
+                latency.record(name, "ttft", time.monotonic() - started)
+            if on_token:
+                on_token(delta)
+        return callback
+
+    def _assistant_step(self, message, name, started, on_token=None):
+        """thread + run + result on the Assistants API"""
+        shared = self._uses_shared_thread(name)
+        if shared:
+            thread_id = self.thread_id
+            self.client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message
+            )
+        else:
+            # seed a throwaway thread with just this step's context
+            thread_id = self.threads.acquire(message, self.vector_store_id)
 
-        progress_text = st.empty()
-        progress_text.text("generating...")
+        try:
+            try:
+                return self.run_retry.call(self._run_once, thread_id, name, started, on_token)
+            except openai.NotFoundError:
+                # the registry's assistant may have been deleted remotely - re-resolve once
+                if not self._refresh_assistant():
+                    raise
+                return self.run_retry.call(self._run_once, thread_id, name, started, on_token)
+        finally:
+            if not shared:
+                self._discard_thread(thread_id)
+
+    def _refresh_assistant(self):
+        """forget the memoized assistant and look it up again, True if the id changed"""
+        stale = self.assistant_id
+        self.registry.forget(stale)
+        self.assistant_id = self.registry.get(self.model)
+        return self.assistant_id != stale
+
+    def _run_once(self, thread_id, name, started, on_token=None):
+        """one run on thread_id, returns the assistant text"""
+        if self.stream or on_token:
+            return self._stream_run(thread_id, name, started, on_token)
 
         run = self.client.beta.threads.runs.create(
-            thread_id=self.thread_id,
+            thread_id=thread_id,
             assistant_id=self.assistant_id
         )
+        run = self.wait_for_run(run.id, thread_id)
+        record_usage(run.usage)
+
+        # only the newest message, and only if this run wrote it
+        messages = self.client.beta.threads.messages.list(
+            thread_id=thread_id,
+            run_id=run.id,
+            order="desc",
+            limit=1
+        )
+        return self._run_output(messages.data, run.id)
+
+    def _run_output(self, messages, run_id):
+        """text of the assistant message produced by run_id
 
-        run = self.wait_for_run(run.id)
-        progress_text.empty()
+        guards against picking up a stale answer from an earlier run on a
+        shared thread
+        """
+        for msg in messages:
+            if msg.role == "assistant" and msg.run_id == run_id:
+                return msg.content[0].text.value
+        raise Exception(f"no valid response from assistant for run {run_id}")
+
+    def _cache_key(self, prompt, context):
+        if self.cache is None:
+            return None
+        return cache_key(prompt, self.model, context, context.get("custom_instruction"), self._cache_scope())
+
+    def _cache_scope(self):
+        """what grounds the answer besides the message - two courses with the
+        same input but different uploads must not share entries"""
+        if self.corpus:
+            content = self.corpus.fingerprint()
+        elif self.raw_content:
+            content = hashlib.sha256(self.raw_content.encode("utf-8")).hexdigest()
+        else:
+            content = None
+        return {
+            "vector_store_id": self.vector_store_id,
+            "content": content,
+            "backend": self.backend.name if self.backend else "assistants",
+        }
 
-        messages = self.client.beta.threads.messages.list(thread_id=self.thread_id)
-        for msg in messages.data:
-            if msg.role == "assistant":
-                content = msg.content[0].text.value.strip()
+    def _cache_get(self, key):
+        if key is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            self.reporter.warning(f"Cache read failed: {e}")
+            return None
 
-                # TOC extraction is special - it can be raw text
-                if prompt == TOC_EXTRACTION_PROMPT:
-                    # if it looks like a TOC (has newlines and indentation)
-                    if '\n' in content and any(line.startswith(' ') for line in content.split('\n')):
-                        return content.strip()
-                    # if not, try json (for generated TOC)
-                    if requires_json:
-                        return self._extract_json_from_response(content)
+    def _cache_put(self, key, raw, result):
+        if key is None:
+            return
+        try:
+            self.cache.put(key, raw, result)
+        except Exception as e:
+            self.reporter.warning(f"Cache write failed: {e}")
 
-                # normal json/content handling
-                if requires_json:
-                    return self._extract_json_from_response(content)
-                else:
-                    return self._extract_content_from_response(content)
+    def _uses_shared_thread(self, name):
+        return self.thread_scope == "shared" or name in self.shared_steps
 
-        raise Exception("no valid response from assistant")
+    def _discard_thread(self, thread_id):
+        """step threads are single-use, recycle them in the background"""
+        self.threads.release(thread_id)
 
-    def wait_for_run(self, run_id):
-        """wait for AI response"""
-        while True:
-            run = self.client.beta.threads.runs.retrieve(
-                thread_id=self.thread_id,
-                run_id=run_id
-            )
-            if run.status == "completed":
-                return run
-            elif run.status in ["failed", "expired"]:
+    def _stream_run(self, thread_id, name, started, on_token=None):
+        """stream a run, returns the full assistant text"""
+        parts = []
+        on_token = self._timed(name, started, on_token)
+        with self.client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=self.assistant_id
+        ) as stream:
+            for delta in stream.text_deltas:
+                parts.append(delta)
+                on_token(delta)
+            run = stream.get_final_run()
+        record_usage(run.usage)
+
+        if run.status != "completed":
+            if parts:
+                # tokens already reached the caller, a rerun would duplicate them
                 raise Exception(f"run failed: {run.last_error}")
-            time.sleep(1)
+            raise RunFailed(run)
+        return "".join(parts)
 
-    def _extract_json_from_response(self, content):
-        """parse json from response (for UI-needed steps)"""
-        # st.write("🔍 parsing json response...")
-
-        def clean_json_string(s):
-            fixes = [
-                (r'(?<!\\)"(\w+)": ', r'"\1": '),  # fix unquoted props
-                (r',(\s*[}\]])', r'\1'),           # fix trailing commas
-                (r'\\([^"])', r'\\\\\1'),          # escape backslashes
-                (r'(?<!\\)\\(?!["\\])', r'\\\\')   # escape remaining
-            ]
-            for pattern, replacement in fixes:
-                s = re.sub(pattern, replacement, s)
-            return s
-
-        def extract_json_block(s):
-            patterns = [
-                r'```(?:json)?\n(.*?)\n```',  # markdown block
-                r'{[\s\S]*}',                 # raw object
-                r'\[[\s\S]*\]'                # raw array
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, s, re.DOTALL)
-                if match:
-                    return match.group(1) if pattern.startswith('```') else match.group(0)
-            return s
+    def _step_message(self, prompt, context):
+        return self.context_builder.build(prompt, context)
 
-        try:
-            json_str = extract_json_block(content)
-            cleaned = clean_json_string(json_str)
+    def _summarize(self, text, max_tokens):
+        """one-off summary for context compaction, reused via the builder's memo"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{
+                "role": "user",
+                "content": f"Summarize the following material in at most {max_tokens} tokens. "
+                           f"Keep headings, numbering and key terms.\n\n{text}"
+            }],
+            max_tokens=max_tokens
+        )
+        record_usage(response.usage)
+        return response.choices[0].message.content
 
-            try:
-                return json.loads(cleaned)
-            except json.JSONDecodeError as e1:
-                st.write(f"💥 failed to parse cleaned json: {str(e1)}")
-                st.write("attempting original...")
-                return json.loads(json_str)
-
-        except json.JSONDecodeError as e:
-            st.error(f"💥 json parsing failed: {str(e)}")
-            raise Exception(f"no valid json found: {str(e)}")
+    def _parse_response(self, prompt, content, requires_json):
+        """turn raw assistant text into the step result"""
+        content = content.strip()
 
-    def _extract_content_from_response(self, content):
-        """extract and clean content"""
-        # first clean any color formatting or special chars
-        content = re.sub(r'#[A-Fa-f0-9]{6}', '', content)  # remove color codes
+        # TOC extraction is special - it can be raw text
+        if prompt == TOC_EXTRACTION_PROMPT:
+            # if it looks like a TOC (has newlines and indentation)
+            if '\n' in content and any(line.startswith(' ') for line in content.split('\n')):
+                return content.strip()
+            # if not, try json (for generated TOC)
+            if requires_json:
+                return self._extract_json_from_response(content)
 
-        # then normalize markdown
-        content = self._normalize_markdown(content)
+        # normal json/content handling - clean json takes parse_json's fast path
+        if requires_json:
+            return self._extract_json_from_response(content, PARSE_SCHEMAS.get(prompt_name(prompt)))
+        else:
+            return self._extract_content_from_response(content)
 
-        # THEN do our normal content extraction
-        if content.strip().startswith('#') or content.strip().startswith('-'):
-            return content.strip()
+    def wait_for_run(self, run_id, thread_id=None):
+        """wait for AI response"""
+        try:
+            run, polls = poll(
+                lambda: self.client.beta.threads.runs.retrieve(
+                    thread_id=thread_id or self.thread_id,
+                    run_id=run_id
+                ),
+                is_done=lambda r: r.status == "completed",
+                is_failed=lambda r: r.status in RUN_FAILED_STATES,
+                policy=self.poll_policy
+            )
+        except PollFailed as e:
+            raise RunFailed(e.obj)
+        count(polls=polls)
+        return run
 
-        content_match = re.search(r'<content>(.*?)</content>',
-                                content,
-                                re.DOTALL)
-        if content_match:
-            return content_match.group(1).strip()
+    def _extract_json_from_response(self, content, schema=None):
+        """parse json from response (for UI-needed steps)"""
+        try:
+            return parse_json(content, schema)
+        except SchemaError as e:
+            self.reporter.error(f"💥 json doesn't match the expected structure: {str(e)}")
+            raise Exception(f"invalid json structure: {str(e)}")
+        except JSONExtractionError as e:
+            self.reporter.error(f"💥 json parsing failed: {str(e)}")
+            raise Exception(f"no valid json found: {str(e)}")
 
-        if '\n' in content and any(line.startswith(('#', '-', '*')) for line in content.split('\n')):
-            return content.strip()
+    def _extract_content_from_response(self, content):
+        """extract and clean content"""
+        extracted = extract_markdown(content)
+        if extracted is not None:
+            return extracted
 
-        st.error("💥 couldn't parse content format!")
-        st.code(content)
+        self.reporter.error("💥 couldn't parse content format!")
+        self.reporter.code(content)
         raise Exception("no valid content found")
 
     def _normalize_markdown(self, content: str) -> str:
         """ensure consistent markdown formatting regardless of input mess"""
-        def clean_line(line: str) -> str:
-            # strip any existing formatting first
-            line = line.strip()
-
-            # fix headers - handle multiple scenarios
-            if any(line.startswith(p) for p in ['#', '**#', '#**', '# **']):
-                # strip ALL formatting from header line
-                clean = re.sub(r'[*#]+\s*', '', line)
-                # check if it looks like a subheader
-                if any(kw in clean.lower() for kw in ['overview', 'what you need', 'structure', 'requirements']):
-                    return f"## {clean}"
-                return f"# {clean}"
-
-            # fix emphasis/bold - normalize to markdown style
-            line = re.sub(r'\*\*(.*?)\*\*', r'**\1**', line)
-            line = re.sub(r'__(.+?)__', r'**\1**', line)
-
-            # fix bullet points
-            if line.lstrip().startswith('-'):
-                return f"- {line.lstrip('-').strip()}"
-
-            return line
-
-        # process line by line
-        lines = content.split('\n')
-        normalized = [clean_line(line) for line in lines if line.strip()]
-
-        return '\n'.join(normalized)
+        return normalize_markdown(content)
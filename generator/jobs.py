@@ -0,0 +1,331 @@
+"""Background "generate everything" jobs that checkpoint as they go"""
+
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.paths import data_dir
+from .reporting import Reporter
+from . import store as course_store
+
+def outline_key(section_index):
+    return f"outline:{section_index}"
+
+def detail_key(section_index, lesson_index):
+    return f"detail:{section_index}:{lesson_index}"
+
+def quiz_key(section_index, lesson_index):
+    return f"quiz:{section_index}:{lesson_index}"
+
+class CourseJob:
+    """lesson outlines -> lesson details -> quizzes for every section, off the script thread
+
+    each finished item is written to a json checkpoint straight away, so a
+    job rebuilt with CourseJob.load() after a restart skips everything that
+    already finished. an item that fails is recorded in errors and the rest
+    keep going - resuming retries only the failures (and what depends on them).
+    with a course store the store is the checkpoint: finished items go there
+    only, and the json file keeps just the job's metadata
+    """
+
+    def __init__(self, generator, user_input, course_info, sections, job_id=None, quizzes=True,
+                 max_workers=4, results=None, store=None, course_id=None):
+        if generator.thread_scope == "shared":
+            raise ValueError("background jobs run steps concurrently, use thread_scope='isolated'")
+        # our own copy, streamlit calls from a worker thread would go nowhere
+        self.generator = copy.copy(generator)
+        self.generator.reporter = Reporter()
+        if course_id:
+            self.generator.course_id = course_id
+        self.user_input = user_input
+        self.course_info = course_info
+        self.sections = sections
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.quizzes = quizzes
+        self.max_workers = max_workers
+        self.results = dict(results or {})
+        # optional CourseStore - every result is also written there as it lands
+        self.store = store
+        self.course_id = course_id
+        self.status = "pending"  # pending -> running -> done / failed / cancelled
+        self.error = None
+        self.errors = {}  # item key -> error message, for items that failed this run
+        self.current = set()
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    # --- persistence --- #
+
+    @staticmethod
+    def checkpoint_path(job_id):
+        return data_dir("jobs", f"{job_id}.json")
+
+    def _uses_store(self):
+        return bool(self.store and self.course_id)
+
+    def save(self):
+        with self._lock:
+            state = {
+                "job_id": self.job_id,
+                "status": self.status,
+                "error": self.error,
+                "errors": self.errors,
+                "quizzes": self.quizzes,
+                "user_input": self.user_input,
+                "course_info": self.course_info,
+                "sections": self.sections,
+                "course_id": self.course_id,
+                "assistant_id": self.generator.assistant_id,
+                "model": self.generator.model,
+                # rebuilt from the store on load, rewriting them here every item is O(n^2)
+                "results": None if self._uses_store() else self.results,
+                "updated": time.time(),
+            }
+        path = self.checkpoint_path(self.job_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_state(cls, job_id):
+        """raw checkpoint dict, None if there isn't one"""
+        try:
+            with open(cls.checkpoint_path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, job_id, generator, max_workers=4, store=None):
+        """rebuild a job from its checkpoint (generator gets the saved assistant)"""
+        state = cls.load_state(job_id)
+        if state is None:
+            return None
+        if not generator.assistant_id:
+            generator.assistant_id = state["assistant_id"]
+        results = state["results"]
+        if results is None:
+            if store is None:
+                return None  # checkpointed into a store we weren't given
+            results = cls.results_from_store(store, state["course_id"], state["sections"])
+        job = cls(
+            generator,
+            state["user_input"],
+            state["course_info"],
+            state["sections"],
+            job_id=job_id,
+            quizzes=state["quizzes"],
+            max_workers=max_workers,
+            results=results,
+            store=store,
+            course_id=state.get("course_id"),
+        )
+        job.status = state["status"]
+        job.error = state["error"]
+        job.errors = state.get("errors", {})
+        return job
+
+    @staticmethod
+    def results_from_store(store, course_id, sections):
+        """job results (outline:i, detail:i:j, quiz:i:j) rebuilt from a course's artifacts"""
+        course = store.load_course(course_id)
+        if course is None:
+            return {}
+        artifacts = course["artifacts"]
+        results = {}
+        for i in range(len(sections)):
+            outline = artifacts["section_lessons"].get(str(i))
+            if not outline:
+                continue
+            results[outline_key(i)] = outline
+            for j, lesson in enumerate(outline["lessons"]):
+                detail = artifacts["lesson_detail"].get(course_store.lesson_key(outline["section_title"], lesson["title"]))
+                if detail is None:
+                    continue
+                results[detail_key(i, j)] = detail
+                quiz = artifacts["quiz"].get(course_store.quiz_key(detail))
+                if quiz is not None:
+                    results[quiz_key(i, j)] = quiz
+        return results
+
+    # --- progress --- #
+
+    def total(self):
+        """items we know about so far - details/quizzes appear as outlines land"""
+        total = len(self.sections)
+        for i in range(len(self.sections)):
+            outline = self.results.get(outline_key(i))
+            if outline:
+                per_lesson = 2 if self.quizzes else 1
+                total += per_lesson * len(outline["lessons"])
+        return total
+
+    def progress(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "done": len(self.results),
+                "total": self.total(),
+                "current": sorted(self.current),
+                "failed": sorted(self.errors),
+                "error": self.error,
+            }
+
+    def section_lessons(self):
+        """generate_lessons_for_section-shaped results with details/quizzes merged in"""
+        out = []
+        for i in range(len(self.sections)):
+            outline = self.results.get(outline_key(i))
+            if not outline:
+                continue
+            outline = copy.deepcopy(outline)
+            for j, lesson in enumerate(outline["lessons"]):
+                if detail_key(i, j) in self.results:
+                    lesson["detail"] = self.results[detail_key(i, j)]
+                if quiz_key(i, j) in self.results:
+                    lesson["quiz"] = self.results[quiz_key(i, j)]
+            out.append(outline)
+        return out
+
+    # --- running --- #
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._cancelled.clear()
+        self._thread = threading.Thread(target=self._run, name=f"course-job-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_alive(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        self.status = "running"
+        self.error = None
+        self.errors = {}  # retried on this run
+        self.save()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pending = {}
+                for i in range(len(self.sections)):
+                    self._schedule_outline(pool, pending, i)
+
+                while pending and not self._cancelled.is_set():
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key, follow_up = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            # its dependents can't run, everything else carries on
+                            with self._lock:
+                                self.current.discard(key)
+                                self.errors[key] = f"{type(e).__name__}: {e}"
+                            self.save()
+                            continue
+                        with self._lock:
+                            self.current.discard(key)
+                            self.results[key] = result
+                        if self._uses_store():
+                            self._persist(key, result)
+                        else:
+                            self.save()
+                        follow_up(pool, pending)
+
+                for future in pending:
+                    future.cancel()
+
+            if self._cancelled.is_set():
+                self.status = "cancelled"
+            elif self.errors:
+                self.status = "failed"
+                self.error = f"{len(self.errors)} item(s) failed, resume to retry them: " + \
+                    ", ".join(f"{key} ({message})" for key, message in sorted(self.errors.items()))
+            else:
+                self.status = "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = f"{e}\n{traceback.format_exc()}"
+        self.save()
+
+    def _persist(self, key, result):
+        """checkpoint a finished item into the course store"""
+        kind, *index = key.split(":")
+        i = int(index[0])
+        if kind == "outline":
+            self.store.put(self.course_id, "section_lessons", i, result)
+            return
+        j = int(index[1])
+        if kind == "detail":
+            outline = self.results[outline_key(i)]
+            key = course_store.lesson_key(outline["section_title"], outline["lessons"][j]["title"])
+            self.store.put(self.course_id, "lesson_detail", key, result)
+        else:
+            self.store.put(self.course_id, "quiz", course_store.quiz_key(self.results[detail_key(i, j)]), result)
+
+    def _submit(self, pool, pending, key, fn, follow_up=lambda pool, pending: None):
+        """run fn unless its result is already checkpointed, then follow_up either way"""
+        if key in self.results:
+            follow_up(pool, pending)
+            return
+        with self._lock:
+            self.current.add(key)
+        pending[pool.submit(fn)] = (key, follow_up)
+
+    def _schedule_outline(self, pool, pending, i):
+        section = self.sections[i]
+        self._submit(
+            pool, pending, outline_key(i),
+            lambda: self.generator.generate_lessons_for_section(self.user_input, self.course_info, section),
+            lambda pool, pending: self._schedule_details(pool, pending, i)
+        )
+
+    def _schedule_details(self, pool, pending, i):
+        outline = self.results[outline_key(i)]
+        for j, lesson in enumerate(outline["lessons"]):
+            self._submit(
+                pool, pending, detail_key(i, j),
+                lambda lesson=lesson: self.generator.generate_lesson_detail(
+                    self.user_input, self.course_info, outline["section_title"], lesson
+                ),
+                lambda pool, pending, j=j: self._schedule_quiz(pool, pending, i, j)
+            )
+
+    def _schedule_quiz(self, pool, pending, i, j):
+        if not self.quizzes:
+            return
+        lesson = self.results[outline_key(i)]["lessons"][j]
+        self._submit(
+            pool, pending, quiz_key(i, j),
+            lambda: self.generator.generate_quiz(lesson, self.results[detail_key(i, j)])
+        )
+
+# jobs outlive streamlit script runs (and sessions) by living at module level
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def register_job(job):
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def active_jobs():
+    with _jobs_lock:
+        return [job for job in _jobs.values() if job.is_alive()]
@@ -0,0 +1,381 @@
+"""Tolerant JSON extraction for model output
+
+models wrap json in prose and code fences, leave trailing commas, forget to
+quote keys, use python literals and stop mid-object when a stream is cut.
+parse_json() finds the first balanced value and repairs those mistakes in a
+single left-to-right scan - no blanket regex rewrites, so valid json always
+comes back unchanged. the same scan can close a truncated value, which is what
+JsonStream uses to hand the UI a usable object while tokens are still arriving.
+conform() then checks the result against the schemas in generator/schemas.py.
+"""
+
+import json
+import re
+
+FENCE = re.compile(r'```(?:json)?\s*\n')
+BARE_TOKEN = re.compile(r'[A-Za-z0-9_+\-.$]+')
+LEADING_INT = re.compile(r'\s*(-?\d+)')
+JSON_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+JSON_ESCAPES = frozenset('"\\/bfnrt')
+HEX = frozenset('0123456789abcdefABCDEF')
+LITERALS = {
+    "true": "true", "True": "true",
+    "false": "false", "False": "false",
+    "null": "null", "None": "null", "NaN": "null", "undefined": "null",
+}
+# a stray quote inside a string is taken as the closing quote only when
+# what follows it could legally follow a string
+AFTER_STRING = frozenset(',:}]"')
+MAX_CANDIDATES = 8
+
+class JSONExtractionError(ValueError):
+    """no usable json value in the text"""
+
+class SchemaError(ValueError):
+    """parsed json doesn't match the step's schema"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+# --- scanning --- #
+
+def _read_string(text, i):
+    """json-encode the string literal starting at text[i]
+
+    returns (encoded, next index, closed)
+    """
+    quote = text[i]
+    n = len(text)
+    out = ['"']
+    i += 1
+    while i < n:
+        c = text[i]
+        if c == '\\':
+            if i + 1 >= n:
+                return ''.join(out) + '"', n, False
+            nxt = text[i + 1]
+            if nxt in JSON_ESCAPES:
+                out.append(text[i:i + 2])
+                i += 2
+            elif nxt == 'u' and i + 6 <= n and all(h in HEX for h in text[i + 2:i + 6]):
+                out.append(text[i:i + 6])
+                i += 6
+            elif nxt == "'":
+                out.append("'")
+                i += 2
+            else:
+                # \d, \s, windows paths... keep the backslash literally
+                out.append('\\\\')
+                i += 1
+            continue
+        if c == quote:
+            j = i + 1
+            while j < n and text[j] in ' \t\r\n':
+                j += 1
+            if quote == "'" or j == n or text[j] in AFTER_STRING:
+                out.append('"')
+                return ''.join(out), i + 1, True
+            out.append('\\"')  # unescaped quote inside the string
+        elif c == '"':
+            out.append('\\"')  # inside a single-quoted string
+        elif c < ' ':
+            out.append(json.dumps(c)[1:-1])
+        else:
+            out.append(c)
+        i += 1
+    return ''.join(out) + '"', n, False
+
+def _scan(text, start):
+    """repair the value opening at text[start]
+
+    returns (json text, complete) - for an incomplete value the json text is
+    the truncated prefix closed at the last finished element, or None
+    """
+    n = len(text)
+    out = []
+    stack = []       # '{' / '['
+    expect_key = []  # per frame, only meaningful for '{'
+    need_comma = False
+    safe = None      # (len(out), open frames) at the last point we could close
+
+    def value_done():
+        nonlocal need_comma, safe
+        need_comma = True
+        safe = (len(out), stack[:])
+
+    def begin_value():
+        # two values in a row - the model dropped a comma
+        nonlocal need_comma
+        if need_comma:
+            out.append(',')
+            if stack[-1] == '{':
+                expect_key[-1] = True
+            need_comma = False
+
+    i = start
+    while i < n:
+        c = text[i]
+        if c in ' \t\r\n':
+            i += 1
+        elif c in '"\'':
+            begin_value()
+            encoded, i, closed = _read_string(text, i)
+            if not closed:
+                break
+            out.append(encoded)
+            if stack[-1] == '{' and expect_key[-1]:
+                need_comma = False
+                # a key followed directly by a value means a missing colon
+                j = i
+                while j < n and text[j] in ' \t\r\n':
+                    j += 1
+                if j < n and text[j] != ':':
+                    out.append(':')
+                    expect_key[-1] = False
+            else:
+                value_done()
+        elif c in '{[':
+            begin_value()
+            stack.append(c)
+            expect_key.append(c == '{')
+            out.append(c)
+            need_comma = False
+            safe = (len(out), stack[:])
+            i += 1
+        elif c in '}]':
+            if out and out[-1] == ',':
+                out.pop()  # trailing comma
+            if out and out[-1] == ':':
+                out.append('null')  # key with no value
+            out.append('}' if stack.pop() == '{' else ']')
+            expect_key.pop()
+            i += 1
+            if not stack:
+                return ''.join(out), True
+            value_done()
+        elif c == ',':
+            if out[-1] not in ',[{:':
+                out.append(',')
+            if stack[-1] == '{':
+                expect_key[-1] = True
+            need_comma = False
+            i += 1
+        elif c == ':':
+            out.append(':')
+            expect_key[-1] = False
+            need_comma = False
+            i += 1
+        elif c == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+        elif c == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+        else:
+            match = BARE_TOKEN.match(text, i)
+            if not match:
+                i += 1  # junk between tokens
+                continue
+            begin_value()
+            token = match.group(0)
+            i = match.end()
+            if stack[-1] == '{' and expect_key[-1]:
+                out.append(json.dumps(token))  # unquoted key
+                continue
+            if i == n:
+                break  # a number cut off mid-stream isn't trustworthy
+            if token in LITERALS:
+                out.append(LITERALS[token])
+            else:
+                out.append(_number(token))
+            value_done()
+
+    if safe is None:
+        return None, False
+    length, frames = safe
+    truncated = out[:length]
+    if truncated and truncated[-1] == ',':
+        truncated.pop()
+    truncated.extend('}' if frame == '{' else ']' for frame in reversed(frames))
+    return ''.join(truncated), False
+
+def _number(token):
+    """json text for a bare token - numbers in javascript/python spelling
+    (.5, 5., +1, 007, 1_000) are normalized, anything else becomes a string"""
+    if JSON_NUMBER.fullmatch(token):
+        return token
+    try:
+        value = float(token)
+    except ValueError:
+        return json.dumps(token)  # bare word, treat as a string
+    if value != value or value in (float("inf"), float("-inf")):
+        return json.dumps(token)  # json has no nan/infinity
+    return str(int(value)) if value.is_integer() and not any(c in token for c in '.eE') else repr(value)
+
+def _candidates(text, openers='{['):
+    """start offsets worth trying - a fenced block first, then objects before arrays"""
+    offsets = []
+    fence = FENCE.search(text)
+    if fence:
+        first = next((i for i in range(fence.end(), len(text)) if text[i] in openers), None)
+        if first is not None:
+            offsets.append(first)
+    for opener in openers:
+        start = text.find(opener)
+        while start >= 0 and len(offsets) < MAX_CANDIDATES:
+            if start not in offsets:
+                offsets.append(start)
+            start = text.find(opener, start + 1)
+    return offsets[:MAX_CANDIDATES]
+
+# --- public api --- #
+
+def parse_json(text, schema=None, partial=False):
+    """first json object/array in text, repaired and optionally conformed to schema
+
+    with partial=True the first value found is returned as-is, an unfinished
+    one closed at its last complete element, and None (instead of raising)
+    when nothing is usable yet - schema then only narrows where to look.
+    otherwise a value cut off mid-stream is an error, never an object nested
+    inside it
+    """
+    try:
+        value = json.loads(text)
+        if isinstance(value, (dict, list)):
+            return conform(value, schema) if schema and not partial else value
+    except (json.JSONDecodeError, TypeError):
+        pass
+
+    first_error = None
+    truncated_from = None  # start of the first candidate that ran off the end of the text
+    # every step schema is an object, so don't let a bracketed aside in the prose win
+    openers = '{' if schema and schema.get("type") == "object" else '{['
+    for start in _candidates(text, openers):
+        if not partial and truncated_from is not None and start > truncated_from:
+            # nested inside a value that was cut off - a complete inner
+            # object isn't the answer, the truncated outer one was
+            continue
+        repaired, complete = _scan(text, start)
+        if not complete and truncated_from is None:
+            truncated_from = start
+        if repaired is None:
+            continue
+        try:
+            value = json.loads(repaired)
+        except json.JSONDecodeError as e:
+            first_error = first_error or e
+            continue
+        if partial:
+            return value
+        if not complete:
+            first_error = first_error or JSONExtractionError("json value is truncated")
+            continue
+        if schema is None:
+            return value
+        try:
+            return conform(value, schema)
+        except SchemaError as e:
+            # prose can contain a stray {...}, keep looking for one that fits
+            first_error = first_error or e
+
+    if partial:
+        return None
+    if isinstance(first_error, SchemaError):
+        raise first_error
+    raise JSONExtractionError(f"no json value found{f': {first_error}' if first_error else ''}")
+
+def conform(value, schema, path="$"):
+    """coerce value to schema, raises SchemaError listing every mismatch
+
+    coercions are deterministic: "30 minutes" -> 30 for integers,
+    "true"/"false" -> booleans, unknown keys dropped where
+    additionalProperties is false
+    """
+    errors = []
+    result = _conform(value, schema, path, errors)
+    if errors:
+        raise SchemaError(errors)
+    return result
+
+def _conform(value, schema, path, errors):
+    if "anyOf" in schema:
+        for option in schema["anyOf"]:
+            attempt = []
+            result = _conform(value, option, path, attempt)
+            if not attempt:
+                return result
+        errors.append(f"{path}: matches none of {len(schema['anyOf'])} variants")
+        return value
+
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected object")
+            return value
+        properties = schema.get("properties", {})
+        result = {}
+        for key, item in value.items():
+            if key in properties:
+                result[key] = _conform(item, properties[key], f"{path}.{key}", errors)
+            elif schema.get("additionalProperties", True) is not False:
+                result[key] = item
+        for key in schema.get("required", ()):
+            if key not in value:
+                errors.append(f"{path}: missing {key!r}")
+        return result
+    if kind == "array":
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected array")
+            return value
+        items = schema.get("items", {})
+        return [_conform(item, items, f"{path}[{i}]", errors) for i, item in enumerate(value)]
+    if kind == "integer":
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            errors.append(f"{path}: expected integer")
+            return value
+        if isinstance(value, str):
+            match = LEADING_INT.match(value)
+            if not match:
+                errors.append(f"{path}: expected integer, got {value!r}")
+                return value
+            return int(match.group(1))
+        return int(value)
+    if kind == "boolean":
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if not isinstance(value, bool):
+            errors.append(f"{path}: expected boolean")
+        return value
+    if kind == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            errors.append(f"{path}: expected string")
+        elif "enum" in schema and value not in schema["enum"]:
+            errors.append(f"{path}: {value!r} not in {schema['enum']}")
+        return value
+    return value
+
+class JsonStream:
+    """incremental parse_json for token streams
+
+    feed() deltas as they arrive and get back the best partial value so far
+    (None until something is usable). only re-parses when a delta could have
+    finished an element
+    """
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self._parts = []
+        self.value = None
+
+    def feed(self, delta):
+        self._parts.append(delta)
+        if any(c in delta for c in '}],"'):
+            text = ''.join(self._parts)
+            self._parts = [text]
+            value = parse_json(text, self.schema, partial=True)
+            if value is not None:
+                self.value = value
+        return self.value
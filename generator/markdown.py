@@ -0,0 +1,114 @@
+"""Markdown cleanup for model output - batch and streaming
+
+everything here runs once per line of every lesson, so patterns are compiled
+at import and each line is classified with plain startswith checks before any
+regex gets involved
+"""
+
+import re
+
+COLOR_CODE = re.compile(r'#[A-Fa-f0-9]{6}')
+HEADER_MARKUP = re.compile(r'[*#]+\s*')
+UNDERSCORE_BOLD = re.compile(r'__(.+?)__')
+SUBHEADER_KEYWORDS = re.compile(r'overview|what you need|structure|requirements', re.IGNORECASE)
+CONTENT_BLOCK = re.compile(r'<content>(.*?)</content>', re.DOTALL)
+
+# '#**' and '# **' both start with '#', so two prefixes cover every header form
+HEADER_PREFIXES = ('#', '**#')
+CONTENT_TAGS = ('<content>', '</content>')
+
+def normalize_line(line: str) -> str:
+    """clean a single stripped, non-empty markdown line"""
+    if line.startswith(HEADER_PREFIXES):
+        # strip ALL formatting from header line
+        clean = HEADER_MARKUP.sub('', line)
+        if SUBHEADER_KEYWORDS.search(clean):
+            return f"## {clean}"
+        return f"# {clean}"
+
+    if '__' in line:
+        line = UNDERSCORE_BOLD.sub(r'**\1**', line)
+
+    if line.startswith('-'):
+        return f"- {line.lstrip('-').strip()}"
+
+    return line
+
+def normalize_markdown_line(line: str) -> str:
+    """clean a single markdown line (shared by the batch and streaming paths)"""
+    return normalize_line(line.strip())
+
+def normalize_markdown(content: str) -> str:
+    """ensure consistent markdown formatting regardless of input mess
+
+    color codes are dropped, blank lines removed, headers/bullets/bold normalized
+    """
+    if '#' in content:
+        content = COLOR_CODE.sub('', content)
+    normalized = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if line:
+            normalized.append(normalize_line(line))
+    return '\n'.join(normalized)
+
+def extract_markdown(content: str):
+    """normalized markdown body of a response, None if it doesn't look like any"""
+    content = normalize_markdown(content)
+    stripped = content.strip()
+    if stripped.startswith(('#', '-')):
+        return stripped
+
+    match = CONTENT_BLOCK.search(content)
+    if match:
+        return match.group(1).strip()
+
+    # normalized lines are already stripped, so the per-line check is a prefix test
+    if '\n' in content and any(line.startswith(('#', '-', '*')) for line in content.split('\n')):
+        return stripped
+    return None
+
+def unwrap_content(content: str) -> str:
+    """strip optional <content> tags"""
+    stripped = content.strip()
+    if not stripped.startswith('<content>'):
+        return stripped
+    match = CONTENT_BLOCK.search(content)
+    return match.group(1).strip() if match else None
+
+class MarkdownStream:
+    """incremental normalize_markdown for token streams
+
+    feed() deltas as they arrive; completed lines are normalized once,
+    the trailing partial line is shown raw until its newline shows up.
+    finished lines are kept pre-joined so each feed costs the delta, not the
+    whole document
+    """
+
+    def __init__(self):
+        self._done = ""
+        self._partial = ""
+
+    def feed(self, delta: str) -> str:
+        """add a delta, returns the renderable text so far"""
+        if '\n' not in delta:
+            self._partial += delta
+            return self.text
+        *done, self._partial = (self._partial + delta).split('\n')
+        for line in done:
+            # drop the <content> wrapper and color codes like the batch path does
+            if '#' in line:
+                line = COLOR_CODE.sub('', line)
+            line = line.strip()
+            if not line or line in CONTENT_TAGS:
+                continue
+            line = normalize_line(line)
+            self._done = f"{self._done}\n{line}" if self._done else line
+        return self.text
+
+    @property
+    def text(self) -> str:
+        partial = self._partial.replace('<content>', '').strip()
+        if not partial:
+            return self._done
+        return f"{self._done}\n{partial}" if self._done else partial
@@ -0,0 +1,83 @@
+"""End-to-end course generation without any UI in the loop"""
+
+import json
+import re
+from pathlib import Path
+from utils.file_handler import process_uploaded_file, cleanup_vector_store
+from utils.tracing import span
+
+def generate_course(generator, user_input, files=(), quizzes=True, manifest=None, remote_search=True):
+    """run every stage (toc -> course_info -> sections -> lessons) in one go
+
+    same flow app.py walks through with buttons, minus the approvals.
+    files are UploadedFile-like objects (name + getvalue()). with a
+    VectorStoreManifest, vector stores are reused and released instead of deleted.
+    remote_search=False skips the vector store entirely (pair it with generator.retrieval).
+    the whole run is one "course" trace span, parent of every step span
+    """
+    client = generator.client
+    with span("course", course_id=generator.course_id):
+        vector_store_id = None
+        try:
+            content_found = False
+            if files:
+                content_found = generator.process_files(files)
+            if files and remote_search:
+                if manifest:
+                    vector_store_id = manifest.acquire(client, files)
+                else:
+                    vector_store_id = process_uploaded_file(client, files)
+
+            generator.init_assistant(vector_store_id)
+
+            toc = generator.extract_toc(user_input) if content_found else None
+            course_info = generator.generate_course_info(user_input)
+            sections = generator.generate_sections(user_input, course_info)
+
+            lessons = []
+            for section in sections["sections"]:
+                section_lessons = generator.generate_lessons_for_section(user_input, course_info, section)
+                for lesson in section_lessons["lessons"]:
+                    lesson["detail"] = generator.generate_lesson_detail(
+                        user_input,
+                        course_info,
+                        section_lessons["section_title"],
+                        lesson
+                    )
+                    if quizzes:
+                        lesson["quiz"] = generator.generate_quiz(lesson, lesson["detail"])
+                lessons.append(section_lessons)
+
+            return {
+                "user_input": user_input,
+                "toc": toc,
+                "course_info": course_info,
+                "sections": sections,
+                "lessons": lessons,
+            }
+        finally:
+            if generator.thread_id:
+                # the course's shared thread, if it used one - nothing else will release it
+                generator.threads.release(generator.thread_id)
+            if vector_store_id and manifest:
+                manifest.release(vector_store_id)
+            elif vector_store_id:
+                cleanup_vector_store(client, vector_store_id)
+
+def write_course(course, out_dir):
+    """dump course.json plus a readable course.md"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "course.json").write_text(json.dumps(course, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    parts = [course["course_info"]]
+    for i, section in enumerate(course["lessons"], 1):
+        parts.append(f"# {i}. {section['section_title']}\n\n*{section['section_description']}*")
+        for j, lesson in enumerate(section["lessons"], 1):
+            parts.append(f"## {i}.{j} {lesson['title']}\n\n*{lesson['duration']} minutes*")
+            parts.append(lesson.get("detail", lesson.get("brief", "")))
+    (out_dir / "course.md").write_text("\n\n".join(parts) + "\n", encoding="utf-8")
+    return out_dir
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-") or "course"
@@ -1,3 +1,9 @@
+ASSISTANT_INSTRUCTIONS = """You are an expert course designer with:
+            1. Perfect content structure detection
+            2. Audience adaptation skills
+            3. Consistent tone maintenance
+            4. Complex topic breakdown abilities"""
+
 LESSON_DETAIL_PROMPT = """yo, time to make this topic actually click for someone.
 
 guidelines:
@@ -212,3 +218,17 @@ output format:
        "estimated_minutes": int
    }
 }"""
+
+
+# short names for metrics/logging, keyed by the prompt constant itself
+PROMPT_NAMES = {
+    TOC_EXTRACTION_PROMPT: "toc",
+    COURSE_INFO_PROMPT: "course_info",
+    SECTION_GENERATION_PROMPT: "sections",
+    LESSON_GENERATION_PROMPT: "lessons",
+    LESSON_DETAIL_PROMPT: "lesson_detail",
+    QUIZ_GENERATION_PROMPT: "quiz",
+}
+
+def prompt_name(prompt):
+    return PROMPT_NAMES.get(prompt, "custom")
@@ -0,0 +1,81 @@
+"""Progress/reporting callbacks so generation doesn't depend on a UI"""
+
+import logging
+
+logger = logging.getLogger("course_generator")
+
+class Status:
+    """handle for a transient status line, clear() removes it"""
+    def clear(self):
+        pass
+
+class Reporter:
+    """what CourseGenerator calls to tell someone what's going on
+
+    the base class logs everything, subclass it to render somewhere else
+    """
+
+    def info(self, message):
+        logger.info(message)
+
+    def warning(self, message):
+        logger.warning(message)
+
+    def error(self, message):
+        logger.error(message)
+
+    def code(self, text):
+        logger.debug(text)
+
+    def status(self, message) -> Status:
+        logger.debug(message)
+        return Status()
+
+class NullReporter(Reporter):
+    """swallow everything - for tests and quiet workers"""
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+    def code(self, text):
+        pass
+
+    def status(self, message):
+        return Status()
+
+class StreamlitReporter(Reporter):
+    """render straight into the current streamlit script run"""
+
+    def __init__(self):
+        import streamlit as st  # only the app needs streamlit
+        self.st = st
+
+    def info(self, message):
+        self.st.write(message)
+
+    def warning(self, message):
+        self.st.warning(message)
+
+    def error(self, message):
+        self.st.error(message)
+
+    def code(self, text):
+        self.st.code(text)
+
+    def status(self, message):
+        placeholder = self.st.empty()
+        placeholder.text(message)
+        return _StreamlitStatus(placeholder)
+
+class _StreamlitStatus(Status):
+    def __init__(self, placeholder):
+        self.placeholder = placeholder
+
+    def clear(self):
+        self.placeholder.empty()
@@ -0,0 +1,140 @@
+"""Offline chunking + retrieval over uploaded materials"""
+
+import hashlib
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+_WORD = re.compile(r"\w+")
+
+def _terms(text):
+    return [t for t in _WORD.findall(text.lower()) if len(t) > 2]
+
+@dataclass
+class Chunk:
+    source: str  # file name it came from
+    index: int  # position within that file
+    text: str
+
+def chunk_corpus(corpus, chunk_words=220, overlap_words=40):
+    """split every document into overlapping word windows"""
+    chunks = []
+    step = max(1, chunk_words - overlap_words)
+    for doc in corpus.documents:
+        words = doc.text.split()
+        for n, start in enumerate(range(0, max(1, len(words)), step)):
+            window = words[start:start + chunk_words]
+            if window:
+                chunks.append(Chunk(doc.name, n, " ".join(window)))
+    return chunks
+
+class BM25Index:
+    """classic Okapi BM25, pure python - fine up to a few thousand chunks"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._tfs = [Counter(_terms(c.text)) for c in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._tfs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if chunks else 0
+        df = Counter(term for tf in self._tfs for term in tf)
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def search(self, query, k=5):
+        """top-k (chunk, score) pairs, best first"""
+        terms = set(_terms(query))
+        scores = []
+        for i, tf in enumerate(self._tfs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1))
+            for term in terms & tf.keys():
+                score += self._idf[term] * tf[term] * (self.k1 + 1) / (tf[term] + norm)
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [(self.chunks[i], score) for score, i in scores[:k]]
+
+# --- embeddings --- #
+
+def hashing_embedder(dim=512):
+    """offline feature-hashing embeddings - no model, no network"""
+    import numpy as np
+
+    def embed(texts):
+        out = np.zeros((len(texts), dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in _terms(text):
+                h = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+                out[row, h % dim] += 1.0 if (h >> 63) == 0 else -1.0
+        return out
+    return embed
+
+def openai_embedder(client, model="text-embedding-3-small", batch_size=256):
+    """embeddings from the OpenAI api"""
+    import numpy as np
+
+    def embed(texts):
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            response = client.embeddings.create(model=model, input=texts[start:start + batch_size])
+            vectors.extend(item.embedding for item in response.data)
+        return np.asarray(vectors, dtype=np.float32)
+    return embed
+
+class VectorIndex:
+    """cosine-similarity index over a (memory-mapped) numpy matrix"""
+
+    def __init__(self, chunks, vectors, embed):
+        self.chunks = chunks
+        self.vectors = vectors  # unit-normalized rows, possibly a np.memmap
+        self.embed = embed
+
+    @classmethod
+    def build(cls, chunks, embed, path=None):
+        """embed chunks, and when path is given persist + reopen memory-mapped"""
+        import numpy as np
+        vectors = embed([c.text for c in chunks]) if chunks else np.zeros((0, 1), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if path is None:
+            return cls(chunks, vectors, embed)
+        cls.save(path, chunks, vectors)
+        return cls.load(path, embed)
+
+    @staticmethod
+    def save(path, chunks, vectors):
+        import numpy as np
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.npy", vectors)
+        with open(path / "chunks.jsonl", "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(asdict(chunk), ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path, embed):
+        import numpy as np
+        path = Path(path)
+        with open(path / "chunks.jsonl", encoding="utf-8") as f:
+            chunks = [Chunk(**json.loads(line)) for line in f]
+        return cls(chunks, np.load(path / "vectors.npy", mmap_mode="r"), embed)
+
+    def search(self, query, k=5):
+        """top-k (chunk, score) pairs, best first"""
+        import numpy as np
+        if not self.chunks:
+            return []
+        q = self.embed([query])[0]
+        q = q / (np.linalg.norm(q) or 1)
+        scores = self.vectors @ q
+        top = np.argsort(-scores)[:k]
+        return [(self.chunks[i], float(scores[i])) for i in top if scores[i] > 0]
+
+def format_hits(hits):
+    """chunks as prompt text, tagged with their source file"""
+    return "\n\n".join(f"[{chunk.source} #{chunk.index}]\n{chunk.text}" for chunk, _ in hits)
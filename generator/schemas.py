@@ -0,0 +1,118 @@
+"""JSON schemas for the steps whose output the UI needs as json
+
+STEP_SCHEMAS are written for structured outputs strict mode: every property
+required, no additional properties. free-form replies (assistants runs) are
+checked against PARSE_SCHEMAS, which only require the fields the app reads
+"""
+
+def _object(properties):
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+def _lenient(properties, *required):
+    """same properties, only `required` required, extra keys kept"""
+    return {"type": "object", "properties": properties, "required": list(required)}
+
+LESSON_OUTLINE = _object({
+    "title": {"type": "string"},
+    "brief": {"type": "string"},
+    "duration": {"type": "integer"},
+})
+
+SECTIONS_SCHEMA = _object({
+    "sections": {
+        "type": "array",
+        "items": _object({
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "lessons": {"type": "array", "items": LESSON_OUTLINE},
+            "estimated_time": {"type": "integer"},
+        }),
+    },
+})
+
+LESSONS_SCHEMA = _object({
+    "lessons": {
+        "type": "array",
+        "items": _object({
+            "title": {"type": "string"},
+            "duration": {"type": "integer"},
+            "brief": {"type": "string"},
+        }),
+    },
+})
+
+QUIZ_SCHEMA = _object({
+    "questions": {
+        "type": "array",
+        "items": {
+            "anyOf": [
+                _object({
+                    "type": {"type": "string", "enum": ["multi_choice"]},
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "correct": {"type": "integer"},
+                }),
+                _object({
+                    "type": {"type": "string", "enum": ["true_false"]},
+                    "statement": {"type": "string"},
+                    "correct": {"type": "boolean"},
+                    "explanation": {"type": "string"},
+                }),
+            ],
+        },
+    },
+    "meta": _object({
+        "total_questions": {"type": "integer"},
+        "estimated_minutes": {"type": "integer"},
+    }),
+})
+
+# keyed by prompts.prompt_name
+STEP_SCHEMAS = {
+    "sections": SECTIONS_SCHEMA,
+    "lessons": LESSONS_SCHEMA,
+    "quiz": QUIZ_SCHEMA,
+}
+
+LENIENT_SECTIONS_SCHEMA = _lenient({
+    "sections": {
+        "type": "array",
+        "items": _lenient({
+            **SECTIONS_SCHEMA["properties"]["sections"]["items"]["properties"],
+            "lessons": {"type": "array", "items": _lenient(LESSON_OUTLINE["properties"], "title")},
+        }, "title", "description", "estimated_time"),
+    },
+}, "sections")
+
+LENIENT_LESSONS_SCHEMA = _lenient({
+    "lessons": {
+        "type": "array",
+        "items": _lenient(LESSONS_SCHEMA["properties"]["lessons"]["items"]["properties"], "title", "duration", "brief"),
+    },
+}, "lessons")
+
+_multi_choice, _true_false = QUIZ_SCHEMA["properties"]["questions"]["items"]["anyOf"]
+
+LENIENT_QUIZ_SCHEMA = _lenient({
+    "questions": {
+        "type": "array",
+        "items": {
+            "anyOf": [
+                _lenient(_multi_choice["properties"], "type", "question", "options", "correct"),
+                _lenient(_true_false["properties"], "type", "statement", "correct"),
+            ],
+        },
+    },
+    "meta": _lenient(QUIZ_SCHEMA["properties"]["meta"]["properties"]),
+}, "questions")
+
+PARSE_SCHEMAS = {
+    "sections": LENIENT_SECTIONS_SCHEMA,
+    "lessons": LENIENT_LESSONS_SCHEMA,
+    "quiz": LENIENT_QUIZ_SCHEMA,
+}
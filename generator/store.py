@@ -0,0 +1,150 @@
+"""Durable course state - everything a course run produces, written as it happens"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# top-level course fields, each stored as json
+COURSE_FIELDS = ("stage", "user_input", "toc", "course_info", "sections", "generator")
+
+# per-item artifacts: kind -> what the key is
+#   section_lessons: section index -> generate_lessons_for_section output
+#   lesson_detail:   lesson_key(section, lesson) -> markdown
+#   quiz:            quiz_key(lesson markdown) -> generate_quiz output
+#   source:          "corpus" -> Corpus.to_dict() of the uploads' extracted text
+ARTIFACT_KINDS = ("section_lessons", "lesson_detail", "quiz", "source")
+
+def lesson_key(section_title, lesson_title):
+    """same suffix app.py uses for its lesson_detail_* session keys"""
+    return f"{section_title}_{lesson_title}"
+
+def quiz_key(detail):
+    """stable across processes, unlike hash()"""
+    return "quiz_" + hashlib.sha1(detail.encode("utf-8")).hexdigest()[:12]
+
+class CourseStore:
+    """persistence interface, SQLiteCourseStore is the default implementation"""
+
+    def create_course(self, user_input, course_id=None) -> str:
+        raise NotImplementedError
+
+    def update_course(self, course_id, **fields):
+        raise NotImplementedError
+
+    def put(self, course_id, kind, key, value):
+        raise NotImplementedError
+
+    def load_course(self, course_id):
+        """{"id", "created", "updated", <COURSE_FIELDS>, "artifacts": {kind: {key: value}}} or None"""
+        raise NotImplementedError
+
+    def list_courses(self, limit=20):
+        """newest first, [{"id", "stage", "category", "updated"}]"""
+        raise NotImplementedError
+
+    def delete_course(self, course_id):
+        raise NotImplementedError
+
+class SQLiteCourseStore(CourseStore):
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS courses (
+                    id TEXT PRIMARY KEY,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    {", ".join(f"{field} TEXT" for field in COURSE_FIELDS)}
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS artifacts (
+                    course_id TEXT NOT NULL REFERENCES courses (id) ON DELETE CASCADE,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (course_id, kind, key)
+                )"""
+            )
+
+    def create_course(self, user_input, course_id=None):
+        course_id = course_id or uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO courses (id, created, updated, stage, user_input) VALUES (?, ?, ?, ?, ?)",
+                (course_id, now, now, json.dumps("input"), json.dumps(user_input, ensure_ascii=False)),
+            )
+        return course_id
+
+    def update_course(self, course_id, **fields):
+        unknown = set(fields) - set(COURSE_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown course fields: {sorted(unknown)}")
+        if not fields:
+            return
+        columns = ", ".join(f"{field} = ?" for field in fields)
+        values = [json.dumps(value, ensure_ascii=False) for value in fields.values()]
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE courses SET {columns}, updated = ? WHERE id = ?",
+                (*values, time.time(), course_id),
+            )
+
+    def put(self, course_id, kind, key, value):
+        if kind not in ARTIFACT_KINDS:
+            raise ValueError(f"unknown artifact kind: {kind}")
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (course_id, kind, str(key), json.dumps(value, ensure_ascii=False), now),
+            )
+            self._conn.execute("UPDATE courses SET updated = ? WHERE id = ?", (now, course_id))
+
+    def load_course(self, course_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT id, created, updated, {', '.join(COURSE_FIELDS)} FROM courses WHERE id = ?",
+                (course_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            artifacts = self._conn.execute(
+                "SELECT kind, key, value FROM artifacts WHERE course_id = ?", (course_id,)
+            ).fetchall()
+
+        course = {"id": row[0], "created": row[1], "updated": row[2]}
+        for field, value in zip(COURSE_FIELDS, row[3:]):
+            course[field] = json.loads(value) if value is not None else None
+        course["artifacts"] = {kind: {} for kind in ARTIFACT_KINDS}
+        for kind, key, value in artifacts:
+            course["artifacts"][kind][key] = json.loads(value)
+        return course
+
+    def list_courses(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, stage, user_input, updated FROM courses ORDER BY updated DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {
+                "id": course_id,
+                "stage": json.loads(stage) if stage else None,
+                "category": (json.loads(user_input) or {}).get("category") if user_input else None,
+                "updated": updated,
+            }
+            for course_id, stage, user_input, updated in rows
+        ]
+
+    def delete_course(self, course_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM artifacts WHERE course_id = ?", (course_id,))
+            self._conn.execute("DELETE FROM courses WHERE id = ?", (course_id,))
@@ -0,0 +1,165 @@
+"""Performance dashboard - step latency, polling, cache and token telemetry
+
+everything here comes from local data: the span log utils.tracing writes
+(shared with CLI/batch runs on this machine) plus this server process's
+in-memory histograms and background jobs. no network access needed
+"""
+
+import time
+import streamlit as st
+from utils import tracing
+from utils.metrics import latency
+from generator.jobs import active_jobs
+
+st.set_page_config(
+    page_title="Performance · Course Generator",
+    page_icon="📈",
+    layout="wide"
+)
+
+WINDOWS = {"last 15 minutes": 15 * 60, "last hour": 3600, "last 24 hours": 24 * 3600, "everything": None}
+
+@st.cache_resource
+def get_span_log():
+    """one tail reader per server process, every session shares it"""
+    return tracing.SpanLog()
+
+def load_spans():
+    """finished spans, from the log file when tracing writes one"""
+    if tracing.tracer.exporters:
+        return get_span_log().refresh()
+    # COURSE_GENERATOR_TRACE=0 - only what this process kept in memory
+    return list(tracing.tracer.recent)
+
+def in_window(spans, seconds):
+    if seconds is None:
+        return spans
+    cutoff = time.time_ns() - int(seconds * 1e9)
+    return [s for s in spans if s["start"] >= cutoff]
+
+def _seconds(value):
+    return None if value is None else round(value, 2)
+
+def show_summary(spans, stages, active):
+    steps = sum(stage["count"] for stage in stages.values())
+    hits = sum(stage["cache_hits"] for stage in stages.values())
+    tokens = sum(stage["input_tokens"] + stage["output_tokens"] for stage in stages.values())
+    spend = sum(report["total"]["cost"] for report in tracing.course_report(spans).values())
+
+    cols = st.columns(5)
+    cols[0].metric("active generations", len(active))
+    cols[1].metric("steps", steps)
+    cols[2].metric("cache hit rate", f"{hits / steps:.0%}" if steps else "–")
+    cols[3].metric("tokens", f"{tokens:,}")
+    cols[4].metric("spend", f"${spend:.4f}")
+
+def show_latency(stages):
+    st.subheader("⏱️ latency per prompt type")
+    if not stages:
+        st.caption("no steps in this window yet")
+        return
+    rows = []
+    for name, stage in sorted(stages.items(), key=lambda kv: -(kv[1]["p95"] or 0)):
+        runs = stage["count"] - stage["cache_hits"]
+        rows.append({
+            "prompt": name,
+            "steps": stage["count"],
+            "p50 s": _seconds(stage["p50"]),
+            "p95 s": _seconds(stage["p95"]),
+            "p99 s": _seconds(stage["p99"]),
+            # bucketed, this process only
+            "ttft p50 s": _seconds(latency.percentile(name, "ttft", 50)),
+            "cache hit %": round(100 * stage["cache_hit_rate"], 1),
+            "polls / run": round(stage["polls"] / runs, 1) if runs else None,
+            "poll overhead %": round(100 * stage["poll_overhead"], 1),
+            "errors": stage["errors"],
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    st.bar_chart({
+        f"p{q}": {name: stage[f"p{q}"] or 0 for name, stage in stages.items()}
+        for q in (50, 95, 99)
+    }, stack=False)
+    st.caption("cache hits are excluded from the percentiles. poll overhead is the share of "
+               "step time spent inside runs.retrieve requests - streamed runs don't poll")
+
+def show_courses(spans):
+    st.subheader("🪙 tokens per course")
+    courses = tracing.course_report(spans)
+    rows = [{
+        "course": course,
+        "steps": report["total"]["count"],
+        "input tokens": report["total"]["input_tokens"],
+        "output tokens": report["total"]["output_tokens"],
+        "cost $": round(report["total"]["cost"], 4),
+        "step time s": round(report["total"]["seconds"], 1),
+        "retries": report["total"]["retries"],
+    } for course, report in courses.items() if report["total"]["count"]]
+    if not rows:
+        st.caption("no courses in this window yet")
+        return
+    rows.sort(key=lambda row: -row["input tokens"] - row["output tokens"])
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+def show_reruns(spans):
+    st.subheader("🖱️ script runs per interaction")
+    runs = tracing.rerun_report(spans)
+    if not runs:
+        st.caption("no app runs in this window yet")
+        return
+    st.dataframe([{
+        "scope": scope,
+        "stage": stage,
+        "runs": stats["count"],
+        "p50 s": _seconds(stats["p50"]),
+        "p95 s": _seconds(stats["p95"]),
+        "p99 s": _seconds(stats["p99"]),
+        "max s": _seconds(stats["max"]),
+    } for (scope, stage), stats in sorted(runs.items(), key=lambda kv: -kv[1]["p95"])],
+        hide_index=True, use_container_width=True)
+    st.caption("scope app is a full rerun, anything else is a single fragment rerunning on its own. "
+               "runs that generate content include the api time")
+
+def show_active(active):
+    st.subheader("🔄 active generations")
+    if not active:
+        st.caption("nothing generating in this server process right now")
+    else:
+        st.dataframe([{
+            "prompt": span.attributes.get("prompt", "custom"),
+            "course": span.attributes.get("course_id"),
+            "running s": round(span.duration, 1),
+            "polls": span.attributes.get("polls", 0),
+        } for span in sorted(active, key=lambda span: span.start)], hide_index=True, use_container_width=True)
+
+    for job in active_jobs():
+        progress = job.progress()
+        st.progress(progress["done"] / max(1, progress["total"]),
+                    text=f"🏭 job {progress['job_id']}: {progress['done']}/{progress['total']} items")
+
+with st.sidebar:
+    st.header("📈 Performance")
+    window = st.selectbox("Window", options=list(WINDOWS), index=1, key="perf_window")
+    interval = st.selectbox("Refresh every", options=[2, 5, 15, 0], index=0, key="perf_interval",
+                            format_func=lambda s: f"{s}s" if s else "paused")
+    if tracing.tracer.exporters:
+        st.caption(f"span log: {tracing.spans_path()}")
+    else:
+        st.caption("tracing to file is off (COURSE_GENERATOR_TRACE=0), showing this process only")
+
+@st.fragment(run_every=interval or None)
+def dashboard():
+    spans = in_window(load_spans(), WINDOWS[window])
+    stages = tracing.stage_latency(spans)
+    active = tracing.tracer.active_spans("step")
+
+    show_summary(spans, stages, active)
+    show_latency(stages)
+    left, right = st.columns(2)
+    with left:
+        show_courses(spans)
+    with right:
+        show_active(active)
+    show_reruns(spans)
+
+st.title("📈 Performance")
+dashboard()
@@ -0,0 +1,300 @@
+"""Record/replay of OpenAI traffic at the httpx transport level
+
+    client = cassette_client("courses.jsonl.gz", mode="record", api_key=...)   # real api, saved
+    client = cassette_client("courses.jsonl.gz", mode="replay")                # offline, original timing
+    client = cassette_client("courses.jsonl.gz", mode="replay", latency="zero")
+
+a cassette is gzipped jsonl, one line per request/response pair, appended as
+each response finishes so a crashed recording is still usable. streamed
+responses keep every chunk with its offset, so SSE runs replay token by token.
+
+replay matches on method + path + query + the canonical json body. requests
+that repeat exactly - polling runs.retrieve - are served in recorded order,
+which replays the run's status sequence (queued, in_progress, ..., completed);
+once a sequence runs out its last response keeps being served, so code that
+polls less often still converges. requests without a json body (multipart
+uploads) match on method + path alone, as does anything with no exact match -
+but a streamed request only ever loosely matches a streamed recording and a
+plain one a plain recording. every recording is served from one queue or the
+other, never both.
+
+replay against a fresh COURSE_GENERATOR_HOME - a warm assistant registry or
+response cache takes different (or no) requests than the recording did
+"""
+
+import asyncio
+import codecs
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+MODES = ("record", "replay")
+LATENCIES = ("original", "zero")
+# response headers worth keeping - the rest is per-request noise
+KEEP_HEADERS = ("content-type", "retry-after", "retry-after-ms", "openai-processing-ms")
+
+def request_key(request):
+    """match key for a request - see module docstring"""
+    query = "&".join(sorted(str(request.url.query, "ascii").split("&"))) if request.url.query else ""
+    key = f"{request.method} {request.url.path}?{query}"
+    body = _json_body(request)
+    if body is not None:
+        key += " " + hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return key
+
+def _json_body(request):
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        return None
+    try:
+        return json.loads(request.content or b"null")
+    except ValueError:
+        return None
+
+class Cassette:
+    """the interactions of one cassette file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._queues = None
+        self.served = defaultdict(int)  # "METHOD /path" -> replayed responses
+
+    def append(self, entry):
+        with self._lock:
+            # one gzip member per entry, readers see a single stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def entries(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def next_for(self, request):
+        """recorded entry for request, None if the cassette never saw it"""
+        with self._lock:
+            if self._queues is None:
+                self._queues = defaultdict(deque)
+                for entry in self.entries():
+                    self._queues[entry["key"]].append(entry)
+                    loose = _loose(entry["key"], entry.get("request"))
+                    if loose != entry["key"]:  # bodiless requests: already the same queue
+                        self._queues[loose].append(entry)
+            exact = request_key(request)
+            loose = _loose(exact, _json_body(request))
+            self.served[_loose(exact)] += 1
+            for key, other in ((exact, loose), (loose, None)):
+                queue = self._queues.get(key)
+                if not queue:
+                    continue
+                # keep the last one around for repeated polls
+                entry = queue.popleft() if len(queue) > 1 else queue[0]
+                # ...but only in the queue that served it
+                other = self._queues.get(other or entry["key"])
+                if other is not None and other is not queue and entry in other:
+                    other.remove(entry)
+                return entry
+            return None
+
+def _loose(key, body=None):
+    """METHOD /path?query, plus a stream marker for streamed requests"""
+    loose = key.split(" ")[0] + " " + key.split(" ")[1]
+    if isinstance(body, dict) and body.get("stream"):
+        loose += " stream"
+    return loose
+
+def _entry(request, response, headers_at, chunks):
+    """cassette line for one finished exchange"""
+    return {
+        "key": request_key(request),
+        "method": request.method,
+        "path": request.url.path,
+        "request": _json_body(request),
+        "status": response.status_code,
+        "headers": {k: v for k, v in response.headers.items() if k.lower() in KEEP_HEADERS},
+        "headers_at": round(headers_at, 4),
+        "chunks": chunks,
+        "recorded_at": time.time(),
+    }
+
+# --- recording --- #
+
+class _TeeStream(httpx.SyncByteStream):
+    def __init__(self, stream, on_done, started):
+        self._stream, self._on_done, self._started = stream, on_done, started
+        self._chunks = []
+        # chunks can split a multi-byte character
+        self._decode = codecs.getincrementaldecoder("utf-8")("replace").decode
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._chunks.append([round(time.monotonic() - self._started, 4), self._decode(chunk)])
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+        self._on_done(self._chunks)
+
+class _AsyncTeeStream(httpx.AsyncByteStream):
+    def __init__(self, stream, on_done, started):
+        self._stream, self._on_done, self._started = stream, on_done, started
+        self._chunks = []
+        # chunks can split a multi-byte character
+        self._decode = codecs.getincrementaldecoder("utf-8")("replace").decode
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._chunks.append([round(time.monotonic() - self._started, 4), self._decode(chunk)])
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+        self._on_done(self._chunks)
+
+class RecordingTransport(httpx.BaseTransport):
+    """forwards to the real transport and appends every exchange to the cassette"""
+
+    def __init__(self, cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        # plain bodies keep the cassette readable and replay free of decoding
+        request.headers["accept-encoding"] = "identity"
+        request.read()
+        started = time.monotonic()
+        response = self.inner.handle_request(request)
+        headers_at = time.monotonic() - started
+
+        def done(chunks):
+            self.cassette.append(_entry(request, response, headers_at, chunks))
+
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_TeeStream(response.stream, done, started), extensions=response.extensions)
+
+    def close(self):
+        self.inner.close()
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        request.headers["accept-encoding"] = "identity"
+        await request.aread()
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        headers_at = time.monotonic() - started
+
+        def done(chunks):
+            self.cassette.append(_entry(request, response, headers_at, chunks))
+
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncTeeStream(response.stream, done, started), extensions=response.extensions)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+# --- replay --- #
+
+def _miss(request):
+    body = json.dumps({"error": {"message": f"not in cassette: {request_key(request)}",
+                                 "type": "cassette_miss", "code": None}})
+    return httpx.Response(404, headers={"content-type": "application/json"}, content=body.encode("utf-8"))
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, entry, latency):
+        self.entry, self.latency = entry, latency
+
+    def __iter__(self):
+        last = self.entry["headers_at"]
+        for offset, text in self.entry["chunks"]:
+            if self.latency == "original" and offset > last:
+                time.sleep(offset - last)
+            last = offset
+            yield text.encode("utf-8")
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, entry, latency):
+        self.entry, self.latency = entry, latency
+
+    async def __aiter__(self):
+        last = self.entry["headers_at"]
+        for offset, text in self.entry["chunks"]:
+            if self.latency == "original" and offset > last:
+                await asyncio.sleep(offset - last)
+            last = offset
+            yield text.encode("utf-8")
+
+def _replayed(entry, stream):
+    return httpx.Response(entry["status"], headers=entry["headers"], stream=stream)
+
+class ReplayTransport(httpx.BaseTransport):
+    """serves a cassette back, with the recorded timing or none at all"""
+
+    def __init__(self, cassette, latency="original"):
+        if latency not in LATENCIES:
+            raise ValueError(f"latency must be one of {LATENCIES}")
+        self.cassette = cassette
+        self.latency = latency
+
+    def handle_request(self, request):
+        request.read()
+        entry = self.cassette.next_for(request)
+        if entry is None:
+            return _miss(request)
+        if self.latency == "original":
+            time.sleep(entry["headers_at"])
+        return _replayed(entry, _ReplayStream(entry, self.latency))
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette, latency="original"):
+        if latency not in LATENCIES:
+            raise ValueError(f"latency must be one of {LATENCIES}")
+        self.cassette = cassette
+        self.latency = latency
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        entry = self.cassette.next_for(request)
+        if entry is None:
+            return _miss(request)
+        if self.latency == "original":
+            await asyncio.sleep(entry["headers_at"])
+        return _replayed(entry, _AsyncReplayStream(entry, self.latency))
+
+# --- clients --- #
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+def open_cassette(path):
+    """one Cassette per path so sync and async clients share replay queues"""
+    with _cassettes_lock:
+        return _cassettes.setdefault(str(path), Cassette(str(path)))
+
+def cassette_client(path, mode="replay", latency="original", asynchronous=False, **kwargs):
+    """OpenAI (or AsyncOpenAI) client recording to / replaying from path"""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    cassette = open_cassette(path)
+    if asynchronous:
+        transport = AsyncRecordingTransport(cassette) if mode == "record" else AsyncReplayTransport(cassette, latency)
+        http_client = httpx.AsyncClient(transport=transport)
+        client_class = AsyncOpenAI
+    else:
+        transport = RecordingTransport(cassette) if mode == "record" else ReplayTransport(cassette, latency)
+        http_client = httpx.Client(transport=transport)
+        client_class = OpenAI
+    if mode == "replay":
+        kwargs.setdefault("api_key", "replay")
+    return client_class(http_client=http_client, **kwargs)
@@ -0,0 +1,115 @@
+"""Multi-file content ingestion with per-file provenance"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import List
+from utils.pdf_extract import extract_pdf_text, file_buffer, MemoryViewReader
+
+# far enough in to catch a ToC behind front matter
+PREVIEW_PAGES = 20
+
+def estimate_tokens(text: str) -> int:
+    """cheap ~4 chars/token estimate"""
+    return (len(text) + 3) // 4
+
+@dataclass
+class Document:
+    name: str
+    kind: str  # pdf / docx / txt / md
+    text: str
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.text)
+
+@dataclass
+class Corpus:
+    """every uploaded file's text, in upload order, tagged with where it came from"""
+    documents: List[Document] = field(default_factory=list)
+
+    @property
+    def text(self):
+        return "\n\n".join(self._section(doc.name, doc.text) for doc in self.documents)
+
+    @property
+    def tokens(self):
+        return sum(doc.tokens for doc in self.documents)
+
+    def preview(self, token_budget):
+        """merged text bounded to ~token_budget tokens
+
+        the budget is split evenly, and whatever short files don't use is
+        handed on to the longer ones, so every file gets a say
+        """
+        docs = sorted(self.documents, key=lambda d: d.tokens)
+        remaining = token_budget
+        shares = {}
+        for i, doc in enumerate(docs):
+            share = remaining // (len(docs) - i)
+            shares[doc.name] = min(doc.tokens, share)
+            remaining -= shares[doc.name]
+
+        return "\n\n".join(
+            self._section(doc.name, doc.text[:shares[doc.name] * 4])
+            for doc in self.documents
+            if shares[doc.name] > 0
+        )
+
+    def fingerprint(self):
+        """sha256 over every document's text"""
+        return hashlib.sha256("\0".join(doc.text for doc in self.documents).encode("utf-8")).hexdigest()
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([Document(**doc) for doc in data["documents"]])
+
+    @staticmethod
+    def _section(name, text):
+        return f"=== {name} ===\n{text.strip()}"
+
+def extract_document(file, pdf_pages=PREVIEW_PAGES) -> Document:
+    """text of one uploaded file, raises on unreadable files"""
+    kind = file.name.rsplit(".", 1)[-1].lower() if "." in file.name else "txt"
+    if kind == "pdf":
+        text = extract_pdf_text(file_buffer(file), stop=pdf_pages)
+    elif kind == "docx":
+        text = _docx_text(file)
+    else:
+        text = file.getvalue().decode("utf-8", errors="ignore")
+    return Document(file.name, kind, text)
+
+def _docx_text(file):
+    import docx  # python-docx
+    document = docx.Document(MemoryViewReader(file_buffer(file)))
+    parts = [p.text for p in document.paragraphs if p.text.strip()]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append(" | ".join(cell.text.strip() for cell in row.cells))
+    return "\n".join(parts)
+
+def build_corpus(uploaded_files, max_workers=4, on_error=print, pdf_pages=PREVIEW_PAGES) -> Corpus:
+    """extract every file concurrently, keeping upload order
+
+    errors are reported through on_error on the calling thread and the
+    file is skipped
+    """
+    def extract(file):
+        try:
+            return extract_document(file, pdf_pages), None
+        except Exception as e:
+            return None, f"💥 couldn't read {file.name}: {str(e)}"
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(uploaded_files)))) as pool:
+        results = list(pool.map(extract, uploaded_files))
+
+    documents = []
+    for doc, error in results:
+        if error:
+            on_error(error)
+        elif doc.text.strip():
+            documents.append(doc)
+    return Corpus(documents)
@@ -1,76 +1,101 @@
 """File processing utilities for handling uploads and vector stores"""
 
 from pathlib import Path
-import tempfile
-from openai import OpenAI
 import time
-import PyPDF2
-from io import BytesIO
-import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openai import OpenAI
+from utils.pdf_extract import extract_pdf_text, file_buffer
+from utils.corpus import build_corpus, PREVIEW_PAGES
+from utils.polling import DEFAULT_POLICY, PollFailed, poll
+from utils.resilience import resilient
+
+class LocalFile:
+    """file on disk that quacks like a streamlit UploadedFile (name + getvalue)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.name
+
+    def getvalue(self) -> bytes:
+        return self.path.read_bytes()
+
+def process_uploaded_file(client: OpenAI, uploaded_files, max_workers=8, on_progress=None):
+    """handle file uploads for vector store
+
+    on_progress(done, total, name, seconds) fires on the calling thread as
+    each upload lands, so it's safe to touch streamlit from it
+    """
+    client = resilient(client)
+    file_ids = upload_files(client, uploaded_files, max_workers, on_progress)
+    return create_vector_store(client, file_ids)
 
-def process_uploaded_file(client: OpenAI, uploaded_files):
-    """handle file uploads for vector store"""
+def create_vector_store(client: OpenAI, file_ids):
+    """new vector store indexing already-uploaded files"""
+    client = resilient(client)
     vector_store = client.beta.vector_stores.create(name="Dynamic Vector Store")
-    file_ids = []
-
-    for file in uploaded_files:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.name.split('.')[-1]}") as tmp_file:
-            tmp_file.write(file.getvalue())
-            file_path = tmp_file.name
-
-        try:
-            with open(file_path, 'rb') as file_data:
-                uploaded_file = client.files.create(file=file_data, purpose="assistants")
-                file_ids.append(uploaded_file.id)
-        finally:
-            Path(file_path).unlink(missing_ok=True)
-
-    client.beta.vector_stores.file_batches.create_and_poll(vector_store_id=vector_store.id, file_ids=file_ids)
-    ensure_vector_store_ready(client, vector_store.id)
+
+    # create_and_poll already waits for indexing, no need to poll the store again
+    batch = client.beta.vector_stores.file_batches.create_and_poll(vector_store_id=vector_store.id, file_ids=file_ids)
+    if batch.status != "completed":
+        cleanup_vector_store(client, vector_store.id)
+        raise Exception(f"Vector store ingestion failed: {batch.status} ({batch.file_counts})")
     return vector_store.id
 
-def ensure_vector_store_ready(client: OpenAI, vector_store_id):
+def upload_files(client: OpenAI, uploaded_files, max_workers=8, on_progress=None):
+    """upload files concurrently straight from memory, returns ids in input order"""
+    client = resilient(client)
+    def upload(file):
+        started = time.monotonic()
+        # (name, bytes) tuple - no temp file round trip
+        uploaded = client.files.create(file=(file.name, file.getvalue()), purpose="assistants")
+        return uploaded.id, time.monotonic() - started
+
+    file_ids = [None] * len(uploaded_files)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(uploaded_files)))) as pool:
+        futures = {pool.submit(upload, file): i for i, file in enumerate(uploaded_files)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            file_ids[i], seconds = future.result()
+            if on_progress:
+                on_progress(done, len(uploaded_files), uploaded_files[i].name, seconds)
+    return file_ids
+
+def ensure_vector_store_ready(client: OpenAI, vector_store_id, policy=DEFAULT_POLICY):
     """wait for vector store to be ready"""
-    while True:
-        vector_store = client.beta.vector_stores.retrieve(vector_store_id)
-        if vector_store.status == "completed":
-            return
-        elif vector_store.status in ["failed", "expired"]:
-            raise Exception(f"Vector store failed: {vector_store.status}")
-        time.sleep(1)
+    client = resilient(client)
+    try:
+        poll(
+            lambda: client.beta.vector_stores.retrieve(vector_store_id),
+            is_done=lambda vs: vs.status == "completed",
+            is_failed=lambda vs: vs.status in ["failed", "expired"],
+            policy=policy
+        )
+    except PollFailed as e:
+        raise Exception(f"Vector store failed: {e.obj.status}")
 
 def cleanup_vector_store(client: OpenAI, vector_store_id):
     """cleanup after ourselves"""
+    client = resilient(client)
     try:
         client.beta.vector_stores.delete(vector_store_id)
     except Exception as e:
         print(f"Failed to delete vector store: {e}")
 
-def extract_text_from_pdf(file, pages=5) -> str:
-    """extract text from first few pages of pdf"""
+def extract_text_from_pdf(file, pages=PREVIEW_PAGES, on_error=print) -> str:
+    """extract text from the first `pages` pages of a pdf (None = whole thing)"""
     try:
-        pdf_bytes = BytesIO(file.getvalue())
-        pdf_reader = PyPDF2.PdfReader(pdf_bytes)
-
-        content = ""
-        for i in range(min(pages, len(pdf_reader.pages))):
-            content += pdf_reader.pages[i].extract_text() + "\n"
-
-        return content
+        return extract_pdf_text(file_buffer(file), stop=pages) + "\n"
 
     except Exception as e:
-        st.error(f"💥 pdf error: {str(e)}")
+        on_error(f"💥 pdf error: {str(e)}")
         return ""
 
-def process_files_for_content(uploaded_files):
-    """extract content from uploaded files"""
-    for file in uploaded_files:
-        if file.name.lower().endswith('.pdf'):
-            content = extract_text_from_pdf(file)
-        else:
-            content = file.getvalue().decode('utf-8', errors='ignore')
-
-        if content:
-            return {"content": content}
+def process_files_for_content(uploaded_files, on_error=print, pdf_pages=PREVIEW_PAGES):
+    """extract content from every uploaded file
 
-    return None
+    returns {"content": merged text, "corpus": Corpus} or None if nothing was readable
+    """
+    corpus = build_corpus(uploaded_files, on_error=on_error, pdf_pages=pdf_pages)
+    if not corpus.documents:
+        return None
+    return {"content": corpus.text, "corpus": corpus}
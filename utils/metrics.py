@@ -0,0 +1,69 @@
+"""In-process latency histograms for generation steps"""
+
+import bisect
+import threading
+
+# seconds - roughly doubling, generation steps range from ~1s to a few minutes
+DEFAULT_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, float("inf"))
+
+class LatencyHistogram:
+    """bucketed latencies keyed by (name, metric)
+
+    we use name = prompt type ("toc", "lesson_detail", ...) and
+    metric = "ttft" (time to first token) or "total" (time to complete)
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, metric, seconds):
+        with self._lock:
+            series = self._series.setdefault((name, metric), {
+                "counts": [0] * len(self.buckets),
+                "count": 0,
+                "sum": 0.0,
+                "min": seconds,
+                "max": seconds,
+            })
+            series["counts"][bisect.bisect_left(self.buckets, seconds)] += 1
+            series["count"] += 1
+            series["sum"] += seconds
+            series["min"] = min(series["min"], seconds)
+            series["max"] = max(series["max"], seconds)
+
+    def percentile(self, name, metric, q):
+        """bucket upper bound containing the q-th percentile (0-100)"""
+        with self._lock:
+            series = self._series.get((name, metric))
+            if not series:
+                return None
+            target = series["count"] * q / 100
+            seen = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                seen += count
+                if seen >= target:
+                    return min(bound, series["max"])
+            return series["max"]
+
+    def snapshot(self):
+        """plain-dict view, nested {name: {metric: stats}}"""
+        with self._lock:
+            out = {}
+            for (name, metric), series in self._series.items():
+                out.setdefault(name, {})[metric] = {
+                    "count": series["count"],
+                    "mean": series["sum"] / series["count"],
+                    "min": series["min"],
+                    "max": series["max"],
+                    "buckets": dict(zip(self.buckets, series["counts"])),
+                }
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+# shared across generators in this process
+latency = LatencyHistogram()
@@ -0,0 +1,10 @@
+"""Where local state lives (caches, manifests, stores)"""
+
+import os
+from pathlib import Path
+
+def data_dir(*parts) -> Path:
+    """path under $COURSE_GENERATOR_HOME (default ~/.course_generator)"""
+    base = Path(os.environ.get("COURSE_GENERATOR_HOME", Path.home() / ".course_generator"))
+    base.mkdir(parents=True, exist_ok=True)
+    return base.joinpath(*parts)
@@ -0,0 +1,133 @@
+"""Lazy, page-parallel PDF text extraction"""
+
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import PyPDF2
+
+# below this many pages a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 32
+# ~500k tokens - beyond this nothing downstream can use the text anyway
+DEFAULT_MAX_CHARS = 2_000_000
+
+class MemoryViewReader(io.RawIOBase):
+    """seekable read-only stream over a buffer without copying it"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+def file_buffer(file):
+    """zero-copy view of an upload when it's BytesIO-backed (streamlit's is)"""
+    if hasattr(file, "getbuffer"):
+        return file.getbuffer()
+    return memoryview(file.getvalue())
+
+def iter_pdf_pages(buffer, start=0, stop=None, workers=None, chunk_pages=8, max_chars=DEFAULT_MAX_CHARS):
+    """yield page texts in order, lazily
+
+    buffer is anything supporting the buffer protocol (bytes, memoryview),
+    [start, stop) is the page window, stop=None means the whole document.
+    stops early once max_chars of text has been produced so a 600-page
+    book can't blow up memory
+    """
+    reader = PyPDF2.PdfReader(MemoryViewReader(buffer))
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or stop - start < PARALLEL_MIN_PAGES:
+        pages = (reader.pages[i].extract_text() or "" for i in range(start, stop))
+    else:
+        pages = _parallel_pages(buffer, start, stop, workers, chunk_pages)
+
+    produced = 0
+    for text in pages:
+        if max_chars is not None and produced + len(text) > max_chars:
+            yield text[:max_chars - produced]
+            return
+        produced += len(text)
+        yield text
+
+def extract_pdf_text(buffer, start=0, stop=None, **kwargs) -> str:
+    """whole page window as one string"""
+    return "\n".join(iter_pdf_pages(buffer, start, stop, **kwargs))
+
+# --- process pool plumbing --- #
+
+_worker_reader = None
+_worker_memory = None
+
+def _init_worker(name, size):
+    # each worker maps the shared copy and parses the document once for every chunk
+    global _worker_reader, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_reader = PyPDF2.PdfReader(MemoryViewReader(_worker_memory.buf[:size]))
+
+def _extract_range(first, last):
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(first, last)]
+
+def _parallel_pages(buffer, start, stop, workers, chunk_pages):
+    """fan page chunks across processes, yielding in order with bounded lookahead
+
+    workers are spawned, not forked - we're called from worker threads inside
+    the streamlit server and forking a multithreaded process can deadlock. the
+    document goes to them through one shared memory block instead of being
+    pickled into every worker
+    """
+    view = memoryview(buffer).cast("B")
+    memory = shared_memory.SharedMemory(create=True, size=max(1, len(view)))
+    try:
+        memory.buf[:len(view)] = view
+        yield from _pool_pages(memory.name, len(view), start, stop, workers, chunk_pages)
+    finally:
+        memory.close()
+        memory.unlink()
+
+def _pool_pages(name, size, start, stop, workers, chunk_pages):
+    ranges = iter([(i, min(i + chunk_pages, stop)) for i in range(start, stop, chunk_pages)])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(name, size)) as pool:
+        # keep only ~2 chunks per worker in flight so memory stays flat
+        pending = deque()
+        for first, last in ranges:
+            pending.append(pool.submit(_extract_range, first, last))
+            if len(pending) >= workers * 2:
+                break
+        try:
+            while pending:
+                yield from pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append(pool.submit(_extract_range, *next_range))
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,81 @@
+"""Adaptive polling for long-running API objects (runs, vector stores)"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+class PollTimeout(TimeoutError):
+    """gave up waiting - deadline or max polls hit"""
+
+class PollFailed(Exception):
+    """the polled object reached a failure state"""
+    def __init__(self, obj):
+        super().__init__(f"{type(obj).__name__} ended as {getattr(obj, 'status', obj)}")
+        self.obj = obj
+
+@dataclass
+class BackoffPolicy:
+    """exponential backoff with jitter, capped by a deadline and poll count
+
+    starts fast so short runs return quickly, then backs off so long runs
+    don't burn request quota
+    """
+    initial: float = 0.25
+    maximum: float = 4.0
+    multiplier: float = 1.6
+    jitter: float = 0.2  # +/- fraction of each delay
+    deadline: Optional[float] = 600.0  # seconds, None = forever
+    max_polls: Optional[int] = None
+
+    def delays(self):
+        """yield sleep durations until the budget runs out"""
+        started = time.monotonic()
+        delay = self.initial
+        polls = 0
+        while True:
+            polls += 1
+            if self.max_polls is not None and polls >= self.max_polls:
+                raise PollTimeout(f"gave up after {polls} polls")
+
+            sleep = delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            if self.deadline is not None:
+                remaining = self.deadline - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise PollTimeout(f"gave up after {self.deadline:.0f}s")
+                sleep = min(sleep, remaining)
+
+            yield sleep
+            delay = min(delay * self.multiplier, self.maximum)
+
+DEFAULT_POLICY = BackoffPolicy()
+
+def poll(fetch, is_done, is_failed=lambda obj: False, policy=DEFAULT_POLICY):
+    """call fetch() until is_done(obj); returns (obj, polls)
+
+    raises whatever is_failed signals as an Exception carrying the object
+    """
+    delays = policy.delays()
+    polls = 0
+    while True:
+        obj = fetch()
+        polls += 1
+        if is_done(obj):
+            return obj, polls
+        if is_failed(obj):
+            raise PollFailed(obj)
+        time.sleep(next(delays))
+
+async def apoll(fetch, is_done, is_failed=lambda obj: False, policy=DEFAULT_POLICY):
+    """async twin of poll - fetch returns an awaitable"""
+    delays = policy.delays()
+    polls = 0
+    while True:
+        obj = await fetch()
+        polls += 1
+        if is_done(obj):
+            return obj, polls
+        if is_failed(obj):
+            raise PollFailed(obj)
+        await asyncio.sleep(next(delays))
@@ -0,0 +1,290 @@
+"""Retry, rate limiting and circuit breaking for OpenAI calls
+
+wrap a client once with resilient() and every resource method on it goes
+through the same Resilience: a token bucket shared by every generation in the
+process, retries with backoff that honor Retry-After, and a circuit breaker
+that stops hammering the api while it's down
+"""
+
+import asyncio
+import hashlib
+import inspect
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import openai
+
+from utils import tracing
+
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+# run.last_error codes worth another run, anything else is the prompt's fault
+RETRY_RUN_ERRORS = frozenset({"rate_limit_exceeded", "server_error"})
+
+class CircuitOpen(Exception):
+    """the api has been failing, calls are short-circuited until the cooldown ends"""
+
+class RunFailed(Exception):
+    """an assistants run ended in a failure state"""
+
+    def __init__(self, run):
+        super().__init__(f"run failed: {getattr(run, 'last_error', None) or getattr(run, 'status', run)}")
+        self.run = run
+
+@dataclass
+class RetryPolicy:
+    """exponential backoff between attempts, Retry-After wins when the api sends one"""
+    attempts: int = 5
+    initial: float = 1.0
+    maximum: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.2
+    deadline: Optional[float] = 180.0  # total seconds spent waiting, None = no cap
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.maximum)
+        delay = min(self.initial * self.multiplier ** attempt, self.maximum)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+def retry_after(exc) -> Optional[float]:
+    """seconds the server asked us to wait, if it said"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # http-date form, fall back to our own backoff
+    return None
+
+def is_retryable(exc) -> bool:
+    """transient failures only - a 400 won't fix itself"""
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, RunFailed):
+        run = exc.run
+        if getattr(run, "status", None) == "expired":
+            return True
+        return getattr(getattr(run, "last_error", None), "code", None) in RETRY_RUN_ERRORS
+    return getattr(exc, "status_code", None) in RETRY_STATUSES
+
+class TokenBucket:
+    """requests-per-second limiter, safe across threads and event loops"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0  # total seconds callers were held back, across threads
+
+    def _reserve(self, tokens):
+        """take tokens now (possibly going negative), returns how long to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            self.waited += wait
+            return wait
+
+    def acquire(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """opens after failure_threshold consecutive transient failures
+
+    while open, callers wait out the cooldown (or give up); the first call
+    after it is a probe - success closes the circuit, failure re-opens it
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if self.wait_time() else "half_open"
+
+    def wait_time(self):
+        """seconds until calls may go through again"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+class Resilience:
+    """limiter + retries + breaker applied to one call at a time"""
+
+    def __init__(self, limiter=None, breaker=None, policy=None):
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.policy = policy or RetryPolicy()
+        self.retries = 0  # total across calls
+
+    def call(self, fn, *args, **kwargs):
+        waited = 0.0
+        for attempt in range(self.policy.attempts):
+            cooldown = self._cooldown(waited)
+            if cooldown:
+                time.sleep(cooldown)
+                waited += cooldown
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt, waited)
+                waited += delay
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn, *args, first=None, **kwargs):
+        """async call - first is an already created (not yet awaited) coroutine for attempt 0"""
+        waited = 0.0
+        for attempt in range(self.policy.attempts):
+            try:
+                cooldown = self._cooldown(waited)
+            except CircuitOpen:
+                if first is not None and attempt == 0:
+                    first.close()  # never awaited
+                raise
+            if cooldown:
+                await asyncio.sleep(cooldown)
+                waited += cooldown
+            if self.limiter:
+                await self.limiter.aacquire()
+            try:
+                if attempt == 0 and first is not None:
+                    result = await first
+                else:
+                    result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt, waited)
+                waited += delay
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _cooldown(self, waited):
+        """how long to wait for the breaker, raises if that blows the deadline"""
+        cooldown = self.breaker.wait_time()
+        if cooldown and self.policy.deadline is not None and waited + cooldown > self.policy.deadline:
+            raise CircuitOpen(f"openai calls failing, circuit open for another {cooldown:.0f}s")
+        return cooldown
+
+    def _failed(self, exc, attempt, waited):
+        """decide whether to retry, returns the delay or re-raises"""
+        if not is_retryable(exc):
+            raise exc
+        self.breaker.record_failure()
+        delay = self.policy.delay(attempt, retry_after(exc))
+        last = attempt + 1 >= self.policy.attempts
+        if last or (self.policy.deadline is not None and waited + delay > self.policy.deadline):
+            raise exc
+        self.retries += 1
+        tracing.count(retries=1)
+        return delay
+
+def _default_limiter():
+    rate = float(os.environ.get("OPENAI_REQUESTS_PER_SECOND", 8))
+    return TokenBucket(rate) if rate > 0 else None
+
+# one per process so concurrent generations share the org's rate limit
+DEFAULT_RESILIENCE = Resilience(limiter=_default_limiter())
+
+def _is_resource(obj):
+    return type(obj).__module__.startswith("openai.resources")
+
+class ResilientClient:
+    """proxy over an OpenAI/AsyncOpenAI client (or any resource on it)
+
+    resource methods are routed through Resilience.call/acall inside an
+    "api.<path>" tracing span (api.beta.threads.runs.create, ...), everything
+    else passes straight through
+    """
+
+    def __init__(self, target, resilience=DEFAULT_RESILIENCE, path="api"):
+        self._target = target
+        self._resilience = resilience
+        self._path = path
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        path = f"{self._path}.{name}"
+        if _is_resource(attr):
+            return ResilientClient(attr, self._resilience, path)
+        if not (inspect.ismethod(attr) and _is_resource(self._target)):
+            return attr
+        if type(self._target).__name__.startswith("Async"):
+            return self._async_method(attr, path)
+
+        def call(*args, **kwargs):
+            with tracing.span(path):
+                return self._resilience.call(attr, *args, **kwargs)
+        return call
+
+    def _async_method(self, method, path):
+        # some async resource methods aren't coroutines (runs.stream returns a
+        # manager, list returns a paginator) - only wrap the ones that are
+        async def traced(first, args, kwargs):
+            with tracing.span(path):
+                return await self._resilience.acall(method, *args, first=first, **kwargs)
+
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if not inspect.iscoroutine(result):
+                return result
+            return traced(result, args, kwargs)
+        return call
+
+    def __repr__(self):
+        return f"ResilientClient({self._target!r})"
+
+def account_key(client):
+    """short hash of the client's api key + org - ids from one account mean nothing to another"""
+    identity = f"{getattr(client, 'api_key', '')}:{getattr(client, 'organization', '') or ''}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:12]
+
+def resilient(client, resilience=None):
+    """wrap client once - already wrapped clients come back as they are"""
+    if client is None or isinstance(client, ResilientClient):
+        return client
+    # we retry ourselves, the sdk's own retries would multiply attempts
+    if hasattr(client, "with_options"):
+        client = client.with_options(max_retries=0)
+    return ResilientClient(client, resilience or DEFAULT_RESILIENCE)
@@ -0,0 +1,516 @@
+"""Structured tracing spans, token accounting and per-course reports
+
+spans nest through a contextvar, so a step span opened in _generate_step
+becomes the parent of the api spans utils.resilience opens for each request
+(threads and asyncio tasks each start from the context they were created in).
+finished spans go to a bounded in-memory buffer and, unless
+COURSE_GENERATOR_TRACE=0, to data_dir("traces", "spans.jsonl"), rotated to
+spans.jsonl.1 past COURSE_GENERATOR_TRACE_MB (default 64) megabytes.
+
+    python -m utils.tracing                      # cost/latency report per course
+    python -m utils.tracing --reruns             # streamlit script run times per interaction
+    python -m utils.tracing --otlp spans.otlp.json  # OpenTelemetry OTLP/JSON export
+"""
+
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.metrics import latency
+from utils.paths import data_dir
+
+# USD per 1M tokens (input, output) - unknown models report tokens but no cost
+PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+# attributes summed (rather than overwritten) by Span.add and in reports
+COUNTERS = ("input_tokens", "output_tokens", "retries", "polls")
+# how streamlit ends a script run early (st.rerun / st.stop) - not failures
+SCRIPT_CONTROL = ("RerunException", "StopException")
+
+_current = contextvars.ContextVar("course_generator_span", default=None)
+
+def cost(model, input_tokens=0, output_tokens=0):
+    """USD for the tokens, None when the model isn't priced"""
+    price = PRICING.get(model)
+    if price is None:
+        # dated snapshots (gpt-4o-mini-2024-07-18) price like their base model
+        price = next((p for name, p in PRICING.items() if model and model.startswith(name + "-")), None)
+    if price is None:
+        return None
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+class Span:
+    """one timed unit of work"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "status")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+
+    @property
+    def duration(self):
+        return ((self.end or time.time_ns()) - self.start) / 1e9
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def add(self, **counts):
+        for key, n in counts.items():
+            if n:
+                self.attributes[key] = self.attributes.get(key, 0) + n
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "duration": round(self.duration, 6),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+class JsonlExporter:
+    """appends one json line per finished span to a single open handle
+
+    once the file passes max_bytes it becomes path.1 (replacing the previous
+    one) and a fresh file is started, so the log never holds more than about
+    2 * max_bytes. several processes can share the file - each rotates when
+    its own handle sees the size limit
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        atexit.register(self.close)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()  # readers tail the file, don't sit on a buffer
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        try:
+            os.replace(self.path, self.path + ".1")
+        except OSError as e:
+            print(f"Failed to rotate {self.path}: {e}")
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class Tracer:
+    """hands out spans and fans finished ones out to exporters"""
+
+    def __init__(self, exporters=(), buffer=20000):
+        self.exporters = list(exporters)
+        self.recent = deque(maxlen=buffer)  # finished span dicts, newest last
+        self.active = {}  # span_id -> Span, for "what's running right now"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = Span(name, _current.get(), {k: v for k, v in attributes.items() if v is not None})
+        token = _current.set(span)
+        with self._lock:
+            self.active[span.span_id] = span
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            span.end = time.time_ns()
+            _current.reset(token)
+            with self._lock:
+                self.active.pop(span.span_id, None)
+            self._finish(span)
+
+    def active_spans(self, name=None):
+        """spans still open (in this process), optionally only those called name"""
+        with self._lock:
+            spans = list(self.active.values())
+        return [span for span in spans if name is None or span.name == name]
+
+    def _finish(self, span):
+        self.recent.append(span.to_dict())
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except OSError as e:
+                print(f"Failed to export span: {e}")
+
+def current_span():
+    return _current.get()
+
+def annotate(**attributes):
+    """set attributes on the current span, no-op outside one"""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+def count(**counts):
+    """add to counters on the current span, no-op outside one"""
+    span = _current.get()
+    if span is not None:
+        span.add(**counts)
+
+def record_usage(usage):
+    """add an api usage object (run.usage, completion.usage) to the current span"""
+    if usage is None:
+        return
+    count(
+        input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+def spans_path():
+    return str(data_dir("traces", "spans.jsonl"))
+
+def _default_tracer():
+    if os.environ.get("COURSE_GENERATOR_TRACE", "1") == "0":
+        return Tracer()
+    max_mb = float(os.environ.get("COURSE_GENERATOR_TRACE_MB", 64))
+    return Tracer([JsonlExporter(spans_path(), max_bytes=int(max_mb * 1024 * 1024))])
+
+# shared across generators in this process, like utils.metrics.latency
+tracer = _default_tracer()
+span = tracer.span
+
+@contextmanager
+def ui_run(scope, **attributes):
+    """time one streamlit script run - scope "app" for a full rerun, the
+    fragment's name for a fragment rerun
+
+    recorded as a "ui.run" span and in the latency histogram under "ui",
+    an st.rerun()/st.stop() ending the run is noted rather than failing it
+    """
+    control = None
+    with span("ui.run", scope=scope, **attributes) as s:
+        try:
+            yield s
+        except BaseException as e:
+            if type(e).__name__ not in SCRIPT_CONTROL:
+                raise
+            s.set(ended_by=type(e).__name__)
+            control = e
+    latency.record("ui", scope, s.duration)
+    if control is not None:
+        raise control
+
+# --- reading + reporting --- #
+
+def load_spans(path=None, rotated=True):
+    """span dicts from a jsonl file (default: this install's trace log),
+    oldest first and including its rotated .1 file unless rotated=False"""
+    path = path or spans_path()
+    spans = []
+    for name in ([path + ".1"] if rotated else []) + [path]:
+        try:
+            with open(name, encoding="utf-8") as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+        except FileNotFoundError:
+            continue
+    return spans
+
+class SpanLog:
+    """tails a spans jsonl file, keeping the newest `limit` spans
+
+    the first refresh() reads only the last tail_bytes of the log (reaching
+    into the rotated .1 file when the live one is shorter), later ones only
+    what was appended since, so a dashboard can poll it every couple of
+    seconds however large the log has grown. a rotation starts it on the new file
+    """
+
+    def __init__(self, path=None, limit=50000, tail_bytes=16 * 1024 * 1024):
+        self.path = path or spans_path()
+        self.spans = deque(maxlen=limit)
+        self.tail_bytes = tail_bytes
+        self._offset = None  # None until the first read
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return list(self.spans)
+            if self._offset is None:
+                self._offset = max(0, stat.st_size - self.tail_bytes)
+                if stat.st_size < self.tail_bytes:
+                    self._read_rotated(budget=self.tail_bytes - stat.st_size)
+            elif stat.st_ino != self._inode:
+                # rotated - finish the old file, now .1, then start on the new one
+                self._read_rotated(offset=self._offset, inode=self._inode)
+                self._offset = 0
+            elif stat.st_size < self._offset:
+                self._offset = 0  # truncated - what we hold is older, keep it
+            self._inode = stat.st_ino
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            # a line still being written has no newline yet - leave it for next time
+            end = data.rfind(b"\n") + 1
+            self._append(data[:end], partial=self._offset > 0 and not data.startswith(b"{"))
+            self._offset += end
+            return list(self.spans)
+
+    def _read_rotated(self, budget=None, offset=None, inode=None):
+        """the last `budget` bytes of path.1, or everything after `offset` when
+        it's still the file `inode` we were reading"""
+        try:
+            with open(self.path + ".1", "rb") as f:
+                if offset is not None:
+                    if os.fstat(f.fileno()).st_ino != inode:
+                        return  # rotated more than once since the last poll
+                    start = offset
+                else:
+                    f.seek(0, os.SEEK_END)
+                    start = max(0, f.tell() - budget)
+                f.seek(start)
+                self._append(f.read(), partial=offset is None and start > 0)
+        except OSError:
+            pass
+
+    def _append(self, data, partial):
+        if partial:
+            # the tail window began mid-line
+            data = data[data.find(b"\n") + 1:]
+        for line in data.splitlines():
+            try:
+                self.spans.append(json.loads(line))
+            except ValueError:
+                continue
+
+def percentile(values, q):
+    """linear-interpolated q-th percentile (0-100) of values, None if empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def stage_latency(spans, quantiles=(50, 95, 99)):
+    """per-prompt latency percentiles, cache hit rate and poll overhead
+
+    cache hits are counted but kept out of the percentiles - they'd drag
+    every percentile towards zero. poll overhead is the time step spans spent
+    inside runs.retrieve requests
+    """
+    polls_by_step = {}
+    for s in spans:
+        if s["name"] == "api.beta.threads.runs.retrieve" and s["parent_id"]:
+            polls_by_step[s["parent_id"]] = polls_by_step.get(s["parent_id"], 0.0) + s["duration"]
+
+    stages = {}
+    for s in spans:
+        if s["name"] != "step":
+            continue
+        attrs = s["attributes"]
+        stage = stages.setdefault(attrs.get("prompt", "custom"), {
+            "durations": [], "count": 0, "cache_hits": 0, "errors": 0,
+            "polls": 0, "poll_seconds": 0.0, "input_tokens": 0, "output_tokens": 0,
+        })
+        stage["count"] += 1
+        stage["errors"] += s["status"] == "error"
+        if attrs.get("cache_hit"):
+            stage["cache_hits"] += 1
+            continue
+        stage["durations"].append(s["duration"])
+        stage["polls"] += attrs.get("polls", 0)
+        stage["poll_seconds"] += polls_by_step.get(s["span_id"], 0.0)
+        stage["input_tokens"] += attrs.get("input_tokens", 0)
+        stage["output_tokens"] += attrs.get("output_tokens", 0)
+
+    out = {}
+    for name, stage in stages.items():
+        durations = stage.pop("durations")
+        stage.update({f"p{q}": percentile(durations, q) for q in quantiles})
+        stage["seconds"] = sum(durations)
+        stage["cache_hit_rate"] = stage["cache_hits"] / stage["count"]
+        stage["poll_overhead"] = stage["poll_seconds"] / stage["seconds"] if stage["seconds"] else 0.0
+        out[name] = stage
+    return out
+
+def rerun_report(spans, quantiles=(50, 95, 99)):
+    """script run time percentiles per scope (and stage) from ui.run spans"""
+    runs = {}
+    for s in spans:
+        if s["name"] != "ui.run":
+            continue
+        attrs = s["attributes"]
+        key = (attrs.get("scope", "app"), attrs.get("stage"))
+        runs.setdefault(key, []).append(s["duration"])
+    return {
+        key: {"count": len(durations), "max": max(durations),
+              **{f"p{q}": percentile(durations, q) for q in quantiles}}
+        for key, durations in runs.items()
+    }
+
+def course_report(spans):
+    """per-course latency/token/cost rollup of step and api spans
+
+    returns {course: {"stages": {prompt: stats}, "api": {endpoint: stats}, "total": stats}}
+    where course is the course_id attribute, falling back to the trace id
+    """
+    by_trace = {}
+    steps = {}
+    for s in spans:
+        if s["attributes"].get("course_id"):
+            by_trace[s["trace_id"]] = s["attributes"]["course_id"]
+        if s["name"] == "step":
+            steps[s["span_id"]] = s
+
+    courses = {}
+    for s in spans:
+        attrs = s["attributes"]
+        course = attrs.get("course_id") or by_trace.get(s["trace_id"]) or s["trace_id"]
+        report = courses.setdefault(course, {"stages": {}, "api": {}, "total": _empty()})
+        if s["name"] == "step":
+            stage = report["stages"].setdefault(attrs.get("prompt", "custom"), _empty())
+            _accumulate(stage, s)
+            _accumulate(report["total"], s)
+        elif s["name"].startswith("api."):
+            endpoint = report["api"].setdefault(s["name"][4:], _empty())
+            _accumulate(endpoint, s)
+            # request retries happen on the api span, charge them to the step too
+            parent = steps.get(s["parent_id"])
+            if parent is not None and attrs.get("retries"):
+                report["stages"].setdefault(parent["attributes"].get("prompt", "custom"), _empty())["retries"] += attrs["retries"]
+                report["total"]["retries"] += attrs["retries"]
+    return courses
+
+def _empty():
+    return {"count": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "cache_hits": 0,
+            "cost": 0.0, **{key: 0 for key in COUNTERS}}
+
+def _accumulate(stats, s):
+    attrs = s["attributes"]
+    stats["count"] += 1
+    stats["errors"] += s["status"] == "error"
+    stats["seconds"] += s["duration"]
+    stats["max_seconds"] = max(stats["max_seconds"], s["duration"])
+    stats["cache_hits"] += bool(attrs.get("cache_hit"))
+    for key in COUNTERS:
+        stats[key] += attrs.get(key, 0) or 0
+    stats["cost"] += cost(attrs.get("model"), attrs.get("input_tokens", 0), attrs.get("output_tokens", 0)) or 0.0
+
+def format_report(courses):
+    lines = []
+    for course, report in courses.items():
+        total = report["total"]
+        if not total["count"]:
+            continue
+        lines.append(f"course {course}: {total['count']} steps, {total['seconds']:.1f}s, "
+                     f"{total['input_tokens']}+{total['output_tokens']} tokens, ${total['cost']:.4f}")
+        lines.append(f"  {'stage':<16}{'n':>5}{'total s':>10}{'mean s':>9}{'max s':>8}"
+                     f"{'in tok':>10}{'out tok':>9}{'cost $':>9}{'polls':>7}{'retries':>8}")
+        for name, stats in sorted(report["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+            lines.append(f"  {name:<16}{stats['count']:>5}{stats['seconds']:>10.1f}"
+                         f"{stats['seconds'] / stats['count']:>9.2f}{stats['max_seconds']:>8.1f}"
+                         f"{stats['input_tokens']:>10}{stats['output_tokens']:>9}{stats['cost']:>9.4f}"
+                         f"{stats['polls']:>7}{stats['retries']:>8}")
+    return "\n".join(lines)
+
+# --- OpenTelemetry --- #
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(spans, service="course_generator"):
+    """spans as an OTLP/JSON ExportTraceServiceRequest
+
+    loadable by the collector's otlpjsonfile receiver or POSTable to /v1/traces
+    """
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{
+            "scope": {"name": "course_generator"},
+            "spans": [{
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                "name": s["name"],
+                "kind": 3 if s["name"].startswith("api.") else 1,  # CLIENT / INTERNAL
+                "startTimeUnixNano": str(s["start"]),
+                "endTimeUnixNano": str(s["end"] or s["start"]),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                "status": {"code": 2 if s["status"] == "error" else 1},
+            } for s in spans],
+        }],
+    }]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.tracing", description="trace reports and export")
+    parser.add_argument("spans", nargs="?", help="spans jsonl (default: the local trace log)")
+    parser.add_argument("--course", help="only this course id / trace id")
+    parser.add_argument("--otlp", help="write OTLP/JSON here instead of printing a report")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    parser.add_argument("--reruns", action="store_true", help="report streamlit script run times instead")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.spans)
+    if args.reruns:
+        runs = rerun_report(spans)
+        print(f"{'scope':<24}{'stage':<14}{'n':>6}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}")
+        for (scope, stage), stats in sorted(runs.items(), key=lambda kv: -kv[1]["p95"]):
+            print(f"{scope:<24}{stage or '-':<14}{stats['count']:>6}{stats['p50']:>8.3f}"
+                  f"{stats['p95']:>8.3f}{stats['p99']:>8.3f}{stats['max']:>8.3f}")
+        return 0
+    if args.otlp:
+        with open(args.otlp, "w", encoding="utf-8") as f:
+            json.dump(to_otlp(spans), f)
+        print(f"wrote {len(spans)} spans to {args.otlp}")
+        return 0
+
+    courses = course_report(spans)
+    if args.course:
+        courses = {k: v for k, v in courses.items() if k == args.course}
+    print(json.dumps(courses, indent=2) if args.json else format_report(courses))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
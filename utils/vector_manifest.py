@@ -0,0 +1,206 @@
+"""Local manifest that dedupes uploaded files and vector stores across sessions"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from openai import OpenAI, NotFoundError
+from utils.file_handler import upload_files, create_vector_store
+from utils.paths import data_dir
+from utils.resilience import account_key, resilient
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class VectorStoreManifest:
+    """maps file content hashes -> openai file ids and file sets -> vector stores
+
+    acquire() hands back an existing vector store when the exact same set of
+    files was indexed before, uploading only files we've never seen. every
+    acquire bumps a refcount, release() drops it, gc() deletes whatever is
+    unreferenced and idle. entries are kept per account (api key + org):
+    another key can neither reuse nor garbage-collect them
+    """
+
+    def __init__(self, path=None):
+        self.path = path or data_dir("vector_manifest.json")
+        self._lock = threading.Lock()
+
+    def acquire(self, client: OpenAI, uploaded_files, max_workers=8, on_progress=None):
+        """vector store id covering uploaded_files, reused when possible"""
+        account = account_key(client)
+        client = resilient(client)
+        blobs = [file.getvalue() for file in uploaded_files]
+        hashes = [content_hash(b) for b in blobs]
+        set_hash = content_hash("\n".join(sorted(set(hashes))).encode())
+
+        with self._lock:
+            data = self._load(account)
+            store = data["stores"].get(set_hash)
+        if store and self._store_alive(client, store["vector_store_id"]):
+            with self._lock:
+                doc, data = self._load(account, doc=True)
+                self._touch(data, set_hash, +1)
+                self._save(doc)
+            return store["vector_store_id"]
+
+        known = {h: data["files"][h]["file_id"] for h in hashes if h in data["files"]}
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        new_ids = upload_files(client, [uploaded_files[i] for i in missing], max_workers, on_progress) if missing else []
+
+        now = time.time()
+        duplicates = []
+        with self._lock:
+            doc, data = self._load(account, doc=True)
+            for i, file_id in zip(missing, new_ids):
+                if hashes[i] in data["files"]:
+                    duplicates.append(file_id)  # uploaded concurrently, keep the recorded one
+                    continue
+                data["files"][hashes[i]] = {
+                    "file_id": file_id,
+                    "name": uploaded_files[i].name,
+                    "size": len(blobs[i]),
+                    "created": now,
+                }
+            self._save(doc)
+        for file_id in duplicates:
+            self._delete(client.files.delete, file_id)
+
+        file_ids = list(dict.fromkeys(data["files"][h]["file_id"] for h in hashes))
+        try:
+            vector_store_id = create_vector_store(client, file_ids)
+        except Exception:
+            # a recorded file may have been deleted remotely - forget them all and retry once
+            with self._lock:
+                doc, data = self._load(account, doc=True)
+                for h in known:
+                    data["files"].pop(h, None)
+                self._save(doc)
+            if not known:
+                raise
+            return self.acquire(client, uploaded_files, max_workers, on_progress)
+
+        stale_id = store["vector_store_id"] if store else None
+        with self._lock:
+            doc, data = self._load(account, doc=True)
+            winner = data["stores"].get(set_hash)
+            if winner and winner["vector_store_id"] != stale_id:
+                # a concurrent acquire of the same files got here first - use theirs
+                self._touch(data, set_hash, +1)
+                self._save(doc)
+            else:
+                winner = None
+                data["stores"][set_hash] = {
+                    "vector_store_id": vector_store_id,
+                    "file_hashes": sorted(set(hashes)),
+                    "refs": 0,
+                    "last_used": now,
+                }
+                self._touch(data, set_hash, +1)
+                self._save(doc)
+        if winner:
+            self._delete(client.beta.vector_stores.delete, vector_store_id)
+            return winner["vector_store_id"]
+        return vector_store_id
+
+    def release(self, vector_store_id):
+        """drop one reference, the store stays around for reuse until gc()"""
+        with self._lock:
+            doc = self._load()
+            for data in doc["accounts"].values():
+                for set_hash, store in data["stores"].items():
+                    if store["vector_store_id"] == vector_store_id:
+                        self._touch(data, set_hash, -1)
+                        self._save(doc)
+                        return
+
+    def gc(self, client: OpenAI, max_idle=7 * 24 * 3600, stale_after=30 * 24 * 3600):
+        """delete idle unreferenced stores, then files no store needs
+
+        refs can leak when a browser tab just disappears, so anything untouched
+        for stale_after seconds is collected regardless of its refcount
+        only this client's account is collected, so a missing store or file
+        really is gone rather than invisible to a different key.
+        returns {"stores": n, "files": n} deleted
+        """
+        account = account_key(client)
+        client = resilient(client)
+        now = time.time()
+        with self._lock:
+            data = self._load(account)
+        doomed = [
+            set_hash for set_hash, store in data["stores"].items()
+            if (store["refs"] <= 0 and now - store["last_used"] > max_idle)
+            or now - store["last_used"] > stale_after
+        ]
+
+        deleted_stores = []
+        for set_hash in doomed:
+            if self._delete(client.beta.vector_stores.delete, data["stores"][set_hash]["vector_store_id"]):
+                deleted_stores.append(set_hash)
+
+        with self._lock:
+            doc, data = self._load(account, doc=True)
+            for set_hash in deleted_stores:
+                data["stores"].pop(set_hash, None)
+            needed = {h for store in data["stores"].values() for h in store["file_hashes"]}
+            orphans = {h: f["file_id"] for h, f in data["files"].items() if h not in needed}
+            self._save(doc)
+
+        deleted_files = [h for h, file_id in orphans.items() if self._delete(client.files.delete, file_id)]
+        with self._lock:
+            doc, data = self._load(account, doc=True)
+            for h in deleted_files:
+                data["files"].pop(h, None)
+            self._save(doc)
+
+        return {"stores": len(deleted_stores), "files": len(deleted_files)}
+
+    def _store_alive(self, client, vector_store_id):
+        try:
+            return client.beta.vector_stores.retrieve(vector_store_id).status == "completed"
+        except NotFoundError:
+            return False
+
+    def _delete(self, delete, object_id):
+        """true if the object is gone (already-missing counts as gone)"""
+        try:
+            delete(object_id)
+            return True
+        except NotFoundError:
+            return True
+        except Exception as e:
+            print(f"Failed to delete {object_id}: {e}")
+            return False
+
+    def _touch(self, data, set_hash, delta):
+        store = data["stores"][set_hash]
+        store["refs"] = max(0, store["refs"] + delta)
+        store["last_used"] = time.time()
+
+    def _load(self, account=None, doc=False):
+        """the whole manifest, or one account's {"files", "stores"} (with doc=True, both)
+
+        pre-account manifests (top-level "files"/"stores") are kept as they
+        are under their old keys - no account owns them, so nothing reuses
+        or collects them
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {}
+        manifest.setdefault("accounts", {})
+        if account is None:
+            return manifest
+        data = manifest["accounts"].setdefault(account, {"files": {}, "stores": {}})
+        return (manifest, data) if doc else data
+
+    def _save(self, data):
+        # write-then-rename so another process never reads half a manifest
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)